@@ -1,12 +1,15 @@
 
 import os
+import math
 import click
 import logging
 import shutil
+from osgeo import gdal
 from terraforge.utils.config import config
 from terraforge.utils.logging import setup_logger
-from terraforge.data_acquisition import elevation, osm, textures
-from terraforge.data_processing import elevation_processor, building_processor, texture_processor, sdf_builder
+from terraforge.data_acquisition import elevation, textures
+from terraforge.data_acquisition.stages import run_acquisition_stages, default_acquisition_stages
+from terraforge.data_processing import elevation_processor, terrain_mesh, building_processor, building_store, texture_processor, sdf_builder
 from terraforge.utils.coordinates import CoordinateConverter
 
 logger = setup_logger('cli_app')
@@ -22,6 +25,9 @@ def cli(ctx, debug):
         logger.debug("Debug logging enabled.")
     else:
         logger.setLevel(logging.INFO)
+    if config.GDAL_CACHE_MAX_MB:
+        # Process-wide GDAL block cache, e.g. to bound the satellite mosaic written during acquisition
+        gdal.SetCacheMax(config.GDAL_CACHE_MAX_MB * 1024 * 1024)
 
 
 @cli.command()
@@ -30,8 +36,24 @@ def cli(ctx, debug):
 @click.option('--radius', required=True, type=float, help='Radius in meters around the location.')
 @click.option('--output-dir', default='generated_world', help='Output directory for the generated world.', type=click.Path())
 @click.option('--world-name', default='generated_world', help='Name of the generated Gazebo world.')
+@click.option('--tile-workers', default=None, type=int, help='Maximum number of concurrent satellite tile downloads.')
+@click.option('--texture-resolution', default=None, type=float, help='Target satellite texture ground resolution in meters per pixel.')
+@click.option('--max-texture-size', default=None, type=int, help='Maximum satellite texture size in pixels per side.')
+@click.option('--heightmap-format', default=None, type=click.Choice(['png16', 'png8', 'tif32']), help='Heightmap output format.')
+@click.option('--heightmap-resampling', default=None, type=click.Choice(['nearest', 'bilinear', 'cubic', 'cubicspline', 'lanczos', 'average']), help='Resampling kernel used to fit the DEM to the heightmap size.')
+@click.option('--terrain-tile-size', default=None, type=int, help='Split the terrain into heightmap tiles of this many pixels per side ((2^n)+1) instead of one heightmap.')
+@click.option('--terrain-mesh', 'export_terrain_mesh', is_flag=True, help='Export the terrain as an adaptive triangle mesh instead of a heightmap.')
+@click.option('--mesh-max-error', default=None, type=float, help='Maximum vertical error in meters of the adaptive terrain mesh.')
+@click.option('--collision-size', default=None, type=int, help='Edge length in pixels ((2^n)+1) of a separate, coarser collision heightmap.')
+@click.option('--collision-max-error', default=None, type=float, help='Maximum vertical error in meters of a separate, coarser collision mesh (with --terrain-mesh).')
+@click.option('--building-mode', default='boxes', type=click.Choice(['boxes', 'merged', 'library']),
+              help='One box model per building, extruded footprints merged into one mesh model per spatial cell, or deduplicated model:// library models.')
+@click.option('--texture-format', default=None, type=click.Choice(['png', 'dds']), help='Satellite texture output: PNG only, or also a BC1 compressed, mipmapped DDS.')
+@click.option('--projection', default=None, type=click.Choice(['utm', 'tangent', 'auto']),
+              help='Gazebo frame projection: UTM zone offsets, local tangent plane, or tangent plane when its error over the area is within tolerance.')
 @click.pass_context
-def generate_world(ctx, latitude, longitude, radius, output_dir, world_name):
+def generate_world(ctx, latitude, longitude, radius, output_dir, world_name, tile_workers, texture_resolution, max_texture_size, heightmap_format, heightmap_resampling, terrain_tile_size,
+                   export_terrain_mesh, mesh_max_error, collision_size, collision_max_error, building_mode, texture_format, projection):
     """
     Generates a Gazebo SDF world for a given location and radius.
     """
@@ -48,56 +70,101 @@ def generate_world(ctx, latitude, longitude, radius, output_dir, world_name):
     os.makedirs(texture_output_dir, exist_ok=True) # Ensure texture output dir exists
 
     try:
-        elevation.download_dem(origin_location, radius, dem_output_path)
-        osm.download_osm_buildings(origin_location, radius, osm_output_path)
-        textures.download_satellite_texture_tiles(origin_location, radius, texture_output_dir, mapbox_api_key=config.MAPBOX_API_KEY)
+        # DEM, OSM and texture downloads are independent, so they run concurrently
+        stages = default_acquisition_stages(origin_location, radius, dem_output_path, osm_output_path, texture_output_dir,
+                                            mapbox_api_key=config.MAPBOX_API_KEY, tile_workers=tile_workers,
+                                            texture_meters_per_pixel=texture_resolution, max_texture_size=max_texture_size)
+        acquisition_errors = run_acquisition_stages(stages)
     except Exception as e:
         logger.error(f"Data acquisition failed: {e}")
         if ctx.obj['DEBUG']: raise # Re-raise exception in debug mode for full traceback
         return
 
+    # --- Coordinate Conversion ---
+    logger.info("--- Coordinate Conversion ---")
+    # The AOI square reaches radius * sqrt(2) from the origin at its corners
+    converter = CoordinateConverter(origin_location, projection=projection, radius_meters=radius * math.sqrt(2))
+
     # --- Data Processing ---
     logger.info("--- Data Processing ---")
-    heightmap_output_path = os.path.join(config.DEM_OUTPUT_DIR, f"{location_name}_heightmap.png")
-    building_sdf_output_dir = os.path.join(config.OSM_OUTPUT_DIR, f"{location_name}_building_models_sdf")
+    heightmap_format = heightmap_format if heightmap_format else config.HEIGHTMAP_FORMAT
+    heightmap_extension = '.tif' if heightmap_format == 'tif32' else '.png'
+    heightmap_output_path = os.path.join(config.DEM_OUTPUT_DIR, f"{location_name}_heightmap{heightmap_extension}")
+    building_output_kind = {'boxes': 'models', 'merged': 'cells', 'library': 'library'}[building_mode]
+    building_sdf_output_dir = os.path.join(config.OSM_OUTPUT_DIR, f"{location_name}_building_{building_output_kind}_sdf")
+    building_store_dir = os.path.join(config.OSM_OUTPUT_DIR, f"{location_name}_building_store")
     processed_texture_output_dir = os.path.join(config.TEXTURE_OUTPUT_DIR, "processed_textures") # Using fixed processed textures dir
     processed_texture_output_path = os.path.join(processed_texture_output_dir, "satellite_texture.png") # Assuming merged texture is named this
 
     try:
-        elevation_processor.process_dem_to_heightmap(dem_output_path, heightmap_output_path)
-        building_processor.process_osm_buildings_to_sdf(osm_output_path, building_sdf_output_dir)
-        texture_processor.process_satellite_texture(texture_output_dir, processed_texture_output_path) # Process to a fixed output path for now
+        terrain_tiles = None
+        texture_info = None
+        tile_texture_paths = None
+        terrain_mesh_output_path = None
+        collision_heightmap_output_path = None
+        collision_mesh_output_path = None
+        collision_size = collision_size if collision_size is not None else config.TERRAIN_COLLISION_SIZE
+        collision_max_error = collision_max_error if collision_max_error is not None else config.TERRAIN_COLLISION_MAX_ERROR
+        if export_terrain_mesh:
+            terrain_mesh_output_path = os.path.join(config.DEM_OUTPUT_DIR, f"{location_name}_terrain.obj")
+            mesh_info = terrain_mesh.process_dem_to_terrain_mesh(dem_output_path, terrain_mesh_output_path, max_error=mesh_max_error, resampling=heightmap_resampling)
+            terrain_base_elevation = mesh_info['min_elevation']
+            if collision_max_error and collision_max_error > mesh_info['max_error']:
+                # Coarser mesh for the physics engine, in the same vertical frame as the visual mesh
+                collision_mesh_output_path = os.path.join(config.DEM_OUTPUT_DIR, f"{location_name}_terrain_collision.obj")
+                terrain_mesh.process_dem_to_terrain_mesh(dem_output_path, collision_mesh_output_path, max_error=collision_max_error, size=mesh_info['grid_size_px'],
+                                                         resampling=heightmap_resampling, base_elevation=mesh_info['min_elevation'])
+        elif terrain_tile_size:
+            heightmap_tiles_dir = os.path.join(config.DEM_OUTPUT_DIR, f"{location_name}_heightmap_tiles")
+            tiles_info = elevation_processor.process_dem_to_heightmap_tiles(dem_output_path, heightmap_tiles_dir, tile_size=terrain_tile_size, resampling=heightmap_resampling)
+            terrain_tiles = tiles_info['tiles']
+            terrain_base_elevation = tiles_info['min_elevation']
+        else:
+            heightmap_info = elevation_processor.process_dem_to_heightmap(dem_output_path, heightmap_output_path, output_format=heightmap_format, resampling=heightmap_resampling)
+            terrain_base_elevation = heightmap_info['min_elevation']
+            if collision_size and collision_size < heightmap_info['size_px']:
+                # Lower resolution heightmap for the physics engine, sharing the visual heightmap's elevation scale
+                collision_heightmap_output_path = os.path.join(config.DEM_OUTPUT_DIR, f"{location_name}_heightmap_collision{heightmap_extension}")
+                elevation_processor.process_dem_to_heightmap(dem_output_path, collision_heightmap_output_path, output_format=heightmap_format, resampling='average', size=collision_size,
+                                                             elevation_range=(heightmap_info['min_elevation'], heightmap_info['max_elevation']))
+        building_includes = None
+        if 'buildings' not in acquisition_errors:
+            # The GeoJSON is parsed and projected once; every building stage below reads the memory-mapped store
+            building_store.write_building_store(osm_output_path, building_store_dir, origin_location, projection=converter.projection)
+        if 'buildings' not in acquisition_errors and building_mode == 'library':
+            building_includes = building_processor.process_osm_buildings_to_library(building_store_dir, building_sdf_output_dir,
+                                                                                  dem_filepath=dem_output_path, terrain_base_elevation=terrain_base_elevation)['includes']
+        elif 'buildings' not in acquisition_errors and building_mode == 'merged':
+            building_processor.process_osm_buildings_to_cell_meshes(building_store_dir, building_sdf_output_dir,
+                                                                    dem_filepath=dem_output_path, terrain_base_elevation=terrain_base_elevation)
+        elif 'buildings' not in acquisition_errors:
+            building_processor.process_building_store_to_sdf(building_store_dir, building_sdf_output_dir)
+        if 'textures' not in acquisition_errors:
+            # Warped onto the DEM's grid, which every terrain output (heightmap, tiles, mesh) shares
+            texture_info = texture_processor.process_satellite_texture(texture_output_dir, processed_texture_output_path, grid=elevation_processor.terrain_grid(dem_output_path),
+                                                                       texture_format=texture_format)
+            if terrain_tiles and texture_info['aligned']:
+                # Each tile model drapes its own window of the texture
+                tile_texture_paths = texture_processor.write_texture_tiles(processed_texture_output_path, tiles_info, os.path.join(processed_texture_output_dir, "tiles"),
+                                                                           texture_format=texture_format)
     except Exception as e:
         logger.error(f"Data processing failed: {e}")
         if ctx.obj['DEBUG']: raise
         return
 
-    # --- Coordinate Conversion ---
-    logger.info("--- Coordinate Conversion ---")
-    converter = CoordinateConverter(origin_location)
-
     # --- SDF World Generation ---
     logger.info("--- SDF World Generation ---")
-    template_directory = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'sdf_generation', 'templates') # Path to templates from cli/main.py
+    template_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'terraforge', 'data_processing', 'templates')
     sdf_builder = sdf_builder.SDFWorldBuilder(template_directory)
 
-    building_model_paths = [os.path.join(building_sdf_output_dir, f) for f in os.listdir(building_sdf_output_dir) if f.endswith('.sdf')] if os.path.exists(building_sdf_output_dir) else []
-
-    # Generate building poses in Gazebo frame
+    # Box models are paired with their draped Gazebo poses by building id; merged cell meshes are already in the world frame
+    building_model_paths = []
     building_poses_gazebo = []
-    if os.path.exists(osm_output_path):
-        import json
-        import shapely.geometry
-        with open(osm_output_path, 'r') as f:
-            osm_data = json.load(f)
-        features = osm_data['features']
-        for feature in features:
-            if feature['geometry']['type'] in ['Polygon', 'MultiPolygon']:
-                polygon = shapely.geometry.shape(feature['geometry'])
-                centroid = polygon.centroid
-                wgs84_centroid = (centroid.y, centroid.x)
-                gazebo_pose = converter.wgs84_to_gazebo(wgs84_centroid)
-                building_poses_gazebo.append(gazebo_pose[:2])
+    if building_mode == 'boxes' and 'buildings' not in acquisition_errors:
+        building_model_paths, building_poses_gazebo = building_processor.compute_box_model_includes(building_store_dir, building_sdf_output_dir, dem_filepath=dem_output_path,
+                                                                                                    terrain_base_elevation=terrain_base_elevation)
+    elif os.path.exists(building_sdf_output_dir):
+        building_model_paths = sorted(os.path.join(building_sdf_output_dir, f) for f in os.listdir(building_sdf_output_dir) if f.endswith('.sdf'))
 
     output_sdf_world_path = os.path.join(output_dir, f"{world_name}.world") # Output world file path
     output_media_dir = os.path.join(output_dir, "media") # Media directory in output
@@ -113,18 +180,31 @@ def generate_world(ctx, latitude, longitude, radius, output_dir, world_name):
     if os.path.exists(texture_path_processed):
         shutil.copy2(texture_path_processed, output_texture_file_in_media)
         texture_path_for_sdf = os.path.relpath(output_texture_file_in_media, os.path.dirname(output_sdf_world_path))
-
-    material_script_path = os.path.join(template_directory, 'gazebo.material') # Assuming material template is in the same template dir
-    output_material_script_path = os.path.join(output_scripts_dir, 'gazebo.material')
-    if os.path.exists(material_script_path):
-        shutil.copy2(material_script_path, output_material_script_path)
+        material_texture_filename = os.path.basename(output_texture_file_in_media)
+        if texture_info and texture_info['dds_path']:
+            # The material uses the precomputed, compressed mip chain; the PNG stays next to it
+            shutil.copy2(texture_info['dds_path'], os.path.join(output_textures_dir, os.path.basename(texture_info['dds_path'])))
+            material_texture_filename = os.path.basename(texture_info['dds_path'])
+        tile_textures = []
+        for tile in terrain_tiles if tile_texture_paths else []:
+            shutil.copy2(tile_texture_paths[tile['name']], output_textures_dir)
+            tile['material'] = f"Gazebo/SatelliteTexture/{tile['name']}"
+            tile_textures.append({'material': tile['material'], 'texture_filename': os.path.basename(tile_texture_paths[tile['name']])})
+        with open(os.path.join(output_scripts_dir, 'gazebo.material'), 'w') as f:
+            f.write(sdf_builder.render_material_script(material_texture_filename, tile_textures=tile_textures))
 
     try:
         sdf_content = sdf_builder.render_world_template(
-            heightmap_path=heightmap_output_path,
+            heightmap_path=None if terrain_tiles or terrain_mesh_output_path else heightmap_output_path,
+            heightmap_size=None if terrain_tiles or terrain_mesh_output_path else (heightmap_info['size_x'], heightmap_info['size_y'], heightmap_info['height_range']),
+            terrain_tiles=terrain_tiles,
+            terrain_mesh_path=terrain_mesh_output_path,
+            collision_heightmap_path=collision_heightmap_output_path,
+            collision_mesh_path=collision_mesh_output_path,
             texture_path=texture_path_for_sdf,
             building_model_paths=building_model_paths,
-            building_poses=building_poses_gazebo
+            building_poses=building_poses_gazebo,
+            building_includes=building_includes
         )
         sdf_builder.save_sdf_world_file(sdf_content, output_sdf_world_path)
         logger.info(f"World generation complete. SDF world file saved to: {output_sdf_world_path}")
@@ -136,5 +216,100 @@ def generate_world(ctx, latitude, longitude, radius, output_dir, world_name):
     logger.info(f"Gazebo world generated successfully in: {output_dir}")
 
 
+@cli.command()
+@click.option('--latitude', required=True, type=float, help='Latitude of the location.')
+@click.option('--longitude', required=True, type=float, help='Longitude of the location.')
+@click.option('--radius', required=True, type=float, help='Radius in meters around the location.')
+@click.option('--texture-resolution', default=None, type=float, help='Target satellite texture ground resolution in meters per pixel.')
+@click.option('--max-texture-size', default=None, type=int, help='Maximum satellite texture size in pixels per side.')
+def estimate_texture(latitude, longitude, radius, texture_resolution, max_texture_size):
+    """
+    Prints the zoom level, tile count, download size and texture size a world would need, without downloading.
+    """
+    bbox = elevation._calculate_bounds_wgs84((latitude, longitude), radius)
+    zoom = textures.select_zoom_level(
+        bbox,
+        texture_resolution if texture_resolution is not None else config.TEXTURE_TARGET_METERS_PER_PIXEL,
+        max_texture_size if max_texture_size is not None else config.TEXTURE_MAX_SIZE_PX,
+        config.TEXTURE_MAX_BYTES)
+    estimate = textures.estimate_texture_download(bbox, zoom)
+    click.echo(f"zoom: {estimate['zoom']}")
+    click.echo(f"ground resolution: {estimate['meters_per_pixel']:.2f} m/px")
+    click.echo(f"tiles: {estimate['tiles']}")
+    click.echo(f"estimated download: {estimate['download_bytes'] / (1024 * 1024):.1f} MiB")
+    click.echo(f"texture size: {estimate['width']}x{estimate['height']} px ({estimate['texture_bytes'] / (1024 * 1024):.1f} MiB uncompressed)")
+
+
+@cli.command()
+@click.option('--osm-file', required=True, type=click.Path(exists=True, dir_okay=False), help='GeoJSON building footprints to process.')
+@click.option('--workers', default=None, type=int, help='Writer threads for the batch implementation.')
+def benchmark_buildings(osm_file, workers):
+    """
+    Times the batch building pipeline against the per-feature loop on the same input and checks both write identical models.
+    The batch time includes writing the building store.
+    """
+    import tempfile
+    import time
+    with tempfile.TemporaryDirectory() as loop_dir, tempfile.TemporaryDirectory() as batch_dir, tempfile.TemporaryDirectory() as store_dir:
+        started_at = time.perf_counter()
+        building_processor._process_osm_buildings_to_sdf_loop(osm_file, loop_dir)
+        loop_seconds = time.perf_counter() - started_at
+
+        started_at = time.perf_counter()
+        building_store.write_building_store(osm_file, store_dir)
+        written = building_processor.process_building_store_to_sdf(store_dir, batch_dir, max_workers=workers)
+        batch_seconds = time.perf_counter() - started_at
+
+        loop_files = sorted(os.listdir(loop_dir))
+        identical = loop_files == sorted(os.listdir(batch_dir))
+        for filename in loop_files if identical else []:
+            with open(os.path.join(loop_dir, filename)) as loop_file, open(os.path.join(batch_dir, filename)) as batch_file:
+                if loop_file.read() != batch_file.read():
+                    identical = False
+                    break
+
+    click.echo(f"buildings: {written}")
+    click.echo(f"loop: {loop_seconds:.2f}s")
+    click.echo(f"batch: {batch_seconds:.2f}s ({loop_seconds / max(batch_seconds, 1e-9):.1f}x)")
+    click.echo(f"identical output: {'yes' if identical else 'NO'}")
+
+
+@cli.command()
+@click.option('--latitude', default=47.3769, type=float, help='Latitude of the converter origin.')
+@click.option('--longitude', default=8.5417, type=float, help='Longitude of the converter origin.')
+@click.option('--points', default=1000000, type=int, help='Number of points converted by the batched path.')
+@click.option('--scalar-points', default=20000, type=int, help='Number of points converted one by one by the scalar path.')
+@click.option('--projection', default='utm', type=click.Choice(['utm', 'tangent']), help='Projection of the converter.')
+def benchmark_coordinates(latitude, longitude, points, scalar_points, projection):
+    """
+    Measures WGS84 -> Gazebo conversion throughput in points/s for the scalar and the batched CoordinateConverter paths.
+    """
+    import time
+    import numpy as np
+    converter = CoordinateConverter((latitude, longitude), projection=projection, radius_meters=5000 * math.sqrt(2))
+    rng = np.random.default_rng(0)
+    # Points within ~5 km of the origin
+    latitudes = latitude + rng.uniform(-0.045, 0.045, points)
+    longitudes = longitude + rng.uniform(-0.045, 0.045, points)
+
+    scalar_points = min(scalar_points, points)
+    started_at = time.perf_counter()
+    scalar_result = [converter.wgs84_to_gazebo((lat, lon)) for lat, lon in zip(latitudes[:scalar_points].tolist(), longitudes[:scalar_points].tolist())]
+    scalar_seconds = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    batch_x, batch_y, _ = converter.wgs84_to_gazebo_array(latitudes, longitudes)
+    batch_seconds = time.perf_counter() - started_at
+
+    max_difference = max(np.max(np.abs(np.array([pose[0] for pose in scalar_result]) - batch_x[:scalar_points])),
+                         np.max(np.abs(np.array([pose[1] for pose in scalar_result]) - batch_y[:scalar_points]))) if scalar_points else 0.0
+    scalar_rate = scalar_points / max(scalar_seconds, 1e-9)
+    batch_rate = points / max(batch_seconds, 1e-9)
+    click.echo(f"scalar: {scalar_points} points in {scalar_seconds:.3f}s, {scalar_rate:,.0f} points/s")
+    click.echo(f"batched: {points} points in {batch_seconds:.3f}s, {batch_rate:,.0f} points/s ({batch_rate / max(scalar_rate, 1e-9):.0f}x)")
+    click.echo(f"max difference: {max_difference:.3e} m")
+    click.echo(f"tangent-plane error over the area: {converter.tangent_error:.3e} m")
+
+
 if __name__ == '__main__':
     cli()
\ No newline at end of file
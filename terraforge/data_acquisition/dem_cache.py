@@ -0,0 +1,148 @@
+import math
+import os
+import threading
+import time
+import elevation
+import requests
+from osgeo import gdal
+from utils.config import config
+from utils.logging import logger
+
+# elevation drives GNU make in its cache directory, so downloads must not overlap
+_download_lock = threading.Lock()
+
+# Tiles confirmed absent upstream (open ocean) are not requested again for this long
+MISSING_TILE_RETRY_SECONDS = 24 * 3600
+
+# Latitude range covered by SRTM; tiles outside it are absent by definition
+SRTM_NORTH_LIMIT = 60
+SRTM_SOUTH_LIMIT = -56
+
+
+class DemCache:
+	"""
+	Persistent cache of raw 1x1 degree DEM source tiles in cache_dir/<product>/, areas being clipped from a VRT
+	mosaic of them. Tiles confirmed absent upstream get a .missing marker; least recently used files are evicted.
+	"""
+
+	def __init__(self, cache_dir: str = None, max_bytes: int = None, product: str = 'SRTM3'):
+		self.cache_dir = cache_dir if cache_dir else config.DEM_CACHE_DIR
+		self.max_bytes = max_bytes if max_bytes is not None else config.DEM_CACHE_MAX_BYTES
+		self.product = product
+		self.tile_dir = os.path.join(self.cache_dir, product)
+		self.elevation_cache_dir = os.path.abspath(os.path.join(self.cache_dir, "elevation"))
+		os.makedirs(self.tile_dir, exist_ok=True)
+		os.makedirs(self.elevation_cache_dir, exist_ok=True)
+
+	@staticmethod
+	def tile_name(lat: int, lon: int) -> str:
+		"""SRTM style tile name for the tile whose south-west corner is (lat, lon), e.g. N37W123."""
+		return f"{'N' if lat >= 0 else 'S'}{abs(lat):02d}{'E' if lon >= 0 else 'W'}{abs(lon):03d}"
+
+	@staticmethod
+	def tiles_for_bounds(bounds: tuple) -> list:
+		"""Returns the (lat, lon) south-west corners of every 1x1 degree tile intersecting (west, south, east, north)."""
+		west, south, east, north = bounds
+		return [(lat, lon)
+				for lat in range(math.floor(south), math.ceil(north))
+				for lon in range(math.floor(west), math.ceil(east))]
+
+	def _tile_path(self, lat: int, lon: int) -> str:
+		return os.path.join(self.tile_dir, f"{self.tile_name(lat, lon)}.tif")
+
+	def _is_known_missing(self, tile_path: str) -> bool:
+		missing_marker = tile_path + ".missing"
+		return os.path.exists(missing_marker) and time.time() - os.path.getmtime(missing_marker) < MISSING_TILE_RETRY_SECONDS
+
+	def _absent_upstream(self, lat: int, lon: int) -> bool:
+		"""
+		True only if the tile is confirmed not to exist upstream: outside the SRTM latitude range, or, for SRTM3,
+		its CGIAR 5x5 degree archive answers 404. Any other answer or a network error means it is not confirmed.
+		"""
+		if lat >= SRTM_NORTH_LIMIT or lat < SRTM_SOUTH_LIMIT:
+			return True
+		if self.product != 'SRTM3':
+			return False
+		archive = f"srtm_{(lon + 180) // 5 + 1:02d}_{(SRTM_NORTH_LIMIT - 1 - lat) // 5 + 1:02d}.zip"
+		try:
+			response = requests.head(config.DEM_SRTM3_ARCHIVE_URL + archive, timeout=config.TILE_DOWNLOAD_TIMEOUT, allow_redirects=True)
+		except requests.exceptions.RequestException:
+			return False
+		return response.status_code == 404
+
+	def _fetch_tile(self, lat: int, lon: int) -> bool:
+		tile_path = self._tile_path(lat, lon)
+		spool_output = tile_path + ".part.tif"
+		try:
+			with _download_lock:
+				logger.info(f"Downloading {self.product} source tile {self.tile_name(lat, lon)}")
+				elevation.clip(bounds=(lon, lat, lon + 1, lat + 1), output=os.path.abspath(spool_output), product=self.product,
+							   cache_dir=self.elevation_cache_dir)
+			os.replace(spool_output, tile_path)
+			return True
+		except Exception as e:
+			if os.path.exists(spool_output):
+				os.remove(spool_output)
+			if not self._absent_upstream(lat, lon):
+				logger.error(f"Failed to download {self.product} source tile {self.tile_name(lat, lon)}: {e}")
+				raise
+			logger.warning(f"No {self.product} data upstream for tile {self.tile_name(lat, lon)}: {e}")
+			open(tile_path + ".missing", 'w').close()
+			return False
+
+	def ensure_tiles(self, bounds: tuple) -> list:
+		"""Makes sure every source tile covering bounds is cached and returns the paths of the available ones."""
+		tile_paths = []
+		for lat, lon in self.tiles_for_bounds(bounds):
+			tile_path = self._tile_path(lat, lon)
+			if os.path.exists(tile_path):
+				os.utime(tile_path) # mark as recently used for eviction
+			elif self._is_known_missing(tile_path) or not self._fetch_tile(lat, lon):
+				continue
+			tile_paths.append(tile_path)
+		return tile_paths
+
+	def clip(self, bounds: tuple, output_path: str):
+		"""
+		Clips (west, south, east, north) out of the cached mosaic into a GeoTIFF, downloading missing tiles first.
+		"""
+		tile_paths = self.ensure_tiles(bounds)
+		if not tile_paths:
+			raise Exception(f"No {self.product} source tiles available for bounds {bounds}")
+
+		west, south, east, north = bounds
+		vrt_path = f"/vsimem/dem_mosaic_{threading.get_ident()}.vrt"
+		mosaic = gdal.BuildVRT(vrt_path, tile_paths)
+		try:
+			result = gdal.Translate(output_path, mosaic, projWin=[west, north, east, south], creationOptions=['COMPRESS=DEFLATE', 'TILED=YES'])
+			if result is None:
+				raise Exception(f"Failed to clip DEM mosaic to {output_path}")
+			result = None
+		finally:
+			mosaic = None
+			gdal.Unlink(vrt_path)
+
+		self.evict(keep=set(tile_paths))
+
+	def evict(self, keep: set = None):
+		"""
+		Removes least recently used source tiles and raw elevation downloads until the cache is below max_bytes.
+		Evicted raw downloads are fetched again by the elevation package when a tile needs them.
+		"""
+		keep = keep or set()
+		tiles = []
+		paths = [os.path.join(self.tile_dir, name) for name in os.listdir(self.tile_dir) if name.endswith('.tif')]
+		for root, _, names in os.walk(self.elevation_cache_dir):
+			paths.extend(os.path.join(root, name) for name in names if name.endswith(('.tif', '.zip')))
+		for path in paths:
+			stat = os.stat(path)
+			tiles.append((stat.st_mtime, stat.st_size, path))
+		total = sum(size for _, size, _ in tiles)
+		for _, size, path in sorted(tiles):
+			if total <= self.max_bytes:
+				break
+			if path in keep:
+				continue
+			os.remove(path)
+			total -= size
+			logger.debug(f"Evicted DEM source tile {path}")
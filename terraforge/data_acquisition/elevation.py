@@ -1,25 +1,29 @@
-import elevation
 import os
 import pyproj
-from pyproj import Transformer
-from shapely.geometry import box
 from utils.config import config
 from utils.logging import logger
+from utils.coordinates import get_transformer
+from data_acquisition.dem_cache import DemCache
 
-def download_dem(location: tuple, radius_meters: float, output_path: str):
+def download_dem(location: tuple, radius_meters: float, output_path: str, dem_cache: DemCache = None):
 	"""
 	Downloads DEM data for the given location and radius.
 
+	Raw SRTM source tiles are kept in a persistent DemCache, so only tiles that have not been
+	downloaded before are fetched and the clip itself is a local GDAL operation.
+
 	Args:
 		location: (latitude, longitude) tuple in WGS84 (EPSG:4326)
 		radius_meters: Radius in meters around the location to download DEM data.
 		output_path: Path to save the GeoTIFF file.
+		dem_cache: Optional DemCache to use. Defaults to one at config.DEM_CACHE_DIR.
 	"""
 	logger.info(f"Downloading DEM for location {location} with radius {radius_meters}m to {output_path}")
 	try:
 		bounds = _calculate_bounds_wgs84(location, radius_meters)
-		elevation.clip(bounds=bounds, output=output_path, product='SRTM3')
-		elevation.clean()
+		if dem_cache is None:
+			dem_cache = DemCache()
+		dem_cache.clip(bounds, output_path)
 		logger.info(f"DEM data downloaded successfully to {output_path}")
 	except Exception as e:
 		logger.error(f"Failed to download DEM: {e}")
@@ -29,6 +33,10 @@ def _calculate_bounds_wgs84(location: tuple, radius_meters: float) -> tuple:
 	"""
 	Calculates bounding box in WGS84 (EPSG:4326) coordinates for a given location and radius in meters.
 
+	The radius is measured in true ground metres: a square of side 2 * radius_meters is laid out in a
+	local azimuthal equidistant projection centred on the location and its densified outline is
+	projected back to WGS84, so the box has the same ground size at every latitude.
+
 	Args:
 		location: (latitude, longitude) in WGS84.
 		radius_meters: Radius in meters.
@@ -37,17 +45,41 @@ def _calculate_bounds_wgs84(location: tuple, radius_meters: float) -> tuple:
 		Tuple (west, south, east, north) in WGS84.
 	"""
 	lat, lon = location
-	transformer_wgs_to_utm = Transformer.from_crs("EPSG:4326", "EPSG:3857", always_xy=True)
-	transformer_utm_to_wgs = Transformer.from_crs("EPSG:3857", "EPSG:4326", always_xy=True)
+	local_crs = f"+proj=aeqd +lat_0={lat} +lon_0={lon} +x_0=0 +y_0=0 +ellps=WGS84 +units=m"
+	transformer_local_to_wgs = get_transformer(local_crs, "EPSG:4326")
 
-	center_x_utm, center_y_utm = transformer_wgs_to_utm.transform(lon, lat)
+	bounds = transformer_local_to_wgs.transform_bounds(-radius_meters, -radius_meters, radius_meters, radius_meters, densify_pts=21)
+	logger.debug(f"AOI bounds for {location} r={radius_meters}m: {bounds}, Web Mercator box would fetch "
+				 f"{fetch_area_factor(_calculate_bounds_web_mercator(location, radius_meters), radius_meters):.2f}x the requested area")
+	return bounds
 
-	minx_utm = center_x_utm - radius_meters
-	miny_utm = center_y_utm - radius_meters
-	maxx_utm = center_x_utm + radius_meters
-	maxy_utm = center_y_utm + radius_meters
-
-	west_lon, south_lat = transformer_utm_to_wgs.transform(minx_utm, miny_utm)
-	east_lon, north_lat = transformer_utm_to_wgs.transform(maxx_utm, maxy_utm)
+def _calculate_bounds_web_mercator(location: tuple, radius_meters: float) -> tuple:
+	"""
+	Legacy bounding box that offsets the location by radius_meters in EPSG:3857 units.
+	Web Mercator metres are stretched by 1/cos(lat), so this box only covers cos(lat)^2 of the requested
+	ground area. Kept for comparison through fetch_area_factor.
+	"""
+	lat, lon = location
+	transformer_wgs_to_merc = get_transformer("EPSG:4326", "EPSG:3857")
+	transformer_merc_to_wgs = get_transformer("EPSG:3857", "EPSG:4326")
 
+	center_x, center_y = transformer_wgs_to_merc.transform(lon, lat)
+	west_lon, south_lat = transformer_merc_to_wgs.transform(center_x - radius_meters, center_y - radius_meters)
+	east_lon, north_lat = transformer_merc_to_wgs.transform(center_x + radius_meters, center_y + radius_meters)
 	return (west_lon, south_lat, east_lon, north_lat)
+
+def fetch_area_factor(bounds: tuple, radius_meters: float) -> float:
+	"""
+	Reports how much ground a WGS84 bounding box covers relative to the requested square of side 2 * radius_meters.
+
+	Args:
+		bounds: (west, south, east, north) in WGS84.
+		radius_meters: Requested radius in meters.
+
+	Returns:
+		Ratio of the box's geodesic area to the requested area; > 1 means over-fetch, < 1 under-fetch.
+	"""
+	west, south, east, north = bounds
+	geod = pyproj.Geod(ellps="WGS84")
+	area, _ = geod.polygon_area_perimeter([west, east, east, west], [south, south, north, north])
+	return abs(area) / (2 * radius_meters) ** 2
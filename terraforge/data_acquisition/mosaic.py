@@ -0,0 +1,65 @@
+from osgeo import gdal, osr
+from utils.logging import logger
+
+WEB_MERCATOR_HALF_EXTENT = 20037508.342789244
+
+
+class TiledMosaicWriter:
+	"""
+	Writes XYZ map tiles as they arrive into a compressed EPSG:3857 GeoTIFF whose blocks are the tiles, so the
+	mosaic is never held in memory. Overviews are built on close.
+	"""
+
+	def __init__(self, output_path: str, zoom: int, min_tile_x: int, min_tile_y: int, tiles_wide: int, tiles_high: int, tile_size: int = 256, bands: int = 3):
+		self.output_path = output_path
+		self.zoom = zoom
+		self.min_tile_x = min_tile_x
+		self.min_tile_y = min_tile_y
+		self.tile_size = tile_size
+		self.bands = bands
+		self.width = tiles_wide * tile_size
+		self.height = tiles_high * tile_size
+
+		driver = gdal.GetDriverByName('GTiff')
+		self.dataset = driver.Create(output_path, self.width, self.height, bands, gdal.GDT_Byte, options=[
+			'TILED=YES', f'BLOCKXSIZE={tile_size}', f'BLOCKYSIZE={tile_size}',
+			'COMPRESS=DEFLATE', 'PREDICTOR=2', 'BIGTIFF=IF_SAFER', 'INTERLEAVE=PIXEL', 'PHOTOMETRIC=RGB'])
+		if self.dataset is None:
+			raise Exception(f"Failed to create mosaic file: {output_path}")
+
+		tile_span = 2 * WEB_MERCATOR_HALF_EXTENT / (2 ** zoom)
+		origin_x = -WEB_MERCATOR_HALF_EXTENT + min_tile_x * tile_span
+		origin_y = WEB_MERCATOR_HALF_EXTENT - min_tile_y * tile_span
+		pixel_size = tile_span / tile_size
+		self.dataset.SetGeoTransform((origin_x, pixel_size, 0, origin_y, 0, -pixel_size))
+		srs = osr.SpatialReference()
+		srs.ImportFromEPSG(3857)
+		self.dataset.SetProjection(srs.ExportToWkt())
+
+	def write_tile(self, tile_x: int, tile_y: int, pixels):
+		"""Writes one decoded tile (a tile_size x tile_size x bands uint8 array) at its place in the mosaic."""
+		x_offset = (tile_x - self.min_tile_x) * self.tile_size
+		y_offset = (tile_y - self.min_tile_y) * self.tile_size
+		self.dataset.WriteRaster(x_offset, y_offset, self.tile_size, self.tile_size, pixels.tobytes(),
+								 band_list=list(range(1, self.bands + 1)),
+								 buf_pixel_space=self.bands, buf_line_space=self.tile_size * self.bands, buf_band_space=1)
+
+	def close(self):
+		if self.dataset is None:
+			return
+		overview_levels = []
+		level = 2
+		while max(self.width, self.height) / level >= self.tile_size:
+			overview_levels.append(level)
+			level *= 2
+		if overview_levels:
+			self.dataset.BuildOverviews('AVERAGE', overview_levels)
+		self.dataset.FlushCache()
+		self.dataset = None
+		logger.info(f"Mosaic {self.width}x{self.height} written to {self.output_path} with overviews {overview_levels}")
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
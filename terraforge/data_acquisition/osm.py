@@ -1,24 +1,152 @@
-
+import math
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 import osmnx as ox
+import pandas as pd
 from pathlib import Path
-from utils.config import Config
+from utils.config import config
 from utils.logging import logger
 from data_acquisition.elevation import _calculate_bounds_wgs84
 
+# osmnx raises these when a bbox simply contains no matching features
+EMPTY_RESPONSE_ERRORS = ("InsufficientResponseError", "EmptyOverpassResponse")
+# A query too large for the server: the client read timed out, Overpass answered 429 Too Many Requests or 504 Gateway
+# Timeout, or its remark reported a runtime timeout or memory limit. Only these are split.
+OVERLOAD_ERRORS = ("ReadTimeout",)
+OVERLOAD_STATUS_CODES = (429, 504)
+OVERLOAD_REMARKS = ("runtime error: Query timed out", "out of memory")
+# osmnx reports HTTP errors as "<domain> responded: <status code> <reason> <body>"
+RESPONSE_STATUS = re.compile(r"responded: (\d{3})\b")
+
 
 def download_osm_data(location: tuple, radius_meters: float, output_path: str) -> Path:
-    """Downloads OSM buildings footporints and roads as GeoJSON"""
+    """
+    Downloads OSM buildings footporints and roads as GeoJSON.
+    The source is selected with config.OSM_DATA_SOURCE: "overpass" (default) or "pbf" for a local
+    .osm.pbf extract at config.OSM_PBF_PATH.
+    """
     logger.info(f"Downloading OSM buildings for location {location} with radius {radius_meters}m to {output_path}")
     try:
         bbox = _calculate_bounds_wgs84(location, radius_meters)
-        north, south, east, west = bbox[3], bbox[1], bbox[2], bbox[0]
+        if config.OSM_DATA_SOURCE == "pbf":
+            # Imported here so the Overpass source does not need osmium installed
+            from data_acquisition import osm_pbf
+            osm_pbf.extract_buildings(config.OSM_PBF_PATH, bbox, output_path)
+            return Path(output_path)
 
-        tags = {"building":True}
-        gdf = ox.features_from_bbox(north, south, east, west, tags=tags)
+        _configure_overpass_endpoint()
+        tags = {"building": True}
+        gdf = _download_features_split(bbox, tags)
         gdf.to_file(output_path, driver='GeoJSON')
         logger.info(f"OSM building data downloaded successfully to {output_path}")
     except Exception as e:
         logger.error(f"Failed to download OSM buildings: {e}")
         raise
 
+
+def _configure_overpass_endpoint():
+    """Points osmnx at config.OSM_OVERPASS_URL, e.g. a local Overpass instance or stand-in for offline runs."""
+    if not config.OSM_OVERPASS_URL:
+        return
+    if hasattr(ox.settings, "overpass_url"):
+        ox.settings.overpass_url = config.OSM_OVERPASS_URL
+    else:
+        ox.settings.overpass_endpoint = config.OSM_OVERPASS_URL
+    # A private endpoint has no /status slot accounting to wait on
+    ox.settings.overpass_rate_limit = False
+
+
+def _bbox_area_km2(bbox: tuple) -> float:
+    west, south, east, north = bbox
+    mid_lat = math.radians((south + north) / 2.0)
+    return (north - south) * 111.32 * (east - west) * 111.32 * math.cos(mid_lat)
+
+
+def _split_bbox(bbox: tuple, parts: int = 2) -> list:
+    """Splits (west, south, east, north) into a parts x parts grid of sub-boxes."""
+    west, south, east, north = bbox
+    step_x = (east - west) / parts
+    step_y = (north - south) / parts
+    return [(west + i * step_x, south + j * step_y, west + (i + 1) * step_x, south + (j + 1) * step_y)
+            for i in range(parts) for j in range(parts)]
+
+
+def _fetch_bbox(bbox: tuple, tags: dict):
+    west, south, east, north = bbox
+    try:
+        return ox.features_from_bbox(north, south, east, west, tags=tags)
+    except Exception as e:
+        if type(e).__name__ in EMPTY_RESPONSE_ERRORS:
+            return None
+        raise
+
+
+def _is_overload_error(e: Exception) -> bool:
+    if type(e).__name__ in OVERLOAD_ERRORS:
+        return True
+    message = str(e)
+    status_code = getattr(getattr(e, "response", None), "status_code", None)
+    if status_code is None:
+        match = RESPONSE_STATUS.search(message)
+        status_code = int(match.group(1)) if match else None
+    if status_code in OVERLOAD_STATUS_CODES:
+        return True
+    return any(remark in message for remark in OVERLOAD_REMARKS)
+
+
+def _download_features_split(bbox: tuple, tags: dict, max_workers: int = None):
+    """
+    Downloads features for bbox as parallel Overpass queries on sub-boxes, split into quadrants when the feature
+    density predicts too many features or the server is overloaded, merged and de-duplicated on (element_type, osmid).
+    """
+    max_workers = max_workers if max_workers else config.OSM_QUERY_WORKERS
+    grid_parts = max(1, math.ceil(math.sqrt(_bbox_area_km2(bbox) / config.OSM_MAX_QUERY_AREA_KM2)))
+    pending = deque((sub_bbox, 0) for sub_bbox in _split_bbox(bbox, grid_parts))
+    logger.info(f"Querying Overpass with {len(pending)} initial sub-boxes, {max_workers} in parallel")
+
+    results = []
+    max_density = 0.0 # features per km2, highest seen so far
+    queries = 0
+    splits = 0
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="overpass") as executor:
+        in_flight = {}
+        while pending or in_flight:
+            while pending and len(in_flight) < max_workers:
+                sub_bbox, depth = pending.popleft()
+                if depth < config.OSM_MAX_SPLIT_DEPTH and max_density * _bbox_area_km2(sub_bbox) > config.OSM_MAX_FEATURES_PER_QUERY:
+                    pending.extend((quadrant, depth + 1) for quadrant in _split_bbox(sub_bbox))
+                    splits += 1
+                    continue
+                in_flight[executor.submit(_fetch_bbox, sub_bbox, tags)] = (sub_bbox, depth)
+                queries += 1
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                sub_bbox, depth = in_flight.pop(future)
+                try:
+                    gdf = future.result()
+                except Exception as e:
+                    if depth >= config.OSM_MAX_SPLIT_DEPTH or not _is_overload_error(e):
+                        for pending_future in in_flight:
+                            pending_future.cancel()
+                        raise
+                    logger.warning(f"Overpass query for {sub_bbox} failed ({e}), splitting into quadrants")
+                    pending.extend((quadrant, depth + 1) for quadrant in _split_bbox(sub_bbox))
+                    splits += 1
+                    continue
+                if gdf is None or gdf.empty:
+                    continue
+                max_density = max(max_density, len(gdf) / max(_bbox_area_km2(sub_bbox), 1e-9))
+                results.append(gdf)
+
+    if not results:
+        raise Exception(f"No OSM features found for bounds {bbox}")
+
+    merged = pd.concat(results)
+    total = len(merged)
+    merged = merged[~merged.index.duplicated(keep='first')]
+    logger.info(f"Merged {total} features from {queries} queries ({splits} splits) into {len(merged)} unique features")
+    return merged
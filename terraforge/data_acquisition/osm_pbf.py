@@ -0,0 +1,155 @@
+import json
+import os
+import sqlite3
+import tempfile
+
+import numpy as np
+import osmium
+from utils.config import config
+from utils.logging import logger
+
+INDEX_SCHEMA_VERSION = "1"
+INSERT_BATCH_SIZE = 5000
+BUILDING_TAG_KEYS = ("building", "name", "height", "building:levels", "min_height", "roof:shape")
+
+
+class _BuildingIndexHandler(osmium.SimpleHandler):
+    """Streams building areas out of a .osm.pbf file into the sqlite sidecar in fixed-size batches."""
+
+    def __init__(self, connection: sqlite3.Connection):
+        super().__init__()
+        self.connection = connection
+        self.factory = osmium.geom.GeoJSONFactory()
+        self.feature_rows = []
+        self.count = 0
+
+    def area(self, a):
+        if "building" not in a.tags:
+            return
+        try:
+            geometry = self.factory.create_multipolygon(a)
+        except Exception:
+            # Broken multipolygons are common in OSM, skip them like Overpass/osmnx do
+            return
+
+        # Bounding box of the outer rings: the node coordinates are gathered once, then reduced per axis
+        coords = np.array([(node.lon, node.lat) for ring in a.outer_rings() for node in ring])
+        min_lon, min_lat = coords.min(axis=0).tolist()
+        max_lon, max_lat = coords.max(axis=0).tolist()
+
+        properties = {key: a.tags[key] for key in BUILDING_TAG_KEYS if key in a.tags}
+        element_type = "way" if a.from_way() else "relation"
+        self.feature_rows.append((a.orig_id(), element_type, json.dumps(properties), geometry, min_lon, max_lon, min_lat, max_lat))
+        if len(self.feature_rows) >= INSERT_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        cursor = self.connection.cursor()
+        for osmid, element_type, properties, geometry, min_lon, max_lon, min_lat, max_lat in self.feature_rows:
+            cursor.execute("INSERT INTO features (osmid, element_type, properties, geometry) VALUES (?, ?, ?, ?);",
+                           (osmid, element_type, properties, geometry))
+            cursor.execute("INSERT INTO features_rtree (id, min_lon, max_lon, min_lat, max_lat) VALUES (?, ?, ?, ?, ?);",
+                           (cursor.lastrowid, min_lon, max_lon, min_lat, max_lat))
+        self.connection.commit()
+        self.count += len(self.feature_rows)
+        self.feature_rows = []
+
+
+def _index_path(pbf_path: str) -> str:
+    index_dir = config.OSM_PBF_INDEX_DIR if config.OSM_PBF_INDEX_DIR else os.path.dirname(os.path.abspath(pbf_path))
+    os.makedirs(index_dir, exist_ok=True)
+    return os.path.join(index_dir, os.path.basename(pbf_path) + ".buildings.sqlite")
+
+
+def _source_signature(pbf_path: str) -> str:
+    stat = os.stat(pbf_path)
+    return f"{INDEX_SCHEMA_VERSION}:{stat.st_size}:{int(stat.st_mtime)}"
+
+
+def _index_is_current(index_path: str, signature: str) -> bool:
+    if not os.path.exists(index_path):
+        return False
+    try:
+        connection = sqlite3.connect(index_path)
+        row = connection.execute("SELECT value FROM meta WHERE key='source_signature';").fetchone()
+        connection.close()
+        return row is not None and row[0] == signature
+    except sqlite3.DatabaseError:
+        return False
+
+
+def build_building_index(pbf_path: str) -> str:
+    """
+    Builds (or reuses, unless the extract changed) the sqlite R*Tree index sidecar of the buildings in a .osm.pbf
+    extract in one streaming osmium pass, and returns its path.
+    """
+    index_path = _index_path(pbf_path)
+    signature = _source_signature(pbf_path)
+    if _index_is_current(index_path, signature):
+        logger.debug(f"Reusing building index {index_path}")
+        return index_path
+
+    logger.info(f"Building spatial index for {pbf_path} at {index_path}")
+    tmp_index_path = index_path + ".tmp"
+    if os.path.exists(tmp_index_path):
+        os.remove(tmp_index_path)
+    connection = sqlite3.connect(tmp_index_path)
+    connection.executescript("""
+        CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE features (id INTEGER PRIMARY KEY, osmid INTEGER, element_type TEXT, properties TEXT, geometry TEXT);
+        CREATE VIRTUAL TABLE features_rtree USING rtree(id, min_lon, max_lon, min_lat, max_lat);
+    """)
+
+    node_cache_fd, node_cache_path = tempfile.mkstemp(prefix="osm_nodes_", suffix=".cache", dir=os.path.dirname(index_path))
+    os.close(node_cache_fd)
+    try:
+        handler = _BuildingIndexHandler(connection)
+        handler.apply_file(pbf_path, locations=True, idx=f"sparse_file_array,{node_cache_path}")
+        handler.flush()
+        connection.execute("INSERT INTO meta (key, value) VALUES ('source_signature', ?);", (signature,))
+        connection.commit()
+        connection.close()
+        os.replace(tmp_index_path, index_path)
+    finally:
+        if os.path.exists(node_cache_path):
+            os.remove(node_cache_path)
+
+    logger.info(f"Indexed {handler.count} buildings from {pbf_path}")
+    return index_path
+
+
+def extract_buildings(pbf_path: str, bbox: tuple, output_path: str):
+    """
+    Writes every building of a .osm.pbf extract intersecting bbox to a GeoJSON FeatureCollection.
+
+    Args:
+        pbf_path: Path to the .osm.pbf extract.
+        bbox: (west, south, east, north) in WGS84.
+        output_path: Path of the GeoJSON file to write. The feature layout matches the osmnx output
+            (element_type and osmid properties alongside the OSM tags).
+    """
+    if not os.path.exists(pbf_path):
+        raise FileNotFoundError(f"OSM extract not found: {pbf_path}")
+    index_path = build_building_index(pbf_path)
+    west, south, east, north = bbox
+
+    connection = sqlite3.connect(index_path)
+    rows = connection.execute(
+        "SELECT f.osmid, f.element_type, f.properties, f.geometry FROM features_rtree r JOIN features f ON f.id = r.id "
+        "WHERE r.min_lon <= ? AND r.max_lon >= ? AND r.min_lat <= ? AND r.max_lat >= ?;",
+        (east, west, north, south))
+
+    count = 0
+    with open(output_path, 'w') as f:
+        f.write('{"type": "FeatureCollection", "features": [\n')
+        for osmid, element_type, properties, geometry in rows:
+            properties = json.loads(properties)
+            properties["element_type"] = element_type
+            properties["osmid"] = osmid
+            if count:
+                f.write(",\n")
+            f.write(f'{{"type": "Feature", "properties": {json.dumps(properties)}, "geometry": {geometry}}}')
+            count += 1
+        f.write("\n]}\n")
+    connection.close()
+    logger.info(f"Extracted {count} buildings from {pbf_path} to {output_path}")
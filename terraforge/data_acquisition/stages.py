@@ -0,0 +1,83 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils.logging import logger
+from data_acquisition import elevation, osm, textures
+
+
+class AcquisitionStage:
+	"""A single independent acquisition step, e.g. the DEM download."""
+
+	def __init__(self, name: str, func, args: tuple = (), kwargs: dict = None, required: bool = True):
+		self.name = name
+		self.func = func
+		self.args = args
+		self.kwargs = kwargs if kwargs else {}
+		self.required = required
+
+
+class AcquisitionError(Exception):
+	"""Raised when a required acquisition stage failed. errors maps stage name to the exception."""
+
+	def __init__(self, errors: dict):
+		self.errors = errors
+		super().__init__("; ".join(f"{name}: {error}" for name, error in errors.items()))
+
+
+def run_acquisition_stages(stages: list, progress_callback=None) -> dict:
+	"""
+	Runs independent, I/O-bound acquisition stages concurrently.
+
+	Every stage runs to completion even if another one fails, so a failed optional layer does not
+	discard the data of the others.
+
+	Args:
+		stages: List of AcquisitionStage.
+		progress_callback: Optional callable(stage_name, message) called from worker threads when a stage
+			starts, finishes or fails.
+
+	Returns:
+		Dict mapping the name of every failed stage to its exception; empty if all stages succeeded.
+
+	Raises:
+		AcquisitionError: If at least one required stage failed, after all stages have finished.
+	"""
+	def report(stage_name, message):
+		logger.info(f"[{stage_name}] {message}")
+		if progress_callback is not None:
+			progress_callback(stage_name, message)
+
+	def run_stage(stage):
+		report(stage.name, "started")
+		started_at = time.perf_counter()
+		stage.func(*stage.args, **stage.kwargs)
+		return time.perf_counter() - started_at
+
+	errors = {}
+	with ThreadPoolExecutor(max_workers=len(stages), thread_name_prefix="acquisition") as executor:
+		futures = {executor.submit(run_stage, stage): stage for stage in stages}
+		for future in as_completed(futures):
+			stage = futures[future]
+			try:
+				elapsed = future.result()
+				report(stage.name, f"finished in {elapsed:.1f}s")
+			except Exception as e:
+				errors[stage.name] = e
+				report(stage.name, f"failed{'' if stage.required else ' (optional, continuing without it)'}: {e}")
+
+	required_errors = {stage.name: errors[stage.name] for stage in stages if stage.required and stage.name in errors}
+	if required_errors:
+		raise AcquisitionError(required_errors)
+	return errors
+
+
+def default_acquisition_stages(origin_location: tuple, radius_meters: float, dem_output_path: str, osm_output_path: str,
+							   texture_output_dir: str, mapbox_api_key: str = None, tile_workers: int = None,
+							   texture_meters_per_pixel: float = None, max_texture_size: int = None) -> list:
+	"""The standard DEM, OSM buildings and satellite texture stages. Only the DEM is required to build a world."""
+	return [
+		AcquisitionStage("dem", elevation.download_dem, (origin_location, radius_meters, dem_output_path)),
+		AcquisitionStage("buildings", osm.download_osm_data, (origin_location, radius_meters, osm_output_path), required=False),
+		AcquisitionStage("textures", textures.download_satellite_texture_tiles, (origin_location, radius_meters, texture_output_dir),
+						 {"mapbox_api_key": mapbox_api_key, "max_workers": tile_workers,
+						  "target_meters_per_pixel": texture_meters_per_pixel, "max_texture_size": max_texture_size}, required=False),
+	]
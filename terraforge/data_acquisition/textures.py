@@ -1,23 +1,106 @@
 import os
-import requests
+import math
+import numpy as np
 from PIL import Image
 from io import BytesIO
 from utils.config import config
 from utils.logging import logger
 from data_acquisition.elevation import _calculate_bounds_wgs84
+from data_acquisition.tile_fetcher import TileFetcher
+from data_acquisition.tile_store import TileStore, tile_server_key
+from data_acquisition.mosaic import TiledMosaicWriter
 
 MAPBOX_STYLE = "satellite-v9"
-MAPBOX_ZOOM_LEVEL = 15
+MAPBOX_ZOOM_LEVEL = 15 # used when no target resolution is requested
+MAPBOX_MIN_ZOOM_LEVEL = 1
+MAPBOX_MAX_ZOOM_LEVEL = 19
+MAPBOX_TILE_SIZE = 256
+ESTIMATED_TILE_BYTES = 25 * 1024 # typical 256px satellite JPEG tile
+EARTH_CIRCUMFERENCE_METERS = 2 * math.pi * 6378137.0
 
-def download_satellite_texture_tiles(location: tuple, radius_meters: float, output_dir: str, mapbox_api_key: str = None):
+def _deg2num(lat_deg: float, lon_deg: float, zoom: int) -> tuple:
+	lat_rad = math.radians(lat_deg)
+	n = 2.0 ** zoom
+	xtile = int((lon_deg + 180.0) / 360.0 * n)
+	ytile = int((1.0 - math.log(math.tan(lat_rad) + 1 / math.cos(lat_rad)) / math.pi) / 2.0 * n)
+	return (xtile, ytile)
+
+def _tile_ranges(bbox_wgs84: tuple, zoom: int) -> tuple:
+	"""Returns the (tiles_x, tiles_y) ranges covering (west, south, east, north) at zoom."""
+	west, south, east, north = bbox_wgs84
+	top_left_tile = _deg2num(north, west, zoom)
+	bottom_right_tile = _deg2num(south, east, zoom)
+	return range(top_left_tile[0], bottom_right_tile[0] + 1), range(top_left_tile[1], bottom_right_tile[1] + 1)
+
+def ground_resolution(latitude: float, zoom: int, tile_size: int = MAPBOX_TILE_SIZE) -> float:
+	"""Ground metres per pixel of Web Mercator tiles at the given latitude and zoom."""
+	return EARTH_CIRCUMFERENCE_METERS * math.cos(math.radians(latitude)) / (tile_size * 2 ** zoom)
+
+def estimate_texture_download(bbox_wgs84: tuple, zoom: int, tile_size: int = MAPBOX_TILE_SIZE) -> dict:
+	"""
+	Estimates the cost of fetching bbox at zoom.
+
+	Returns:
+		Dict with the tile count, estimated download bytes, mosaic width/height in pixels,
+		uncompressed RGB mosaic bytes and ground metres per pixel at the bbox centre.
+	"""
+	tiles_x, tiles_y = _tile_ranges(bbox_wgs84, zoom)
+	width = len(tiles_x) * tile_size
+	height = len(tiles_y) * tile_size
+	center_lat = (bbox_wgs84[1] + bbox_wgs84[3]) / 2.0
+	return {
+		'zoom': zoom,
+		'tiles': len(tiles_x) * len(tiles_y),
+		'download_bytes': len(tiles_x) * len(tiles_y) * ESTIMATED_TILE_BYTES,
+		'width': width,
+		'height': height,
+		'texture_bytes': width * height * 3,
+		'meters_per_pixel': ground_resolution(center_lat, zoom, tile_size),
+	}
+
+def select_zoom_level(bbox_wgs84: tuple, target_meters_per_pixel: float = None, max_texture_size: int = None, max_texture_bytes: int = None, tile_size: int = MAPBOX_TILE_SIZE) -> int:
+	"""
+	Picks the coarsest zoom at least as fine as target_meters_per_pixel (MAPBOX_ZOOM_LEVEL without a target), then
+	zooms out until the mosaic fits max_texture_size pixels per side and max_texture_bytes of uncompressed RGB.
+	"""
+	center_lat = (bbox_wgs84[1] + bbox_wgs84[3]) / 2.0
+	if target_meters_per_pixel:
+		zoom = math.ceil(math.log2(EARTH_CIRCUMFERENCE_METERS * math.cos(math.radians(center_lat)) / (tile_size * target_meters_per_pixel)))
+	else:
+		zoom = MAPBOX_ZOOM_LEVEL
+	zoom = min(max(zoom, MAPBOX_MIN_ZOOM_LEVEL), MAPBOX_MAX_ZOOM_LEVEL)
+
+	while zoom > MAPBOX_MIN_ZOOM_LEVEL:
+		estimate = estimate_texture_download(bbox_wgs84, zoom, tile_size)
+		too_large = max_texture_size and max(estimate['width'], estimate['height']) > max_texture_size
+		too_heavy = max_texture_bytes and estimate['texture_bytes'] > max_texture_bytes
+		if not (too_large or too_heavy):
+			break
+		zoom -= 1
+	return zoom
+
+def _decode_tile(content: bytes, tile_size: int) -> np.ndarray:
+	"""Decodes raw tile bytes into a tile_size x tile_size x 3 uint8 array."""
+	tile_image = Image.open(BytesIO(content)).convert('RGB')
+	if tile_image.size != (tile_size, tile_size):
+		tile_image = tile_image.resize((tile_size, tile_size), Image.LANCZOS)
+	return np.asarray(tile_image)
+
+def download_satellite_texture_tiles(location: tuple, radius_meters: float, output_dir: str, mapbox_api_key: str = None, max_workers: int = None,
+									 target_meters_per_pixel: float = None, max_texture_size: int = None):
 	"""
 	Downloads satellite texture tiles from Mapbox Static Tiles API for the given location and radius.
 
 	Args:
 		location: (latitude, longitude) tuple in WGS84 (EPSG:4326).
 		radius_meters: Radius in meters around the location.
-		output_dir: Directory to save the downloaded tiles.
+		output_dir: Directory to save the merged texture (satellite_texture.tif, a tiled GeoTIFF in EPSG:3857).
+			Individual tiles are kept in the shared tile store.
 		mapbox_api_key: Optional Mapbox API key. If None, it will try to use the one from config.
+		max_workers: Maximum number of concurrent tile downloads. Defaults to config.TILE_DOWNLOAD_WORKERS.
+		target_meters_per_pixel: Desired ground resolution. Defaults to config.TEXTURE_TARGET_METERS_PER_PIXEL;
+			if neither is set MAPBOX_ZOOM_LEVEL is used.
+		max_texture_size: Maximum mosaic size in pixels per side. Defaults to config.TEXTURE_MAX_SIZE_PX.
 	"""
 	logger.info(f"Downloading satellite texture tiles for location {location} with radius {radius_meters}m to {output_dir}")
 	if mapbox_api_key is None:
@@ -26,50 +109,45 @@ def download_satellite_texture_tiles(location: tuple, radius_meters: float, outp
 			logger.warning("Mapbox API key not provided in function argument or configuration. Using public access (may be limited).")
 
 	bbox_wgs84 = _calculate_bounds_wgs84(location, radius_meters) # (west, south, east, north)
-	west, south, east, north = bbox_wgs84
-
-	tile_size = 256 # Mapbox tile size is 256x256 pixels
-
-	# Calculate tile coordinates (rough approximation for simplicity, consider more precise tile calculations for production)
-	def deg2num(lat_deg, lon_deg, zoom):
-		lat_rad = lat_deg * (3.141592653589793 / 180.0)
-		n = 2.0 ** zoom
-		xtile = int((lon_deg + 180.0) / 360.0 * n)
-		ytile = int((1.0 - math.log(math.tan(lat_rad) + 1 / math.cos(lat_rad)) / 3.141592653589793) / 2.0 * n)
-		return (xtile, ytile)
+	tile_size = MAPBOX_TILE_SIZE
 
-	import math
+	if target_meters_per_pixel is None:
+		target_meters_per_pixel = config.TEXTURE_TARGET_METERS_PER_PIXEL
+	if max_texture_size is None:
+		max_texture_size = config.TEXTURE_MAX_SIZE_PX
+	zoom = select_zoom_level(bbox_wgs84, target_meters_per_pixel, max_texture_size, config.TEXTURE_MAX_BYTES, tile_size)
+	estimate = estimate_texture_download(bbox_wgs84, zoom, tile_size)
+	logger.info(f"Texture plan: zoom {zoom} ({estimate['meters_per_pixel']:.2f} m/px), {estimate['tiles']} tiles, "
+				f"~{estimate['download_bytes'] / (1024 * 1024):.1f} MiB download, {estimate['width']}x{estimate['height']} px texture "
+				f"({estimate['texture_bytes'] / (1024 * 1024):.1f} MiB uncompressed)")
 
-	top_left_tile = deg2num(north, west, MAPBOX_ZOOM_LEVEL)
-	bottom_right_tile = deg2num(south, east, MAPBOX_ZOOM_LEVEL)
+	tiles_x, tiles_y = _tile_ranges(bbox_wgs84, zoom)
 
-	tiles_x = range(top_left_tile[0], bottom_right_tile[0] + 1)
-	tiles_y = range(top_left_tile[1], bottom_right_tile[1] + 1)
+	access_token = mapbox_api_key if mapbox_api_key else 'public'
+	url_template = f"https://api.mapbox.com/styles/v1/mapbox/{MAPBOX_STYLE}/tiles/{tile_size}/{{z}}/{{x}}/{{y}}?access_token={access_token}"
+	tile_jobs = [
+		((zoom, x_tile, y_tile), url_template.replace("{z}", str(zoom)).replace("{x}", str(x_tile)).replace("{y}", str(y_tile)))
+		for x_tile in tiles_x for y_tile in tiles_y
+	]
 
-	merged_image = Image.new('RGB', ((tiles_x[-1] - tiles_x[0] + 1) * tile_size, (tiles_y[-1] - tiles_y[0] + 1) * tile_size))
-
-	for x_tile in tiles_x:
-		for y_tile in tiles_y:
-			tile_url = f"https://api.mapbox.com/styles/v1/mapbox/{MAPBOX_STYLE}/tiles/{MAPBOX_ZOOM_LEVEL}/{x_tile}/{y_tile}?access_token={mapbox_api_key if mapbox_api_key else 'public'}"
+	output_texture_path = os.path.join(output_dir, "satellite_texture.tif")
+	tile_store = TileStore()
+	mosaic = TiledMosaicWriter(output_texture_path, zoom, tiles_x[0], tiles_y[0], len(tiles_x), len(tiles_y), tile_size=tile_size)
+	with mosaic, TileFetcher(max_workers=max_workers) as fetcher:
+		# Tiles are downloaded (or read from the tile store) on the fetcher's worker threads and written to the mosaic as they complete
+		# The tile store keeps the server's bytes verbatim; they are decoded exactly once, on the worker thread
+		tiles = fetcher.fetch_many(tile_jobs, store=tile_store, server=tile_server_key(url_template), decode=lambda content: _decode_tile(content, tile_size))
+		for (_, x_tile, y_tile), pixels, error in tiles:
+			if error is not None:
+				logger.error(f"Error downloading or decoding tile {x_tile}_{y_tile}: {error}")
+				continue
 			try:
-				response = requests.get(tile_url, stream=True)
-				response.raise_for_status()
-
-				tile_image = Image.open(BytesIO(response.content))
-				x_offset = (x_tile - top_left_tile[0]) * tile_size
-				y_offset = (y_tile - top_left_tile[1]) * tile_size
-				merged_image.paste(tile_image, (x_offset, y_offset))
-
-				tile_filename = f"tile_{x_tile}_{y_tile}.png"
-				tile_output_path = os.path.join(output_dir, tile_filename)
-				tile_image.save(tile_output_path)
-				logger.debug(f"Downloaded tile {x_tile}_{y_tile} to {tile_output_path}")
-
-			except requests.exceptions.RequestException as e:
-				logger.error(f"Error downloading tile {x_tile}_{y_tile}: {e}")
+				mosaic.write_tile(x_tile, y_tile, pixels)
+				logger.debug(f"Merged tile {x_tile}_{y_tile}")
 			except Exception as e:
+				fetcher.stats.record_failure()
 				logger.error(f"Error processing tile {x_tile}_{y_tile}: {e}")
 
-	output_texture_path = os.path.join(output_dir, "satellite_texture.png")
-	merged_image.save(output_texture_path)
+		logger.info(f"Satellite tile download finished: {fetcher.stats.summary()}")
+
 	logger.info(f"Merged satellite texture saved to {output_texture_path}")
@@ -0,0 +1,203 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+from requests.adapters import HTTPAdapter
+from utils.config import config
+from utils.logging import logger
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Jobs submitted but not yet yielded by fetch_many, per worker; bounds the decoded tiles held in memory
+FETCH_IN_FLIGHT_PER_WORKER = 2
+
+
+class FetchStats:
+	"""Thread-safe counters describing a batch of tile downloads."""
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self.tiles = 0
+		self.bytes = 0
+		self.failures = 0
+		self.retries = 0
+		self.cache_hits = 0
+		self.revalidated = 0
+		self.started_at = time.perf_counter()
+
+	def record_success(self, num_bytes: int):
+		with self._lock:
+			self.tiles += 1
+			self.bytes += num_bytes
+
+	def record_failure(self):
+		with self._lock:
+			self.failures += 1
+
+	def record_retry(self):
+		with self._lock:
+			self.retries += 1
+
+	def record_cache_hit(self, revalidated: bool = False):
+		with self._lock:
+			self.cache_hits += 1
+			if revalidated:
+				self.revalidated += 1
+
+	@property
+	def elapsed(self) -> float:
+		return time.perf_counter() - self.started_at
+
+	def summary(self) -> str:
+		elapsed = max(self.elapsed, 1e-9)
+		return (f"{self.tiles} tiles, {self.bytes / (1024 * 1024):.2f} MiB in {elapsed:.2f}s "
+				f"({self.tiles / elapsed:.1f} tiles/s), {self.failures} failed, {self.retries} retries, "
+				f"{self.cache_hits} from cache ({self.revalidated} revalidated)")
+
+
+class TileFetcher:
+	"""
+	Bounded-concurrency HTTP tile downloader sharing one pooled requests.Session between its worker threads.
+	Connection errors, 429 and 5xx responses are retried with exponential backoff.
+	"""
+
+	def __init__(self, max_workers: int = None, retries: int = None, backoff: float = None, timeout: float = None, headers: dict = None):
+		self.max_workers = max_workers if max_workers else config.TILE_DOWNLOAD_WORKERS
+		self.retries = retries if retries is not None else config.TILE_DOWNLOAD_RETRIES
+		self.backoff = backoff if backoff is not None else config.TILE_DOWNLOAD_BACKOFF
+		self.timeout = timeout if timeout is not None else config.TILE_DOWNLOAD_TIMEOUT
+		self.stats = FetchStats()
+
+		self.session = requests.Session()
+		adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers)
+		self.session.mount("https://", adapter)
+		self.session.mount("http://", adapter)
+		if headers:
+			self.session.headers.update(headers)
+
+	def _get(self, url: str, headers: dict = None) -> requests.Response:
+		attempt = 0
+		while True:
+			try:
+				response = self.session.get(url, headers=headers, timeout=self.timeout)
+				if response.status_code in RETRYABLE_STATUS_CODES:
+					raise requests.exceptions.HTTPError(f"{response.status_code} Server Error for url: {url}", response=response)
+				response.raise_for_status()
+				return response
+			except requests.exceptions.RequestException as e:
+				status = e.response.status_code if e.response is not None else None
+				if attempt >= self.retries or (status is not None and status not in RETRYABLE_STATUS_CODES):
+					raise
+				delay = self.backoff * (2 ** attempt) * (1 + random.random())
+				logger.debug(f"Retrying {url} in {delay:.2f}s after error: {e}")
+				self.stats.record_retry()
+				time.sleep(delay)
+				attempt += 1
+
+	def fetch(self, url: str) -> bytes:
+		"""Downloads a single URL, retrying transient failures. Raises the last error if all attempts fail."""
+		try:
+			content = self._get(url).content
+		except requests.exceptions.RequestException:
+			self.stats.record_failure()
+			raise
+		self.stats.record_success(len(content))
+		return content
+
+	def fetch_tile(self, store, server: str, zoom: int, x: int, y: int, url: str) -> bytes:
+		"""
+		Returns the tile bytes for (server, zoom, x, y), going through the tile store.
+
+		Fresh tiles are served from the store without touching the network. Stale tiles are
+		revalidated with If-None-Match; if the server cannot be reached the stale copy is used.
+		"""
+		cached = store.get(server, zoom, x, y)
+		if cached is not None and cached.fresh:
+			self.stats.record_cache_hit()
+			return cached.data
+
+		headers = {"If-None-Match": cached.etag} if cached is not None and cached.etag else None
+		try:
+			response = self._get(url, headers=headers)
+		except requests.exceptions.RequestException as e:
+			if cached is not None:
+				logger.debug(f"Using stale cached tile {server} {zoom}/{x}/{y}: {e}")
+				self.stats.record_cache_hit()
+				return cached.data
+			self.stats.record_failure()
+			raise
+
+		if response.status_code == 304 and cached is not None:
+			store.touch(server, zoom, x, y, etag=response.headers.get("ETag"))
+			self.stats.record_cache_hit(revalidated=True)
+			return cached.data
+
+		content = response.content
+		store.put(server, zoom, x, y, content, etag=response.headers.get("ETag"))
+		self.stats.record_success(len(content))
+		return content
+
+	def _fetch_and_decode(self, decode, fetch, *args):
+		content = fetch(*args)
+		try:
+			return decode(content)
+		except Exception:
+			self.stats.record_failure()
+			raise
+
+	def fetch_many(self, jobs, store=None, server: str = None, decode=None):
+		"""
+		Downloads many URLs concurrently.
+
+		Args:
+			jobs: Iterable of (key, url) pairs. The key is passed through untouched.
+			store: Optional TileStore. When given, every key must be a (zoom, x, y) tuple
+				and tiles are read from and written to the store under the server name.
+			server: Server or style name used as the tile store key.
+			decode: Optional callable applied to the raw bytes on the worker thread, e.g. image decoding,
+				so CPU work overlaps with the network I/O of other tiles. Its return value replaces the content.
+
+		Yields:
+			(key, content, error) tuples in completion order. Exactly one of content and error is None.
+
+		Jobs are submitted lazily, at most FETCH_IN_FLIGHT_PER_WORKER per worker ahead of the consumer, and every
+		result is released once yielded, so only a few tiles are held in memory however many jobs there are.
+		"""
+		max_in_flight = self.max_workers * FETCH_IN_FLIGHT_PER_WORKER
+		jobs = iter(jobs)
+		with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tile_fetch") as executor:
+			futures = {}
+			exhausted = False
+			while True:
+				while not exhausted and len(futures) < max_in_flight:
+					job = next(jobs, None)
+					if job is None:
+						exhausted = True
+						break
+					key, url = job
+					args = (self.fetch_tile, store, server, *key, url) if store is not None else (self.fetch, url)
+					if decode is not None:
+						args = (self._fetch_and_decode, decode) + args
+					futures[executor.submit(*args)] = key
+				if not futures:
+					break
+				done, _ = wait(futures, return_when=FIRST_COMPLETED)
+				for future in done:
+					key = futures.pop(future)
+					try:
+						result = future.result()
+					except Exception as e:
+						yield key, None, e
+					else:
+						yield key, result, None
+
+	def close(self):
+		self.session.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
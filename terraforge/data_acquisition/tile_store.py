@@ -0,0 +1,202 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit, parse_qsl
+from utils.config import config
+from utils.logging import logger
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tile_blobs (
+	hash TEXT PRIMARY KEY,
+	data BLOB NOT NULL,
+	size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tile_index (
+	server TEXT NOT NULL,
+	zoom INTEGER NOT NULL,
+	x INTEGER NOT NULL,
+	y INTEGER NOT NULL,
+	hash TEXT NOT NULL,
+	etag TEXT,
+	fetched_at REAL NOT NULL,
+	last_access REAL NOT NULL,
+	PRIMARY KEY (server, zoom, x, y)
+);
+CREATE INDEX IF NOT EXISTS tile_index_last_access ON tile_index (last_access);
+CREATE INDEX IF NOT EXISTS tile_index_hash ON tile_index (hash);
+"""
+
+# Run the size-cap check every N writes instead of on every put
+EVICTION_CHECK_INTERVAL = 256
+# Last-access times of cache hits are written in batches of N, or with the next write, instead of on every get
+ACCESS_FLUSH_INTERVAL = 256
+
+# Mapbox Static Tiles path: /styles/v1/<owner>/<style>/tiles[/<tile size>]/{z}/{x}/{y}
+MAPBOX_STYLE_PATH = re.compile(r"^/styles/v1/[^/]+/([^/]+)/tiles/(?:(\d+)/)?")
+MAPBOX_DEFAULT_TILE_SIZE = 512
+# Load-balancing subdomains (a.tile..., {s}.tile...) serve the same tiles
+SHARD_SUBDOMAIN = re.compile(r"^(?:[a-d0-9]|\{s\})\.")
+# Query parameters carrying credentials rather than selecting imagery
+CREDENTIAL_PARAMETER = re.compile(r"token|key|secret|signature|auth", re.IGNORECASE)
+
+
+def tile_server_key(url_template: str) -> str:
+	"""
+	Normalises a tile URL template to its store key: mapbox/<style>/<tile size> for Mapbox styles, otherwise host,
+	path and query without the scheme, shard subdomain and credential parameters.
+	"""
+	parts = urlsplit(url_template)
+	match = MAPBOX_STYLE_PATH.match(parts.path)
+	if parts.netloc == "api.mapbox.com" and match:
+		return f"mapbox/{match.group(1)}/{match.group(2) if match.group(2) else MAPBOX_DEFAULT_TILE_SIZE}"
+	query = "&".join(f"{name}={value}" for name, value in parse_qsl(parts.query, keep_blank_values=True) if not CREDENTIAL_PARAMETER.search(name))
+	return SHARD_SUBDOMAIN.sub("", parts.netloc) + parts.path + (f"?{query}" if query else "")
+
+
+class CachedTile:
+	def __init__(self, data: bytes, etag: str, fetched_at: float, ttl: float):
+		self.data = data
+		self.etag = etag
+		self.fetched_at = fetched_at
+		self.fresh = (time.time() - fetched_at) < ttl
+
+
+class TileStore:
+	"""
+	Persistent SQLite tile cache shared by the texture pipeline and the map widget, keyed by (server, zoom, x, y)
+	with content-addressed image bytes. Stale entries are revalidated by ETag and the least recently used tiles are
+	evicted beyond max_bytes.
+	"""
+
+	def __init__(self, path: str = None, ttl_seconds: float = None, max_bytes: int = None):
+		self.path = path if path else config.TILE_STORE_PATH
+		self.ttl_seconds = ttl_seconds if ttl_seconds is not None else config.TILE_STORE_TTL_SECONDS
+		self.max_bytes = max_bytes if max_bytes is not None else config.TILE_STORE_MAX_BYTES
+		self._local = threading.local()
+		self._write_lock = threading.Lock()
+		self._puts_since_eviction = 0
+		self._access_lock = threading.Lock()
+		self._pending_access = {}
+
+		directory = os.path.dirname(self.path)
+		if directory:
+			os.makedirs(directory, exist_ok=True)
+		connection = self._connection()
+		connection.executescript(SCHEMA)
+		connection.commit()
+		logger.debug(f"Tile store opened at {self.path}")
+
+	def _connection(self) -> sqlite3.Connection:
+		# sqlite3 connections cannot be shared between threads, so each thread gets its own
+		connection = getattr(self._local, "connection", None)
+		if connection is None:
+			connection = sqlite3.connect(self.path, timeout=30)
+			connection.execute("PRAGMA journal_mode=WAL;")
+			connection.execute("PRAGMA synchronous=NORMAL;")
+			self._local.connection = connection
+		return connection
+
+	def _flush_access(self, connection: sqlite3.Connection):
+		# Writes the batched last-access times; the caller holds the write lock and commits
+		with self._access_lock:
+			pending, self._pending_access = self._pending_access, {}
+		if pending:
+			connection.executemany("UPDATE tile_index SET last_access=? WHERE server=? AND zoom=? AND x=? AND y=?;",
+								   [(accessed_at, *key) for key, accessed_at in pending.items()])
+
+	def get(self, server: str, zoom: int, x: int, y: int):
+		"""Returns a CachedTile for the given key, or None if the tile is not stored or fails its SHA-256 check."""
+		connection = self._connection()
+		row = connection.execute(
+			"SELECT b.data, t.etag, t.fetched_at, t.hash FROM tile_index t JOIN tile_blobs b ON b.hash = t.hash "
+			"WHERE t.server=? AND t.zoom=? AND t.x=? AND t.y=?;",
+			(server, zoom, x, y)).fetchone()
+		if row is None:
+			return None
+		if hashlib.sha256(row[0]).hexdigest() != row[3]:
+			# Corrupted blob: drop it so the tile is downloaded again
+			logger.warning(f"Tile store entry {server} {zoom}/{x}/{y} failed its integrity check, discarding it")
+			with self._write_lock:
+				connection.execute("DELETE FROM tile_index WHERE hash=?;", (row[3],))
+				connection.execute("DELETE FROM tile_blobs WHERE hash=?;", (row[3],))
+				connection.commit()
+			return None
+		with self._access_lock:
+			self._pending_access[(server, zoom, x, y)] = time.time()
+			flush = len(self._pending_access) >= ACCESS_FLUSH_INTERVAL
+		if flush:
+			with self._write_lock:
+				self._flush_access(connection)
+				connection.commit()
+		return CachedTile(row[0], row[1], row[2], self.ttl_seconds)
+
+	def put(self, server: str, zoom: int, x: int, y: int, data: bytes, etag: str = None):
+		"""Stores the raw tile bytes exactly as received from the server."""
+		digest = hashlib.sha256(data).hexdigest()
+		now = time.time()
+		connection = self._connection()
+		with self._write_lock:
+			self._flush_access(connection)
+			connection.execute("INSERT OR IGNORE INTO tile_blobs (hash, data, size) VALUES (?, ?, ?);",
+							   (digest, sqlite3.Binary(data), len(data)))
+			connection.execute("INSERT OR REPLACE INTO tile_index (server, zoom, x, y, hash, etag, fetched_at, last_access) "
+							   "VALUES (?, ?, ?, ?, ?, ?, ?, ?);",
+							   (server, zoom, x, y, digest, etag, now, now))
+			connection.commit()
+			self._puts_since_eviction += 1
+			check_eviction = self._puts_since_eviction >= EVICTION_CHECK_INTERVAL
+		if check_eviction:
+			self.evict()
+
+	def touch(self, server: str, zoom: int, x: int, y: int, etag: str = None):
+		"""Marks a stored tile as freshly validated, e.g. after a 304 Not Modified response."""
+		now = time.time()
+		connection = self._connection()
+		with self._write_lock:
+			self._flush_access(connection)
+			connection.execute("UPDATE tile_index SET fetched_at=?, last_access=?, etag=COALESCE(?, etag) "
+							   "WHERE server=? AND zoom=? AND x=? AND y=?;",
+							   (now, now, etag, server, zoom, x, y))
+			connection.commit()
+
+	def size_bytes(self) -> int:
+		row = self._connection().execute("SELECT COALESCE(SUM(size), 0) FROM tile_blobs;").fetchone()
+		return row[0]
+
+	def evict(self):
+		"""Drops least recently used tiles until the store is below its size cap."""
+		connection = self._connection()
+		with self._write_lock:
+			self._puts_since_eviction = 0
+			self._flush_access(connection)
+			connection.commit()
+			excess = self.size_bytes() - self.max_bytes
+			if excess <= 0:
+				return
+			freed = 0
+			rows = connection.execute(
+				"SELECT t.server, t.zoom, t.x, t.y, b.size FROM tile_index t JOIN tile_blobs b ON b.hash = t.hash "
+				"ORDER BY t.last_access ASC;")
+			to_delete = []
+			for server, zoom, x, y, size in rows:
+				if freed >= excess:
+					break
+				to_delete.append((server, zoom, x, y))
+				freed += size
+			connection.executemany("DELETE FROM tile_index WHERE server=? AND zoom=? AND x=? AND y=?;", to_delete)
+			evicted = len(to_delete)
+			connection.execute("DELETE FROM tile_blobs WHERE hash NOT IN (SELECT hash FROM tile_index);")
+			connection.commit()
+		logger.info(f"Tile store over its {self.max_bytes} byte cap, evicted {evicted} least recently used tiles")
+
+	def close(self):
+		connection = getattr(self._local, "connection", None)
+		if connection is not None:
+			with self._write_lock:
+				self._flush_access(connection)
+				connection.commit()
+			connection.close()
+			self._local.connection = None
@@ -1,15 +1,579 @@
 
 import os
 import json
+import hashlib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import shapely
 import shapely.geometry
 
+from utils.config import config
 from utils.logging import logger
+from utils.coordinates import CoordinateConverter
+from data_processing.terrain_mesh import _write_obj
+from data_processing.elevation_processor import sample_dem_footprints
+from data_processing.building_store import DEFAULT_BUILDING_HEIGHT, open_building_store, write_building_store
 
-DEFAULT_BUILDING_HEIGHT = 10.0
+# Buildings formatted and written per worker task
+BUILDING_WRITE_CHUNK = 2000
 
-def process_osm_buildings_to_sdf(osm_filepath: str, output_sdf_dir: str):
+BUILDING_SDF_TEMPLATE = """<?xml version='1.0'?>
+<sdf version='1.7'>
+  <model name='{name}'>
+    <static>true</static>
+    <pose>{center_x} {center_y} {half_z} 0 0 0</pose> <!-- Position at centroid, base at Z=0 -->
+    <link name='link'>
+      <collision name='collision'>
+        <geometry>
+          <box>
+            <size>{size_x} {size_y} {size_z}</size>
+          </box>
+        </geometry>
+      </collision>
+      <visual name='visual'>
+        <geometry>
+          <box>
+            <size>{size_x} {size_y} {size_z}</size>
+          </box>
+        </geometry>
+        <material>
+          <ambient>0.7 0.7 0.7 1</ambient>
+          <diffuse>0.7 0.7 0.7 1</diffuse>
+          <specular>0.1 0.1 0.1 1</specular>
+          <emissive>0 0 0 1</emissive>
+        </material>
+      </visual>
+    </link>
+  </model>
+</sdf>
+"""
+
+BUILDING_CELL_SDF_TEMPLATE = """<?xml version='1.0'?>
+<sdf version='1.7'>
+  <model name='{name}'>
+    <static>true</static>
+    <pose>0 0 0 0 0 0</pose> <!-- Mesh vertices are in the Gazebo world frame -->
+    <link name='link'>
+      <collision name='collision'>
+        <geometry>
+          <mesh>
+            <uri>file://{mesh_path}</uri>
+          </mesh>
+        </geometry>
+      </collision>
+      <visual name='visual'>
+        <geometry>
+          <mesh>
+            <uri>file://{mesh_path}</uri>
+          </mesh>
+        </geometry>
+        <material>
+          <ambient>0.7 0.7 0.7 1</ambient>
+          <diffuse>0.7 0.7 0.7 1</diffuse>
+          <specular>0.1 0.1 0.1 1</specular>
+          <emissive>0 0 0 1</emissive>
+        </material>
+      </visual>
+    </link>
+  </model>
+</sdf>
+"""
+
+BUILDING_LIBRARY_SDF_TEMPLATE = """<?xml version='1.0'?>
+<sdf version='1.7'>
+  <model name='{name}'>
+    <static>true</static>
+    <link name='link'>
+      <collision name='collision'>
+        <geometry>
+          <mesh>
+            <uri>model://{name}/meshes/building.obj</uri>
+          </mesh>
+        </geometry>
+      </collision>
+      <visual name='visual'>
+        <geometry>
+          <mesh>
+            <uri>model://{name}/meshes/building.obj</uri>
+          </mesh>
+        </geometry>
+        <material>
+          <ambient>0.7 0.7 0.7 1</ambient>
+          <diffuse>0.7 0.7 0.7 1</diffuse>
+          <specular>0.1 0.1 0.1 1</specular>
+          <emissive>0 0 0 1</emissive>
+        </material>
+      </visual>
+    </link>
+  </model>
+</sdf>
+"""
+
+BUILDING_LIBRARY_CONFIG_TEMPLATE = """<?xml version='1.0'?>
+<model>
+  <name>{name}</name>
+  <version>1.0</version>
+  <sdf version='1.7'>model.sdf</sdf>
+  <description>Extruded building footprint shared by {count} buildings</description>
+</model>
+"""
+
+# Triangles of one box building model, for the merged mesh report
+BOX_MODEL_TRIANGLES = 12
+
+
+def building_model_path(output_sdf_dir: str, building_id: str) -> str:
+    """Path of the box model file of a building written by process_building_store_to_sdf."""
+    return os.path.join(output_sdf_dir, f"building_{building_id.replace(':', '_')}.sdf")
+
+
+def _unique_building_rows(ids: list) -> list:
+    # Buildings sharing an id map to the same model file: one row per file, in order of first appearance,
+    # holding the index of the last building with that id, as sequential writes would leave it
+    rows = {}
+    for i, building_id in enumerate(ids):
+        rows[building_id.replace(':', '_')] = i
+    return list(rows.values())
+
+
+def _write_building_models(output_sdf_dir: str, rows: list):
+    # rows hold (building_id, name, center_x, center_y, size_x, size_y, size_z) as plain Python values, so the
+    # floats format exactly like the per-feature f-strings did
+    for building_id, name, center_x, center_y, size_x, size_y, size_z in rows:
+        sdf_content = BUILDING_SDF_TEMPLATE.format(name=name.replace(" ", "_"), center_x=center_x, center_y=center_y, half_z=size_z / 2.0,
+                                                   size_x=size_x, size_y=size_y, size_z=size_z)
+        sdf_filepath = building_model_path(output_sdf_dir, building_id)
+        with open(sdf_filepath, 'w') as sdf_file:
+            sdf_file.write(sdf_content)
+    return len(rows)
+
+
+def process_building_store_to_sdf(store_dir: str, output_sdf_dir: str, max_workers: int = None) -> int:
+    """
+    Generates an SDF box model file for each building of a building store (see building_store), formatted and
+    written by a pool of worker threads in chunks of BUILDING_WRITE_CHUNK buildings.
+
+    Args:
+        store_dir: Building store written by building_store.write_building_store.
+        output_sdf_dir: Directory receiving one building_<osmid>.sdf per building.
+        max_workers: Writer threads. Defaults to config.BUILDING_WRITE_WORKERS.
+
+    Returns:
+        Number of building models written.
+    """
+    max_workers = max_workers if max_workers else config.BUILDING_WRITE_WORKERS
+    logger.info(f"Processing OSM buildings from store {store_dir} to SDF models in {output_sdf_dir}")
+    os.makedirs(output_sdf_dir, exist_ok=True)
+
+    try:
+        store = open_building_store(store_dir)
+        rows = list(zip(store['ids'].tolist(), store['names'].tolist(), store['box_center_x'].tolist(), store['box_center_y'].tolist(),
+                        store['box_size_x'].tolist(), store['box_size_y'].tolist(), store['heights'].tolist()))
+        rows = [rows[i] for i in _unique_building_rows(store['ids'].tolist())]
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="building-sdf") as executor:
+            chunks = [rows[i:i + BUILDING_WRITE_CHUNK] for i in range(0, len(rows), BUILDING_WRITE_CHUNK)]
+            written = sum(executor.map(lambda chunk: _write_building_models(output_sdf_dir, chunk), chunks))
+
+        logger.info(f"OSM buildings processed and {written} SDF models saved to {output_sdf_dir}")
+        return written
+    except Exception as e:
+        logger.error(f"Error processing OSM buildings to SDF models: {e}")
+        raise
+
+
+def process_osm_buildings_to_sdf(osm_filepath: str, output_sdf_dir: str, max_workers: int = None) -> int:
+    """
+    Process OSM building footprints from a GeoJSON file and generates SDF model files for each building,
+    through a temporary building store (see process_building_store_to_sdf).
+    """
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(osm_filepath))) as store_dir:
+        write_building_store(osm_filepath, store_dir)
+        return process_building_store_to_sdf(store_dir, output_sdf_dir, max_workers=max_workers)
+
+
+def load_building_polygons(store: dict) -> dict:
+    """
+    Builds the building polygons, holes included, of an open building store in the Gazebo frame with vectorized
+    shapely calls. Invalid footprints are repaired with a zero buffer, so every entry of 'polygons' is a valid Polygon.
+
+    Returns:
+        Dict with 'polygons' (Polygon array), 'building_index' (building of each polygon), 'heights' (per building)
+        and 'building_count'.
+    """
+    ring_lengths = np.diff(store['ring_offsets'])
+    rings_per_part = np.diff(store['part_ring_offsets'])
+    part_building = np.repeat(np.arange(len(store['heights'])), np.diff(store['building_part_offsets']))
+    linear_rings = shapely.linearrings(np.asarray(store['coords_local']), indices=np.repeat(np.arange(len(ring_lengths)), ring_lengths))
+    polygons = shapely.polygons(linear_rings, indices=np.repeat(np.arange(len(rings_per_part)), rings_per_part))
+
+    invalid = ~shapely.is_valid(polygons)
+    if invalid.any():
+        polygons[invalid] = shapely.buffer(polygons[invalid], 0)
+    polygons, part_index = shapely.get_parts(polygons, return_index=True)
+    keep = shapely.area(polygons) > 0
+    return {
+        'polygons': polygons[keep],
+        'building_index': part_building[part_index[keep]],
+        'heights': np.asarray(store['heights']),
+        'building_count': len(store['heights']),
+    }
+
+
+def _triangulate_polygons(polygons: np.ndarray) -> tuple:
+    """
+    Triangulates polygon interiors, returning (triangles (n, 3, 2), polygon index of each triangle). Uses constrained
+    Delaunay (shapely >= 2.1), else Delaunay triangles whose centroid lies inside the polygon.
+    """
+    if hasattr(shapely, 'constrained_delaunay_triangles'):
+        triangles, polygon_index = shapely.get_parts(shapely.constrained_delaunay_triangles(polygons), return_index=True)
+    else:
+        triangles, polygon_index = shapely.get_parts(shapely.delaunay_triangles(polygons), return_index=True)
+        inside = shapely.within(shapely.centroid(triangles), polygons[polygon_index])
+        triangles, polygon_index = triangles[inside], polygon_index[inside]
+    corners = shapely.get_coordinates(triangles).reshape(-1, 4, 2)[:, :3]
+    return corners, polygon_index
+
+
+def extrude_building_polygons(polygons: np.ndarray, heights: np.ndarray, bases: np.ndarray = None) -> tuple:
+    """
+    Extrudes polygons to prisms from base to base + height: a flat roof facing up plus one outward-facing quad per
+    ring edge. The ground face is omitted as buildings stand on the terrain.
+
+    Args:
+        polygons: Polygon array in metres.
+        heights: Height of each polygon in metres.
+        bases: Optional z of the base of each polygon in metres.
+
+    Returns:
+        (triangles (n, 3, 3) float64, polygon index of each triangle).
+    """
+    bases = bases if bases is not None else np.zeros(len(polygons))
+    tops = bases + heights
+    roof, roof_index = _triangulate_polygons(polygons)
+    ax, ay = roof[:, 0, 0], roof[:, 0, 1]
+    clockwise = (roof[:, 1, 0] - ax) * (roof[:, 2, 1] - ay) - (roof[:, 1, 1] - ay) * (roof[:, 2, 0] - ax) < 0
+    roof[clockwise] = roof[clockwise][:, [0, 2, 1]]
+    roof_triangles = np.concatenate([roof, np.broadcast_to(tops[roof_index][:, None, None], (len(roof), 3, 1))], axis=2)
+
+    rings, ring_polygon = shapely.get_rings(polygons, return_index=True)
+    coords, coord_ring = shapely.get_coordinates(rings, return_index=True)
+    # Rings are closed, so consecutive coordinates of the same ring are its edges
+    same_ring = coord_ring[:-1] == coord_ring[1:]
+    start, end = coords[:-1][same_ring], coords[1:][same_ring]
+    edge_ring = coord_ring[:-1][same_ring]
+    signed_area = np.bincount(edge_ring, weights=start[:, 0] * end[:, 1] - end[:, 0] * start[:, 1], minlength=len(rings))
+    is_shell = np.r_[True, ring_polygon[1:] != ring_polygon[:-1]]
+    flip = (signed_area > 0)[edge_ring] != is_shell[edge_ring]
+    start[flip], end[flip] = end[flip], start[flip].copy()
+
+    edge_polygon = ring_polygon[edge_ring]
+    top = tops[edge_polygon]
+    bottom = bases[edge_polygon]
+    s0 = np.column_stack([start, bottom])
+    e0 = np.column_stack([end, bottom])
+    e1 = np.column_stack([end, top])
+    s1 = np.column_stack([start, top])
+    wall_triangles = np.concatenate([np.stack([s0, e0, e1], axis=1), np.stack([s0, e1, s1], axis=1)])
+
+    return (np.concatenate([roof_triangles, wall_triangles]),
+            np.concatenate([roof_index, edge_polygon, edge_polygon]))
+
+
+def _write_building_cell(output_dir: str, cell_name: str, triangles: np.ndarray) -> dict:
+    # Shares vertices between triangles at millimetre precision, then writes the OBJ and its model SDF
+    vertices, faces = np.unique(np.round(triangles.reshape(-1, 3), 3), axis=0, return_inverse=True)
+    mesh_path = os.path.abspath(os.path.join(output_dir, f"{cell_name}.obj"))
+    _write_obj(mesh_path, vertices, faces.reshape(-1, 3), comment="TerraForge merged building mesh")
+    with open(os.path.join(output_dir, f"{cell_name}.sdf"), 'w') as sdf_file:
+        sdf_file.write(BUILDING_CELL_SDF_TEMPLATE.format(name=cell_name, mesh_path=mesh_path))
+    return {'name': cell_name, 'mesh_path': mesh_path, 'triangles': int(len(triangles)), 'vertices': int(len(vertices)),
+            'mesh_bytes': os.path.getsize(mesh_path)}
+
+
+def process_osm_buildings_to_cell_meshes(store_dir: str, output_sdf_dir: str, cell_size: float = None,
+                                         max_workers: int = None, dem_filepath: str = None, terrain_base_elevation: float = 0.0) -> dict:
+    """
+    Extrudes all building footprints and merges them into one static mesh model, building_cell_<col>_<row>.sdf, per
+    cell_size square cell of polygon centroids. A report against one box model per building goes to building_cells.json.
+
+    Args:
+        store_dir: Building store written by building_store.write_building_store.
+        output_sdf_dir: Output directory for the cell meshes and models.
+        cell_size: Cell edge in metres. Defaults to config.BUILDING_CELL_SIZE.
+        max_workers: Writer threads. Defaults to config.BUILDING_WRITE_WORKERS.
+        dem_filepath: Optional DEM the buildings are draped on, see building_base_elevations.
+        terrain_base_elevation: Elevation at z = 0 of the terrain, its 'min_elevation'.
+
+    Returns:
+        The report.
+    """
+    cell_size = cell_size if cell_size else config.BUILDING_CELL_SIZE
+    max_workers = max_workers if max_workers else config.BUILDING_WRITE_WORKERS
+    logger.info(f"Merging OSM buildings from store {store_dir} into {cell_size}m cell meshes in {output_sdf_dir}")
+    os.makedirs(output_sdf_dir, exist_ok=True)
+
+    try:
+        store = open_building_store(store_dir)
+        buildings = load_building_polygons(store)
+        polygons = buildings['polygons']
+        bases = None
+        if dem_filepath:
+            bases = building_base_elevations(dem_filepath, _local_bounds_to_wgs84(polygons, store['metadata']), 'EPSG:4326', terrain_base_elevation)
+        triangles, polygon_index = extrude_building_polygons(polygons, buildings['heights'][buildings['building_index']], bases)
+
+        centroids = shapely.centroid(polygons)
+        cell_x = np.floor(shapely.get_x(centroids) / cell_size).astype(np.int64)
+        cell_y = np.floor(shapely.get_y(centroids) / cell_size).astype(np.int64)
+        cells, triangle_cell = np.unique(np.column_stack([cell_x, cell_y])[polygon_index], axis=0, return_inverse=True)
+        triangle_cell = triangle_cell.ravel()
+        order = np.argsort(triangle_cell, kind='stable')
+        boundaries = np.searchsorted(triangle_cell[order], np.arange(1, len(cells)))
+        cell_triangles = np.split(triangles[order], boundaries) if len(cells) else []
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="building-cell") as executor:
+            cell_reports = list(executor.map(
+                lambda cell: _write_building_cell(output_sdf_dir, f"building_cell_{cell[0][0]}_{cell[0][1]}", cell[1]),
+                zip(cells.tolist(), cell_triangles)))
+
+        building_count = buildings['building_count']
+        report = {
+            'cell_size': cell_size,
+            'buildings': building_count,
+            'per_building': {
+                'models': building_count,
+                'collisions': building_count,
+                'triangles': building_count * BOX_MODEL_TRIANGLES,
+            },
+            'merged': {
+                'models': len(cell_reports),
+                'collisions': len(cell_reports),
+                'triangles': sum(cell['triangles'] for cell in cell_reports),
+                'vertices': sum(cell['vertices'] for cell in cell_reports),
+                'mesh_bytes': sum(cell['mesh_bytes'] for cell in cell_reports),
+            },
+            'cells': cell_reports,
+        }
+        with open(os.path.join(output_sdf_dir, "building_cells.json"), 'w') as f:
+            json.dump(report, f, indent=2)
+
+        merged = report['merged']
+        logger.info(f"{building_count} buildings merged into {merged['models']} cell models ({building_count} models / collisions as boxes), "
+                    f"{merged['triangles']} triangles ({report['per_building']['triangles']} as boxes), "
+                    f"{merged['vertices']} vertices, {merged['mesh_bytes'] / (1024 * 1024):.1f} MiB of meshes")
+        return report
+    except Exception as e:
+        logger.error(f"Error merging OSM buildings into cell meshes: {e}")
+        raise
+
+
+def canonicalize_building_polygons(polygons: np.ndarray, heights: np.ndarray, tolerance: float, height_tolerance: float) -> dict:
+    """
+    Reduces building polygons to canonical shapes: centred, long side along x, snapped to tolerance and normalized,
+    heights rounded to height_tolerance, so identical buildings get the same key (canonical WKB plus height).
+
+    Returns:
+        Dict with 'shapes' (canonical Polygon array), 'heights', 'keys' (bytes), 'center_x', 'center_y' and 'yaw',
+        where the original polygon is the canonical shape rotated by yaw and moved to the center.
+    """
+    centroids = shapely.centroid(polygons)
+    center_x = shapely.get_x(centroids)
+    center_y = shapely.get_y(centroids)
+
+    envelope = shapely.get_coordinates(shapely.oriented_envelope(polygons)).reshape(-1, 5, 2)
+    first_edge = envelope[:, 1] - envelope[:, 0]
+    second_edge = envelope[:, 2] - envelope[:, 1]
+    long_edge = np.where((np.hypot(first_edge[:, 0], first_edge[:, 1]) >= np.hypot(second_edge[:, 0], second_edge[:, 1]))[:, None], first_edge, second_edge)
+    yaw = np.mod(np.arctan2(long_edge[:, 1], long_edge[:, 0]), np.pi)
+
+    coords, coord_index = shapely.get_coordinates(polygons, return_index=True)
+    dx = coords[:, 0] - center_x[coord_index]
+    dy = coords[:, 1] - center_y[coord_index]
+    cos_yaw = np.cos(yaw)[coord_index]
+    sin_yaw = np.sin(yaw)[coord_index]
+    local_x = dx * cos_yaw + dy * sin_yaw
+    local_y = dy * cos_yaw - dx * sin_yaw
+    # The long side only fixes yaw up to a half turn; turn each shape so its vertices skew towards +x (+y if symmetric in x)
+    skew_x = np.bincount(coord_index, weights=local_x ** 3, minlength=len(polygons))
+    skew_y = np.bincount(coord_index, weights=local_y ** 3, minlength=len(polygons))
+    scale = np.bincount(coord_index, weights=np.abs(local_x) ** 3 + np.abs(local_y) ** 3, minlength=len(polygons)) * 1e-9
+    half_turn = np.where(np.abs(skew_x) > scale, skew_x < 0, skew_y < -scale)
+    yaw = np.where(half_turn, yaw + np.pi, yaw)
+    flip = np.where(half_turn[coord_index], -1.0, 1.0)
+    shapes = shapely.set_coordinates(polygons.copy(), np.column_stack([local_x * flip, local_y * flip]))
+    snapped = shapely.set_precision(shapes, tolerance)
+    # Buildings smaller than the grid collapse when snapped; keep their exact shape instead
+    collapsed = shapely.is_empty(snapped) | (shapely.get_type_id(snapped) != shapely.GeometryType.POLYGON)
+    snapped[collapsed] = shapes[collapsed]
+    shapes = shapely.normalize(snapped)
+
+    heights = np.round(heights / height_tolerance) * height_tolerance
+    wkb = shapely.to_wkb(shapes)
+    keys = [shape_wkb + height.tobytes() for shape_wkb, height in zip(wkb, heights)]
+    return {'shapes': shapes, 'heights': heights, 'keys': keys, 'center_x': center_x, 'center_y': center_y, 'yaw': yaw}
+
+
+def _write_library_model(library_dir: str, name: str, triangles: np.ndarray, count: int):
+    # Writes model://<name> unless a previous run already produced it; the name is a hash of the geometry
+    model_dir = os.path.join(library_dir, name)
+    if os.path.exists(os.path.join(model_dir, "model.config")):
+        return False
+    os.makedirs(os.path.join(model_dir, "meshes"), exist_ok=True)
+    vertices, faces = np.unique(np.round(triangles.reshape(-1, 3), 3), axis=0, return_inverse=True)
+    _write_obj(os.path.join(model_dir, "meshes", "building.obj"), vertices, faces.reshape(-1, 3), comment="TerraForge building library mesh")
+    with open(os.path.join(model_dir, "model.sdf"), 'w') as sdf_file:
+        sdf_file.write(BUILDING_LIBRARY_SDF_TEMPLATE.format(name=name))
+    # model.config is written last, so an interrupted model is rewritten on the next run
+    with open(os.path.join(model_dir, "model.config"), 'w') as config_file:
+        config_file.write(BUILDING_LIBRARY_CONFIG_TEMPLATE.format(name=name, count=count))
+    return True
+
+
+def process_osm_buildings_to_library(store_dir: str, output_dir: str, library_dir: str = None,
+                                     tolerance: float = None, height_tolerance: float = None, max_workers: int = None,
+                                     dem_filepath: str = None, terrain_base_elevation: float = 0.0) -> dict:
+    """
+    Deduplicates building geometry into library_dir/<geometry hash>/ model:// models, each unique canonical shape
+    extruded once, and returns one posed include per building. library_dir must be on GAZEBO_MODEL_PATH.
+
+    Args:
+        store_dir: Building store written by building_store.write_building_store.
+        output_dir: Directory receiving the building_library.json report.
+        library_dir: Model library directory. Defaults to config.BUILDING_LIBRARY_DIR.
+        tolerance: Footprint grid in metres. Defaults to config.BUILDING_SHAPE_TOLERANCE.
+        height_tolerance: Height rounding in metres. Defaults to config.BUILDING_HEIGHT_TOLERANCE.
+        max_workers: Writer threads. Defaults to config.BUILDING_WRITE_WORKERS.
+        dem_filepath: Optional DEM the buildings are draped on; sets the z of every include, see building_base_elevations.
+        terrain_base_elevation: Elevation at z = 0 of the terrain, its 'min_elevation'.
+
+    Returns:
+        The report, whose 'includes' list holds one {'name', 'uri', 'pose': (x, y, z, yaw)} per building and is
+        passed to SDFWorldBuilder.render_world_template as building_includes.
+    """
+    library_dir = library_dir if library_dir else config.BUILDING_LIBRARY_DIR
+    tolerance = tolerance if tolerance else config.BUILDING_SHAPE_TOLERANCE
+    height_tolerance = height_tolerance if height_tolerance else config.BUILDING_HEIGHT_TOLERANCE
+    max_workers = max_workers if max_workers else config.BUILDING_WRITE_WORKERS
+    logger.info(f"Deduplicating OSM buildings from store {store_dir} into model library {library_dir} (tolerance {tolerance}m)")
+    os.makedirs(library_dir, exist_ok=True)
+    os.makedirs(output_dir, exist_ok=True)
+
+    try:
+        store = open_building_store(store_dir)
+        buildings = load_building_polygons(store)
+        bases = np.zeros(len(buildings['polygons']))
+        if dem_filepath:
+            bases = building_base_elevations(dem_filepath, _local_bounds_to_wgs84(buildings['polygons'], store['metadata']), 'EPSG:4326',
+                                             terrain_base_elevation)
+        canonical = canonicalize_building_polygons(buildings['polygons'], buildings['heights'][buildings['building_index']], tolerance, height_tolerance)
+
+        # Shape id of every polygon, and the first polygon of every shape as its representative
+        shape_ids = {}
+        shape_index = np.empty(len(canonical['keys']), dtype=np.int64)
+        unique_first = []
+        for i, key in enumerate(canonical['keys']):
+            if key not in shape_ids:
+                shape_ids[key] = len(unique_first)
+                unique_first.append(i)
+            shape_index[i] = shape_ids[key]
+        unique_first = np.asarray(unique_first, dtype=np.int64)
+        model_names = [f"building_{hashlib.sha1(key).hexdigest()[:16]}" for key in shape_ids]
+        counts = np.bincount(shape_index, minlength=len(model_names))
+
+        triangles, triangle_shape = extrude_building_polygons(canonical['shapes'][unique_first], canonical['heights'][unique_first])
+        order = np.argsort(triangle_shape, kind='stable')
+        shape_triangles = np.split(triangles[order], np.searchsorted(triangle_shape[order], np.arange(1, len(model_names)))) if model_names else []
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="building-library") as executor:
+            written = sum(executor.map(lambda args: _write_library_model(library_dir, *args), zip(model_names, shape_triangles, counts.tolist())))
+
+        includes = [{'name': f"building_{i}", 'uri': f"model://{model_names[shape]}", 'pose': (x, y, z, yaw)}
+                    for i, (shape, x, y, z, yaw) in enumerate(zip(shape_index.tolist(), canonical['center_x'].tolist(), canonical['center_y'].tolist(),
+                                                                  bases.tolist(), canonical['yaw'].tolist()))]
+        report = {
+            'library_dir': os.path.abspath(library_dir),
+            'buildings': len(includes),
+            'unique_models': len(model_names),
+            'new_models': written,
+            'reuse_ratio': len(includes) / max(len(model_names), 1),
+            'includes': includes,
+        }
+        with open(os.path.join(output_dir, "building_library.json"), 'w') as f:
+            json.dump(report, f, indent=2)
+
+        logger.info(f"{len(includes)} buildings share {len(model_names)} library models ({written} new, "
+                    f"{report['reuse_ratio']:.1f} buildings per model). Add {report['library_dir']} to GAZEBO_MODEL_PATH.")
+        return report
+    except Exception as e:
+        logger.error(f"Error building the building model library: {e}")
+        raise
+
+
+def building_base_elevations(dem_filepath: str, bounds: np.ndarray, bounds_crs: str, terrain_base_elevation: float, statistic: str = None) -> np.ndarray:
+    """
+    Returns the Gazebo z of the base of every footprint: the DEM elevation under its bounds (see
+    sample_dem_footprints) relative to terrain_base_elevation, the elevation at z = 0 of the terrain
+    (its 'min_elevation'). Footprints outside the DEM or over nodata stand at z = 0.
+    """
+    statistic = statistic if statistic else config.BUILDING_BASE_STATISTIC
+    elevations = sample_dem_footprints(dem_filepath, bounds, bounds_crs, statistic)
+    base = elevations - terrain_base_elevation
+    base[~np.isfinite(base)] = 0.0
+    logger.info(f"Draped {len(base)} building footprints on {dem_filepath} using the {statistic} elevation")
+    return base
+
+
+def _local_bounds_to_wgs84(polygons: np.ndarray, metadata: dict) -> np.ndarray:
+    # Envelope of the four corners of every Gazebo-frame bounding box, in the store's projection
+    converter = CoordinateConverter(metadata['origin_location'], projection=metadata.get('projection', 'utm'))
+    bounds = shapely.bounds(polygons).reshape(-1, 4)
+    lat, lon = converter.gazebo_to_wgs84_array(bounds[:, [0, 2, 2, 0]].ravel(), bounds[:, [1, 1, 3, 3]].ravel())
+    lat = lat.reshape(-1, 4)
+    lon = lon.reshape(-1, 4)
+    return np.column_stack([lon.min(axis=1), lat.min(axis=1), lon.max(axis=1), lat.max(axis=1)])
+
+
+def compute_building_poses(store_dir: str, dem_filepath: str = None, terrain_base_elevation: float = 0.0) -> list:
+    """
+    Returns the Gazebo (x, y, z) pose of every building of a building store, in feature order: its projected
+    centroid and, with a DEM, the base elevation from building_base_elevations (else 0).
+    """
+    store = open_building_store(store_dir)
+    x = np.asarray(store['centroid_x'])
+    y = np.asarray(store['centroid_y'])
+    z = np.zeros(len(x))
+    if dem_filepath and len(x):
+        z = building_base_elevations(dem_filepath, np.asarray(store['bounds_wgs84']), 'EPSG:4326', terrain_base_elevation)
+    return list(zip(x.tolist(), y.tolist(), z.tolist()))
+
+
+def compute_box_model_includes(store_dir: str, output_sdf_dir: str, dem_filepath: str = None, terrain_base_elevation: float = 0.0) -> tuple:
+    """
+    Pairs every box model written by process_osm_buildings_to_sdf with its world pose.
+
+    The include <pose> replaces the model's own pose, so z is the draped base elevation (see
+    compute_building_poses) plus half the building height, which puts the box's base on the terrain.
+
+    Returns:
+        (model_paths, poses): the model file paths and their (x, y, z) poses, index-aligned, one per model file.
+    """
+    store = open_building_store(store_dir)
+    poses = compute_building_poses(store_dir, dem_filepath, terrain_base_elevation)
+    ids = store['ids'].tolist()
+    heights = store['heights'].tolist()
+    model_paths = []
+    model_poses = []
+    for i in _unique_building_rows(ids):
+        x, y, z = poses[i]
+        model_paths.append(building_model_path(output_sdf_dir, ids[i]))
+        model_poses.append((x, y, z + heights[i] / 2.0))
+    return model_paths, model_poses
+
+
+def _process_osm_buildings_to_sdf_loop(osm_filepath: str, output_sdf_dir: str):
     """
-    Process OSM building footprints from a GeoJSON file and generates SDF model files for each building
+    Per-feature reference implementation of process_osm_buildings_to_sdf, kept for benchmarking and output comparison.
     """
     logger.info(f"Processing OSM buildings from {osm_filepath} to SDF models in {output_sdf_dir}")
     os.makedirs(output_sdf_dir, exist_ok=True)
@@ -0,0 +1,270 @@
+import os
+import re
+import json
+import math
+import numpy as np
+import pyproj
+import shapely
+
+from utils.config import config
+from utils.logging import logger
+from utils.coordinates import CoordinateConverter
+from utils.geojson import iter_geojson_features
+
+DEFAULT_BUILDING_HEIGHT = 10.0
+
+BUILDING_STORE_METADATA = "metadata.json"
+
+# OSM height values: metres by default, optionally with a unit ("12", "12.5 m", "40 ft")
+HEIGHT_VALUE = re.compile(r"^\s*([0-9]*\.?[0-9]+)\s*(m|metres?|meters?|ft|feet|')?\s*$", re.IGNORECASE)
+FEET_TO_METERS = 0.3048
+
+# Per building: ids, names, heights, box_* (exterior outline centroid and extent in source coordinates, as the box
+# models use them), centroid_x/y (Gazebo frame), bounds_wgs84 (n, 4).
+# Geometry: coords_local (m, 2) ring coordinates in the Gazebo frame, with ring_offsets into coords_local,
+# part_ring_offsets into the rings (the first ring of a part is its shell) and building_part_offsets into the parts.
+BUILDING_STORE_COLUMNS = (
+    'ids', 'names', 'heights', 'box_center_x', 'box_center_y', 'box_size_x', 'box_size_y',
+    'centroid_x', 'centroid_y', 'bounds_wgs84',
+    'coords_local', 'ring_offsets', 'part_ring_offsets', 'building_part_offsets',
+)
+
+
+def _group_parts(parts: np.ndarray, part_building: np.ndarray, is_multi: np.ndarray) -> np.ndarray:
+    # One geometry per building: its Polygon, or a MultiPolygon of its parts for MultiPolygon features
+    geometries = np.empty(len(is_multi), dtype=object)
+    multi_parts = is_multi[part_building]
+    geometries[part_building[~multi_parts]] = parts[~multi_parts]
+    if multi_parts.any():
+        # multipolygons() needs contiguous indices from 0, so the buildings are renumbered in ascending order
+        multi_buildings, multi_index = np.unique(part_building[multi_parts], return_inverse=True)
+        geometries[multi_buildings] = shapely.multipolygons(parts[multi_parts], indices=multi_index)
+    return geometries
+
+
+def _parse_height(value) -> float:
+    """Parses one OSM height tag in metres, falling back to DEFAULT_BUILDING_HEIGHT if it is missing or unreadable."""
+    match = HEIGHT_VALUE.match(value.replace(',', '.')) if isinstance(value, str) else None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        height = float(value)
+    elif match:
+        number, unit = match.groups()
+        height = float(number) * (FEET_TO_METERS if unit and unit.lower() in ('ft', 'feet', "'") else 1.0)
+    else:
+        return DEFAULT_BUILDING_HEIGHT
+    return height if math.isfinite(height) and height > 0 else DEFAULT_BUILDING_HEIGHT
+
+
+def _batch_columns(features: list, first_feature_idx: int) -> dict:
+    """Per-batch columns of write_building_store, in source (WGS84) coordinates; geometry as ragged lengths."""
+    ids, names, heights, is_multi = [], [], [], []
+    rings = []
+    rings_per_part = []
+    parts_per_building = []
+    for feature_idx, feature in enumerate(features, first_feature_idx):
+        geometry_type = feature['geometry']['type']
+        if geometry_type == 'Polygon':
+            parts = [feature['geometry']['coordinates']]
+        elif geometry_type == 'MultiPolygon':
+            parts = feature['geometry']['coordinates']
+        else:
+            logger.warning(f"Feature with type {geometry_type} is not a building polygon. Skipping.")
+            continue
+        properties = feature['properties']
+        ids.append(str(properties.get('osmid', f"building_{feature_idx}")))
+        names.append(properties.get('name', f"Building {feature_idx}"))
+        heights.append(_parse_height(properties.get('height')))
+        is_multi.append(geometry_type == 'MultiPolygon')
+        parts_per_building.append(len(parts))
+        for part_rings in parts:
+            rings_per_part.append(len(part_rings))
+            rings.extend(part_rings)
+
+    count = len(ids)
+    ring_lengths = np.array([len(ring) for ring in rings], dtype=np.int64)
+    coords = np.concatenate([np.asarray(ring, dtype=np.float64)[:, :2] for ring in rings]) if rings else np.empty((0, 2))
+    rings_per_part = np.asarray(rings_per_part, dtype=np.int64)
+    parts_per_building = np.asarray(parts_per_building, dtype=np.int64)
+    is_multi = np.asarray(is_multi, dtype=bool)
+
+    linear_rings = shapely.linearrings(coords, indices=np.repeat(np.arange(len(ring_lengths)), ring_lengths))
+    ring_part = np.repeat(np.arange(len(rings_per_part)), rings_per_part)
+    part_building = np.repeat(np.arange(count), parts_per_building)
+    shells = np.concatenate([[0], np.cumsum(rings_per_part)])[:-1]
+
+    # Box models use the exterior outline only, in source coordinates
+    outlines = _group_parts(shapely.polygons(linear_rings[shells]), part_building, is_multi)
+    outline_centroids = shapely.centroid(outlines)
+    outline_bounds = shapely.bounds(outlines)
+
+    # Poses and draping use the full footprint, holes included
+    footprints = _group_parts(shapely.polygons(linear_rings, indices=ring_part), part_building, is_multi)
+    footprint_centroids = shapely.centroid(footprints)
+
+    return {
+        'ids': np.array(ids, dtype=str),
+        'names': np.array(names, dtype=str),
+        'heights': np.asarray(heights, dtype=np.float64),
+        'box_center_x': shapely.get_x(outline_centroids),
+        'box_center_y': shapely.get_y(outline_centroids),
+        'box_size_x': outline_bounds[:, 2] - outline_bounds[:, 0],
+        'box_size_y': outline_bounds[:, 3] - outline_bounds[:, 1],
+        'centroid_lon': shapely.get_x(footprint_centroids),
+        'centroid_lat': shapely.get_y(footprint_centroids),
+        'bounds_wgs84': shapely.bounds(footprints).reshape(-1, 4),
+        'coords': coords,
+        'ring_lengths': ring_lengths,
+        'rings_per_part': rings_per_part,
+        'parts_per_building': parts_per_building,
+    }
+
+
+class _GrowingColumn:
+    """One store column appended batch by batch to a scratch file, then copied into its .npy segment by segment."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.scratch = open(path + ".part", 'wb')
+        self.segments = [] # (byte offset, dtype, shape) of every appended array
+
+    def append(self, values: np.ndarray):
+        values = np.ascontiguousarray(values)
+        self.segments.append((self.scratch.tell(), values.dtype, values.shape))
+        self.scratch.write(values.tobytes())
+
+    def finish(self):
+        self.scratch.close()
+        # Batches can differ in string width; result_type widens them to the widest
+        dtype = np.result_type(*[dtype for _, dtype, _ in self.segments])
+        rows = sum(shape[0] for _, _, shape in self.segments)
+        output = np.lib.format.open_memmap(self.path, mode='w+', dtype=dtype, shape=(rows,) + self.segments[0][2][1:])
+        start = 0
+        for offset, segment_dtype, shape in self.segments:
+            if shape[0]:
+                output[start:start + shape[0]] = np.memmap(self.path + ".part", dtype=segment_dtype, mode='r', offset=offset, shape=shape)
+                start += shape[0]
+        output.flush()
+        output = None
+        os.remove(self.path + ".part")
+
+    def discard(self):
+        self.scratch.close()
+        if os.path.exists(self.path + ".part"):
+            os.remove(self.path + ".part")
+
+
+def _footprint_bounds(osm_filepath: str, batch_size: int):
+    # (min lon, min lat, max lon, max lat) of all building rings in one streaming pass, None without any
+    bounds = np.array([np.inf, np.inf, -np.inf, -np.inf])
+    for features in iter_geojson_features(osm_filepath, batch_size=batch_size):
+        rings = [ring for feature in features if feature['geometry']['type'] in ('Polygon', 'MultiPolygon')
+                 for part in ([feature['geometry']['coordinates']] if feature['geometry']['type'] == 'Polygon' else feature['geometry']['coordinates'])
+                 for ring in part]
+        if rings:
+            coords = np.concatenate([np.asarray(ring, dtype=np.float64)[:, :2] for ring in rings])
+            bounds[:2] = np.minimum(bounds[:2], coords.min(axis=0))
+            bounds[2:] = np.maximum(bounds[2:], coords.max(axis=0))
+    return bounds if np.isfinite(bounds).all() else None
+
+
+def write_building_store(osm_filepath: str, store_dir: str, origin_location: tuple = None, batch_size: int = None, projection: str = None) -> dict:
+    """
+    Streams a buildings GeoJSON into a columnar store of .npy files, one per column of BUILDING_STORE_COLUMNS,
+    plus a metadata.json; each batch is projected to the Gazebo frame and appended as soon as it is parsed.
+
+    Args:
+        osm_filepath: Input GeoJSON with building footprints.
+        store_dir: Output directory of the store.
+        origin_location: (lat, lon) of the Gazebo world origin. Defaults to the centre of the footprints' bounds.
+        batch_size: Features per batch. Defaults to config.GEOJSON_BATCH_SIZE.
+        projection: CoordinateConverter projection. Defaults to config.COORDINATE_PROJECTION.
+
+    Returns:
+        The store metadata.
+    """
+    batch_size = batch_size if batch_size else config.GEOJSON_BATCH_SIZE
+    projection = projection if projection else config.COORDINATE_PROJECTION
+    logger.info(f"Writing building store {store_dir} from {osm_filepath} in batches of {batch_size} features")
+    columns = {}
+    try:
+        # The default origin and the 'auto' projection need the footprints' extent before the first batch is projected
+        radius_meters = None
+        if origin_location is None or projection == 'auto':
+            bounds = _footprint_bounds(osm_filepath, batch_size)
+            if origin_location is None:
+                origin_location = (float((bounds[1] + bounds[3]) / 2.0), float((bounds[0] + bounds[2]) / 2.0)) if bounds is not None else (0.0, 0.0)
+            if bounds is not None:
+                # Extent for the tangent-plane error bound: the farthest footprint bounds corner from the origin
+                corner_lons = bounds[[0, 2]].repeat(2)
+                corner_lats = np.tile(bounds[[1, 3]], 2)
+                _, _, distances = pyproj.Geod(ellps='WGS84').inv(np.full(4, origin_location[1]), np.full(4, origin_location[0]), corner_lons, corner_lats)
+                radius_meters = float(np.max(distances))
+        converter = CoordinateConverter(origin_location, projection=projection, radius_meters=radius_meters)
+
+        os.makedirs(store_dir, exist_ok=True)
+        columns = {name: _GrowingColumn(os.path.join(store_dir, f"{name}.npy")) for name in BUILDING_STORE_COLUMNS}
+        for name in ('ring_offsets', 'part_ring_offsets', 'building_part_offsets'):
+            columns[name].append(np.zeros(1, dtype=np.int64))
+        count = features_read = vertices = rings = parts = 0
+        for features in iter_geojson_features(osm_filepath, batch_size=batch_size):
+            batch = _batch_columns(features, features_read)
+            features_read += len(features)
+            # One projection call per batch for its ring coordinates and centroids
+            batch_vertices = len(batch['coords'])
+            x, y, _ = converter.wgs84_to_gazebo_array(np.concatenate([batch['coords'][:, 1], batch['centroid_lat']]),
+                                                      np.concatenate([batch['coords'][:, 0], batch['centroid_lon']]))
+            for name in ('ids', 'names', 'heights', 'box_center_x', 'box_center_y', 'box_size_x', 'box_size_y', 'bounds_wgs84'):
+                columns[name].append(batch[name])
+            columns['centroid_x'].append(x[batch_vertices:])
+            columns['centroid_y'].append(y[batch_vertices:])
+            columns['coords_local'].append(np.column_stack([x[:batch_vertices], y[:batch_vertices]]))
+            # Offsets continue from the totals of the previous batches
+            columns['ring_offsets'].append(vertices + np.cumsum(batch['ring_lengths']))
+            columns['part_ring_offsets'].append(rings + np.cumsum(batch['rings_per_part']))
+            columns['building_part_offsets'].append(parts + np.cumsum(batch['parts_per_building']))
+            count += len(batch['ids'])
+            vertices += batch_vertices
+            rings += len(batch['ring_lengths'])
+            parts += len(batch['rings_per_part'])
+        if not features_read:
+            # Typed, empty columns for a file without features
+            empty = _batch_columns([], 0)
+            for name in ('ids', 'names', 'heights', 'box_center_x', 'box_center_y', 'box_size_x', 'box_size_y', 'bounds_wgs84'):
+                columns[name].append(empty[name])
+            for name in ('centroid_x', 'centroid_y'):
+                columns[name].append(np.empty(0))
+            columns['coords_local'].append(np.empty((0, 2)))
+        for column in columns.values():
+            column.finish()
+
+        metadata = {
+            'source': osm_filepath,
+            'count': count,
+            'origin_location': list(origin_location),
+            'projection': converter.projection,
+            'utm_crs': converter.utm_crs_string,
+            'origin_utm': [converter.origin_utm_x, converter.origin_utm_y],
+        }
+        with open(os.path.join(store_dir, BUILDING_STORE_METADATA), 'w') as f:
+            json.dump(metadata, f, indent=2)
+
+        logger.info(f"Building store written to {store_dir}: {count} buildings from {features_read} features, "
+                    f"{rings} rings, {vertices} vertices")
+        return metadata
+    except Exception as e:
+        for column in columns.values():
+            column.discard()
+        logger.error(f"Error writing building store: {e}")
+        raise
+
+
+def open_building_store(store_dir: str) -> dict:
+    """Opens a store written by write_building_store: every column memory-mapped read-only, plus its 'metadata'."""
+    metadata_path = os.path.join(store_dir, BUILDING_STORE_METADATA)
+    if not os.path.exists(metadata_path):
+        raise Exception(f"No building store found at {store_dir}")
+    with open(metadata_path, 'r') as f:
+        store = {'metadata': json.load(f)}
+    for name in BUILDING_STORE_COLUMNS:
+        store[name] = np.load(os.path.join(store_dir, f"{name}.npy"), mmap_mode='r')
+    return store
@@ -1,47 +1,486 @@
 import os
-from osgeo import gdal
+import json
+import math
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pyproj
+from osgeo import gdal, osr
+from utils.config import config
 from utils.logging import logger
+from utils.coordinates import get_transformer
 
-def process_dem_to_heightmap(dem_filepath: str, output_heightmap_path: str):
-    logger.info(f"Processing DEM {dem_filepath} to heightmap {output_heightmap_path}")
+# format -> (GDAL driver, GDAL data type, maximum normalized level or None for real elevations)
+HEIGHTMAP_FORMATS = {
+    'png16': ('PNG', gdal.GDT_UInt16, 65535),
+    'png8': ('PNG', gdal.GDT_Byte, 255),
+    'tif32': ('GTiff', gdal.GDT_Float32, None),
+}
+MIN_HEIGHTMAP_SIZE = 33
+
+# Row-interleaved rasters have one-line blocks; read those in strips of at least this many rows
+MIN_STRIP_ROWS = 256
+
+FOOTPRINT_STATISTICS = ('min', 'mean')
+# DEM cells gathered per chunk for the 'min' footprint statistic
+FOOTPRINT_CHUNK_CELLS = 4 * 1024 * 1024
+
+
+def _iter_block_windows(band):
+    """
+    Yields (xoff, yoff, xsize, ysize) windows following the band's native block layout,
+    so every read maps onto whole blocks and peak memory is a single window.
+    """
+    block_x, block_y = band.GetBlockSize()
+    if block_x >= band.XSize:
+        block_y = max(block_y, MIN_STRIP_ROWS)
+    for yoff in range(0, band.YSize, block_y):
+        win_y = min(block_y, band.YSize - yoff)
+        for xoff in range(0, band.XSize, block_x):
+            yield xoff, yoff, min(block_x, band.XSize - xoff), win_y
+
+
+def _valid_mask(block: np.ndarray, nodata) -> np.ndarray:
+    mask = np.isfinite(block) if np.issubdtype(block.dtype, np.floating) else np.ones(block.shape, dtype=bool)
+    if nodata is not None:
+        mask &= block != nodata
+    return mask
+
+
+def compute_dem_statistics(band) -> tuple:
+    """Streams over the band block by block and returns the (min, max) of its valid (non-nodata) cells."""
+    nodata = band.GetNoDataValue()
+    min_val = np.inf
+    max_val = -np.inf
+    for xoff, yoff, win_x, win_y in _iter_block_windows(band):
+        block = band.ReadAsArray(xoff, yoff, win_x, win_y)
+        valid = block[_valid_mask(block, nodata)]
+        if valid.size:
+            min_val = min(min_val, float(valid.min()))
+            max_val = max(max_val, float(valid.max()))
+    if not np.isfinite(min_val):
+        raise Exception("DEM contains no valid elevation values")
+    return min_val, max_val
+
+
+def gazebo_heightmap_size(width: int, height: int) -> int:
+    """Returns the (2^n)+1 edge length closest to the larger raster dimension, as Gazebo requires square (2^n)+1 heightmaps."""
+    target = max(width, height, MIN_HEIGHTMAP_SIZE)
+    exponent = max(int(round(np.log2(max(target - 1, 1)))), int(np.log2(MIN_HEIGHTMAP_SIZE - 1)))
+    return 2 ** exponent + 1
+
+
+def _ground_extent(dataset) -> tuple:
+    """Returns the (west, south, east, north) bounds and the ground (width, height) in metres of a dataset."""
+    geo_transform = dataset.GetGeoTransform()
+    west = geo_transform[0]
+    north = geo_transform[3]
+    east = west + geo_transform[1] * dataset.RasterXSize
+    south = north + geo_transform[5] * dataset.RasterYSize
+    srs = osr.SpatialReference(wkt=dataset.GetProjection())
+    if srs.IsGeographic():
+        geod = pyproj.Geod(ellps='WGS84')
+        mid_lat = (south + north) / 2.0
+        mid_lon = (west + east) / 2.0
+        _, _, width_m = geod.inv(west, mid_lat, east, mid_lat)
+        _, _, height_m = geod.inv(mid_lon, south, mid_lon, north)
+    else:
+        width_m = abs(east - west)
+        height_m = abs(north - south)
+    return (west, south, east, north), (width_m, height_m)
+
+
+def terrain_grid(raster_filepath: str) -> dict:
+    """
+    Returns the horizontal frame of a georeferenced raster: its 'projection' (WKT), native 'bounds'
+    (west, south, east, north) and ground 'size_x'/'size_y' in metres. Heightmaps, heightmap tiles and terrain
+    meshes resample the DEM to a new size without changing its extent, so the DEM's grid is the terrain's grid.
+    """
+    dataset = gdal.Open(raster_filepath)
+    if dataset is None:
+        raise Exception(f"Failed to open raster file: {raster_filepath}")
+    bounds, (width_m, height_m) = _ground_extent(dataset)
+    return {'projection': dataset.GetProjection(), 'bounds': bounds, 'size_x': width_m, 'size_y': height_m}
+
+
+def _remove_scratch_files(*paths):
+    # GeoTIFFs go through the driver so their .aux.xml sidecars are removed with them
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        if path.endswith('.tif'):
+            gdal.GetDriverByName('GTiff').Delete(path)
+        else:
+            os.remove(path)
+
+
+def process_dem_to_heightmap(dem_filepath: str, output_heightmap_path: str, output_format: str = None, resampling: str = None, size: int = None,
+                             elevation_range: tuple = None) -> dict:
+    """
+    Converts a DEM into a square (2^n)+1 Gazebo heightmap, block by block, with nodata at the lowest height. The
+    real elevation range and ground extent go to a <output_heightmap_path>.json sidecar for the SDF <size>.
+
+    Args:
+        dem_filepath: Input DEM GeoTIFF.
+        output_heightmap_path: Output heightmap path.
+        output_format: One of HEIGHTMAP_FORMATS: 'png16' (16-bit PNG), 'png8' (8-bit PNG) or 'tif32' (float32
+            GeoTIFF holding the real elevations). Defaults to config.HEIGHTMAP_FORMAT.
+        resampling: GDAL resampling kernel name ('nearest', 'bilinear', 'cubic', 'cubicspline', 'lanczos', 'average').
+            Defaults to config.HEIGHTMAP_RESAMPLING.
+        size: Heightmap edge length in pixels. Defaults to the (2^n)+1 size closest to the DEM size.
+        elevation_range: Optional (min, max) elevation mapped to the full heightmap range instead of the range of
+            this heightmap, so a lower resolution collision heightmap lines up with its visual heightmap.
+
+    Returns:
+        The heightmap metadata written to the sidecar.
+    """
+    output_format = output_format if output_format else config.HEIGHTMAP_FORMAT
+    resampling = resampling if resampling else config.HEIGHTMAP_RESAMPLING
+    if output_format not in HEIGHTMAP_FORMATS:
+        raise ValueError(f"Unsupported heightmap format: {output_format}. Expected one of {list(HEIGHTMAP_FORMATS)}")
+    driver_name, output_type, max_level = HEIGHTMAP_FORMATS[output_format]
+
+    logger.info(f"Processing DEM {dem_filepath} to {output_format} heightmap {output_heightmap_path}")
+    resampled_path = output_heightmap_path + ".resampled.tif"
+    # The PNG driver only supports CreateCopy, so blocks are written to a tiled scratch GeoTIFF first
+    scratch_path = output_heightmap_path + ".tmp.tif"
+    dem_dataset = resampled_dataset = scratch_dataset = output_dataset = band = scratch_band = None
     try:
         dem_dataset = gdal.Open(dem_filepath)
         if dem_dataset is None:
             raise Exception(f"Failed to open DEM file: {dem_filepath}")
-        
-        band = dem_dataset.GetRasterBand(1)
+
+        if size is None:
+            size = gazebo_heightmap_size(dem_dataset.RasterXSize, dem_dataset.RasterYSize)
+
+        # Resample to the Gazebo size in GDAL's chunked warper; the result is read back block by block below
+        resampled_dataset = gdal.Warp(resampled_path, dem_dataset, width=size, height=size, resampleAlg=resampling,
+                                      outputType=gdal.GDT_Float32, multithread=True,
+                                      creationOptions=['TILED=YES', 'BIGTIFF=IF_SAFER'])
+        if resampled_dataset is None:
+            raise Exception(f"Failed to resample DEM to {size}x{size}")
+        dem_dataset = None
+
+        band = resampled_dataset.GetRasterBand(1)
         if band is None:
             raise Exception("Failed to get raster band from DEM")
-        
-        raster_array = band.ReadAsArray()
 
-        min_val = raster_array.min()
-        max_val = raster_array.max()
+        min_val, max_val = elevation_range if elevation_range else compute_dem_statistics(band)
+        nodata = band.GetNoDataValue()
+        scale = 0.0
+        if max_level is not None and max_val > min_val:
+            scale = max_level / (max_val - min_val)
 
-        if max_val > min_val:
-            normalized_array = ((raster_array - min_val) / (max_val - min_val) * 255).astype('uint8')
-        else:
-            normalized_array = (raster_array - min_val).astype('uint8')
+        scratch_dataset = gdal.GetDriverByName('GTiff').Create(scratch_path, size, size, 1, output_type, options=['TILED=YES', 'BIGTIFF=IF_SAFER'])
+        if scratch_dataset is None:
+            raise Exception(f"Failed to create output heightmap file: {output_heightmap_path}")
+        scratch_band = scratch_dataset.GetRasterBand(1)
+
+        for xoff, yoff, win_x, win_y in _iter_block_windows(band):
+            block = band.ReadAsArray(xoff, yoff, win_x, win_y).astype(np.float32, copy=False)
+            invalid = ~_valid_mask(block, nodata)
+            if max_level is None:
+                block[invalid] = min_val # real elevations, holes filled with the lowest valid height
+            else:
+                block -= min_val
+                block *= scale
+                np.clip(block, 0, max_level, out=block)
+                np.rint(block, out=block)
+                block[invalid] = 0
+            scratch_band.WriteArray(block, xoff, yoff)
+
+        # copy geotransform and projection from the resampled DEM
+        scratch_dataset.SetGeoTransform(resampled_dataset.GetGeoTransform())
+        scratch_dataset.SetProjection(resampled_dataset.GetProjection())
+        scratch_band.FlushCache()
 
-        # create the output image
-        driver = gdal.GetDriverByName('PNG')
-        output_dataset = driver.Create(output_heightmap_path, dem_dataset.RasterXSize, dem_dataset.RasterYSize, 1, gdal.GDT_Byte)
+        output_dataset = gdal.GetDriverByName(driver_name).CreateCopy(output_heightmap_path, scratch_dataset)
         if output_dataset is None:
             raise Exception(f"Failed to create output heightmap file: {output_heightmap_path}")
-        
-        output_band = output_dataset.GetRasterBand(1)
-        output_band.WriteArray(normalized_array)
 
-        # copy geotransform and projection from the source DEM
-        output_dataset.SetGeoTransform(dem_dataset.GetGeoTransform())
-        output_dataset.SetProjection(dem_dataset.GetProjection())
+        bounds, (width_m, height_m) = _ground_extent(resampled_dataset)
+        metadata = {
+            'heightmap_path': output_heightmap_path,
+            'format': output_format,
+            'resampling': resampling,
+            'size_px': size,
+            'min_elevation': min_val,
+            'max_elevation': max_val,
+            'height_range': max_val - min_val,
+            'size_x': width_m,
+            'size_y': height_m,
+            'bounds_wgs84': bounds if osr.SpatialReference(wkt=resampled_dataset.GetProjection()).IsGeographic() else None,
+            'projection': resampled_dataset.GetProjection(),
+            'geo_transform': list(resampled_dataset.GetGeoTransform()),
+        }
 
-        # flush data and close datasets
-        output_band.FlushCache()
-        output_dataset = None
-        dem_dataset = None
+        with open(heightmap_metadata_path(output_heightmap_path), 'w') as f:
+            json.dump(metadata, f, indent=2)
 
-        logger.info(f"DEM processed and heightmap saved to {output_heightmap_path}")
+        logger.info(f"DEM processed and heightmap saved to {output_heightmap_path} ({size}x{size}, "
+                    f"elevation range {min_val:.1f}..{max_val:.1f}, ground size {width_m:.0f}x{height_m:.0f}m)")
+        return metadata
     except Exception as e:
         logger.error(f"Error processing DEM to heightmap: {e}")
         raise
+    finally:
+        # flush data and close datasets before deleting the scratch files, also when processing failed
+        dem_dataset = resampled_dataset = scratch_dataset = output_dataset = band = scratch_band = None
+        _remove_scratch_files(scratch_path, resampled_path)
+
+
+def heightmap_metadata_path(heightmap_path: str) -> str:
+    return heightmap_path + ".json"
+
+
+def load_heightmap_metadata(heightmap_path: str) -> dict:
+    """Reads the sidecar written by process_dem_to_heightmap."""
+    with open(heightmap_metadata_path(heightmap_path), 'r') as f:
+        return json.load(f)
+
+
+def _write_heightmap_tile(memmap_path: str, row_offset: int, col_offset: int, tile_size: int, min_val: float, max_val: float, output_path: str):
+    """Process pool worker: normalizes one window of the shared memory-mapped DEM and writes it as a 16-bit PNG."""
+    elevations = np.load(memmap_path, mmap_mode='r')
+    tile = np.array(elevations[row_offset:row_offset + tile_size, col_offset:col_offset + tile_size], dtype=np.float32)
+    # Global min/max so the shared edge rows and columns of neighbouring tiles get identical values
+    if max_val > min_val:
+        tile -= min_val
+        tile *= 65535.0 / (max_val - min_val)
+        np.clip(tile, 0, 65535, out=tile)
+        np.rint(tile, out=tile)
+    else:
+        tile[:] = 0
+
+    memory_dataset = gdal.GetDriverByName('MEM').Create('', tile_size, tile_size, 1, gdal.GDT_UInt16)
+    memory_dataset.GetRasterBand(1).WriteArray(tile.astype(np.uint16))
+    output_dataset = gdal.GetDriverByName('PNG').CreateCopy(output_path, memory_dataset)
+    if output_dataset is None:
+        raise Exception(f"Failed to create heightmap tile: {output_path}")
+    output_dataset = None
+    return output_path
+
+
+def process_dem_to_heightmap_tiles(dem_filepath: str, output_dir: str, tile_size: int = None, resampling: str = None, max_workers: int = None) -> dict:
+    """
+    Cuts a DEM into a grid of square (2^n)+1 16-bit heightmap tiles for terrains too large for a single Gazebo heightmap.
+    Neighbouring tiles share their edge row/column and the global elevation range, so their borders match exactly.
+
+    Args:
+        dem_filepath: Input DEM GeoTIFF.
+        output_dir: Directory for the tile PNGs and the heightmap_tiles.json manifest.
+        tile_size: Tile edge length in pixels, must be (2^n)+1. Defaults to config.HEIGHTMAP_TILE_SIZE.
+        resampling: GDAL resampling kernel name. Defaults to config.HEIGHTMAP_RESAMPLING.
+        max_workers: Size of the process pool. Defaults to the CPU count.
+
+    Returns:
+        The manifest: the global elevation range and, per tile, its path, Gazebo pose (x, y, z) relative to the
+        DEM centre and its (x, y, z) size in metres.
+    """
+    tile_size = tile_size if tile_size else config.HEIGHTMAP_TILE_SIZE
+    resampling = resampling if resampling else config.HEIGHTMAP_RESAMPLING
+    if tile_size < 3 or (tile_size - 1) & (tile_size - 2):
+        raise ValueError(f"Heightmap tile size must be (2^n)+1, got {tile_size}")
+    os.makedirs(output_dir, exist_ok=True)
+
+    logger.info(f"Processing DEM {dem_filepath} to {tile_size}px heightmap tiles in {output_dir}")
+    resampled_path = os.path.join(output_dir, "dem_resampled.tif")
+    memmap_path = os.path.join(output_dir, "dem_resampled.npy")
+    dem_dataset = resampled_dataset = band = elevations = None
+    try:
+        dem_dataset = gdal.Open(dem_filepath)
+        if dem_dataset is None:
+            raise Exception(f"Failed to open DEM file: {dem_filepath}")
+
+        # Resample onto a grid that is an exact number of tiles sharing their edges, close to the native resolution
+        step = tile_size - 1
+        tiles_x = max(1, math.ceil((dem_dataset.RasterXSize - 1) / step))
+        tiles_y = max(1, math.ceil((dem_dataset.RasterYSize - 1) / step))
+        grid_width = tiles_x * step + 1
+        grid_height = tiles_y * step + 1
+
+        resampled_dataset = gdal.Warp(resampled_path, dem_dataset, width=grid_width, height=grid_height, resampleAlg=resampling,
+                                      outputType=gdal.GDT_Float32, multithread=True,
+                                      creationOptions=['TILED=YES', 'BIGTIFF=IF_SAFER'])
+        if resampled_dataset is None:
+            raise Exception(f"Failed to resample DEM to {grid_width}x{grid_height}")
+        dem_dataset = None
+
+        band = resampled_dataset.GetRasterBand(1)
+        min_val, max_val = compute_dem_statistics(band)
+        nodata = band.GetNoDataValue()
+
+        elevations = np.lib.format.open_memmap(memmap_path, mode='w+', dtype=np.float32, shape=(grid_height, grid_width))
+        for xoff, yoff, win_x, win_y in _iter_block_windows(band):
+            block = band.ReadAsArray(xoff, yoff, win_x, win_y).astype(np.float32, copy=False)
+            block[~_valid_mask(block, nodata)] = min_val
+            elevations[yoff:yoff + win_y, xoff:xoff + win_x] = block
+        elevations.flush()
+        elevations = None
+
+        _, (width_m, height_m) = _ground_extent(resampled_dataset)
+        band = resampled_dataset = None
+        spacing_x = width_m / (grid_width - 1)
+        spacing_y = height_m / (grid_height - 1)
+
+        tiles = []
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = []
+            for row in range(tiles_y):
+                for col in range(tiles_x):
+                    name = f"heightmap_tile_{row}_{col}"
+                    tile_path = os.path.join(output_dir, f"{name}.png")
+                    futures.append(executor.submit(_write_heightmap_tile, memmap_path, row * step, col * step, tile_size, min_val, max_val, tile_path))
+                    # Pose of the tile centre in the Gazebo frame (x east, y north) relative to the DEM centre
+                    center_x = ((col + 0.5) * step - (grid_width - 1) / 2.0) * spacing_x
+                    center_y = ((grid_height - 1) / 2.0 - (row + 0.5) * step) * spacing_y
+                    tiles.append({
+                        'name': name,
+                        'path': tile_path,
+                        'pose': [center_x, center_y, 0.0],
+                        'size': [step * spacing_x, step * spacing_y, max_val - min_val],
+                    })
+            for future in futures:
+                future.result()
+
+        manifest = {
+            'tile_size_px': tile_size,
+            'tiles_x': tiles_x,
+            'tiles_y': tiles_y,
+            'min_elevation': min_val,
+            'max_elevation': max_val,
+            'height_range': max_val - min_val,
+            'size_x': width_m,
+            'size_y': height_m,
+            'tiles': tiles,
+        }
+        with open(os.path.join(output_dir, "heightmap_tiles.json"), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        logger.info(f"DEM processed into {tiles_x}x{tiles_y} heightmap tiles of {tile_size}px covering {width_m:.0f}x{height_m:.0f}m")
+        return manifest
+    except Exception as e:
+        logger.error(f"Error processing DEM to heightmap tiles: {e}")
+        raise
+    finally:
+        dem_dataset = resampled_dataset = band = elevations = None
+        _remove_scratch_files(memmap_path, resampled_path)
+
+
+def _dem_to_memmaps(band, output_dir: str, with_integrals: bool) -> tuple:
+    """
+    Copies a DEM band block by block into a memory-mapped float32 .npy (nodata as NaN). With with_integrals, also
+    builds (H+1, W+1) summed-area tables of the valid elevations and of the valid cell count, strip by strip, so
+    the sum over any pixel window is four lookups.
+    """
+    nodata = band.GetNoDataValue()
+    height, width = band.YSize, band.XSize
+    elevations = np.lib.format.open_memmap(os.path.join(output_dir, "dem.npy"), mode='w+', dtype=np.float32, shape=(height, width))
+    for xoff, yoff, win_x, win_y in _iter_block_windows(band):
+        block = band.ReadAsArray(xoff, yoff, win_x, win_y).astype(np.float32, copy=False)
+        block[~_valid_mask(block, nodata)] = np.nan
+        elevations[yoff:yoff + win_y, xoff:xoff + win_x] = block
+    elevations.flush()
+    if not with_integrals:
+        return elevations, None, None
+
+    sums = np.lib.format.open_memmap(os.path.join(output_dir, "dem_sums.npy"), mode='w+', dtype=np.float64, shape=(height + 1, width + 1))
+    counts = np.lib.format.open_memmap(os.path.join(output_dir, "dem_counts.npy"), mode='w+', dtype=np.int64, shape=(height + 1, width + 1))
+    sums[0] = 0
+    counts[0] = 0
+    for yoff in range(0, height, MIN_STRIP_ROWS):
+        strip = np.asarray(elevations[yoff:yoff + MIN_STRIP_ROWS], dtype=np.float64)
+        valid = np.isfinite(strip)
+        rows = slice(yoff + 1, yoff + 1 + len(strip))
+        sums[rows, 0] = 0
+        counts[rows, 0] = 0
+        sums[rows, 1:] = np.cumsum(np.cumsum(np.where(valid, strip, 0.0), axis=1), axis=0) + sums[yoff, 1:]
+        counts[rows, 1:] = np.cumsum(np.cumsum(valid, axis=1), axis=0) + counts[yoff, 1:]
+    sums.flush()
+    counts.flush()
+    return elevations, sums, counts
+
+
+def _window_minima(elevations: np.ndarray, row0: np.ndarray, row1: np.ndarray, col0: np.ndarray, col1: np.ndarray) -> np.ndarray:
+    """Lowest valid (non-NaN) cell of every pixel window [row0, row1) x [col0, col1), NaN for windows without one."""
+    minima = np.full(len(row0), np.nan)
+    window_rows = row1 - row0
+    window_cols = col1 - col0
+    # Windows are gathered in groups padded to the same square side, FOOTPRINT_CHUNK_CELLS cells at a time
+    sides = np.maximum(window_rows, window_cols)
+    for side in np.unique(sides):
+        group = np.flatnonzero(sides == side)
+        offsets = np.arange(side)
+        chunk_size = max(1, FOOTPRINT_CHUNK_CELLS // (side * side))
+        for start in range(0, len(group), chunk_size):
+            chunk = group[start:start + chunk_size]
+            # Padding repeats the window's last row and column, which leaves its minimum unchanged
+            rows = row0[chunk, None] + np.minimum(offsets[None, :], window_rows[chunk, None] - 1)
+            cols = col0[chunk, None] + np.minimum(offsets[None, :], window_cols[chunk, None] - 1)
+            cells = np.asarray(elevations[rows[:, :, None], cols[:, None, :]], dtype=np.float64).reshape(len(chunk), -1)
+            with np.errstate(invalid='ignore'):
+                minima[chunk] = np.fmin.reduce(cells, axis=1)
+    return minima
+
+
+def sample_dem_footprints(dem_filepath: str, bounds: np.ndarray, bounds_crs: str = 'EPSG:4326', statistic: str = 'min') -> np.ndarray:
+    """
+    Samples the DEM elevation under many footprints: the 'min' or 'mean' of the valid cells in the pixel window
+    covering each footprint's bounding box, read from one memory-mapped copy of the DEM.
+
+    Args:
+        dem_filepath: Input DEM GeoTIFF.
+        bounds: (n, 4) array of (minx, miny, maxx, maxy) footprint bounds in bounds_crs.
+        bounds_crs: CRS of bounds, a hashable CRS definition pyproj accepts (EPSG code, PROJ string or WKT). Bounds are reprojected to the DEM CRS if they differ.
+        statistic: One of FOOTPRINT_STATISTICS.
+
+    Returns:
+        float64 array of n elevations in DEM units, NaN where a footprint lies outside the DEM or covers only nodata.
+    """
+    if statistic not in FOOTPRINT_STATISTICS:
+        raise ValueError(f"Unsupported footprint statistic: {statistic}. Expected one of {list(FOOTPRINT_STATISTICS)}")
+    bounds = np.asarray(bounds, dtype=np.float64).reshape(-1, 4)
+    result = np.full(len(bounds), np.nan)
+    if not len(bounds):
+        return result
+
+    dem_dataset = gdal.Open(dem_filepath)
+    if dem_dataset is None:
+        raise Exception(f"Failed to open DEM file: {dem_filepath}")
+    dem_crs = pyproj.CRS.from_wkt(dem_dataset.GetProjection())
+    if not dem_crs.equals(pyproj.CRS.from_user_input(bounds_crs)):
+        # Reproject all four corners of every box and take their envelope
+        transformer = get_transformer(bounds_crs, dem_dataset.GetProjection())
+        corner_x = bounds[:, [0, 2, 2, 0]].ravel()
+        corner_y = bounds[:, [1, 1, 3, 3]].ravel()
+        x, y = transformer.transform(corner_x, corner_y)
+        x = np.asarray(x).reshape(-1, 4)
+        y = np.asarray(y).reshape(-1, 4)
+        bounds = np.column_stack([x.min(axis=1), y.min(axis=1), x.max(axis=1), y.max(axis=1)])
+
+    origin_x, pixel_x, _, origin_y, _, pixel_y = dem_dataset.GetGeoTransform()
+    width, height = dem_dataset.RasterXSize, dem_dataset.RasterYSize
+    # Pixel window [col0, col1) x [row0, row1) of every box, at least one pixel wide
+    col0 = np.floor((bounds[:, 0] - origin_x) / pixel_x)
+    col1 = np.ceil((bounds[:, 2] - origin_x) / pixel_x)
+    row0 = np.floor((bounds[:, 3] - origin_y) / pixel_y)
+    row1 = np.ceil((bounds[:, 1] - origin_y) / pixel_y)
+    inside = (col1 > 0) & (col0 < width) & (row1 > 0) & (row0 < height)
+    col0 = np.clip(col0, 0, width - 1).astype(np.int64)
+    row0 = np.clip(row0, 0, height - 1).astype(np.int64)
+    col1 = np.maximum(np.clip(col1, 0, width).astype(np.int64), col0 + 1)
+    row1 = np.maximum(np.clip(row1, 0, height).astype(np.int64), row0 + 1)
+
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(dem_filepath))) as scratch_dir:
+        elevations, sums, counts = _dem_to_memmaps(dem_dataset.GetRasterBand(1), scratch_dir, statistic == 'mean')
+        dem_dataset = None
+        if statistic == 'mean':
+            window_sum = sums[row1, col1] - sums[row0, col1] - sums[row1, col0] + sums[row0, col0]
+            window_count = counts[row1, col1] - counts[row0, col1] - counts[row1, col0] + counts[row0, col0]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                values = np.where(window_count > 0, window_sum / window_count, np.nan)
+        else:
+            values = _window_minima(elevations, row0, row1, col0, col1)
+        del elevations, sums, counts
+    result[inside] = values[inside]
+    return result
@@ -0,0 +1,127 @@
+import numpy as np
+
+# Grid points evaluated per chunk when measuring triangle errors
+RTIN_CHUNK_POINTS = 4 * 1024 * 1024
+# Triangles of one hierarchy level decoded at a time
+RTIN_CHUNK_TRIANGLES = 1024 * 1024
+
+
+def _rtin_level(tile_size: int, depth: int, start: int, stop: int) -> tuple:
+    """
+    Triangles start..stop-1 of RTIN level depth of a (tile_size + 1)^2 grid as (ax, ay, bx, by, cx, cy) int32 arrays,
+    hypotenuse a-b and right angle c. Triangle j is child (j >> depth) & 1 of triangle j mod 2^depth one level up.
+    """
+    t = tile_size
+    index = np.arange(start, stop, dtype=np.int64)
+    # Root triangles: (a, b, c) = ((t, t), (0, 0), (0, t)) and ((0, 0), (t, t), (t, 0))
+    second_root = (index & 1).astype(bool)
+    ax = ay = np.where(second_root, 0, t)
+    bx = by = np.where(second_root, t, 0)
+    cx = np.where(second_root, t, 0)
+    cy = np.where(second_root, 0, t)
+    for level in range(1, depth + 1):
+        mx = (ax + bx) >> 1
+        my = (ay + by) >> 1
+        # Child 0 keeps the b side (a <- b, b <- c), child 1 keeps the a side (b <- a, a <- c); both get c <- m
+        second_child = ((index >> level) & 1).astype(bool)
+        ax, ay, bx, by = np.where(second_child, cx, bx), np.where(second_child, cy, by), np.where(second_child, ax, cx), np.where(second_child, ay, cy)
+        cx, cy = mx, my
+    return tuple(values.astype(np.int32) for values in (ax, ay, bx, by, cx, cy))
+
+
+def _triangle_errors(flat_heights: np.ndarray, grid_size: int, ax, ay, bx, by, cx, cy) -> np.ndarray:
+    """
+    Returns, for every triangle, the maximum |planar interpolation - grid height| over all grid points it covers,
+    edges included. The triangles of one level are congruent, so each one is scanned over the same square window.
+    """
+    count = len(ax)
+    errors = np.zeros(count)
+    if not count:
+        return errors
+    min_x = np.minimum(np.minimum(ax, bx), cx).astype(np.int64)
+    min_y = np.minimum(np.minimum(ay, by), cy).astype(np.int64)
+    extent = int(max((np.maximum(np.maximum(ax, bx), cx) - min_x).max(), (np.maximum(np.maximum(ay, by), cy) - min_y).max()))
+    offset_y, offset_x = (values.ravel() for values in np.mgrid[0:extent + 1, 0:extent + 1])
+    heights_a = flat_heights[ay * grid_size + ax].astype(np.float64)
+    heights_b = flat_heights[by * grid_size + bx].astype(np.float64)
+    heights_c = flat_heights[cy * grid_size + cx].astype(np.float64)
+    denominator = ((by - cy) * (ax - cx) + (cx - bx) * (ay - cy)).astype(np.float64)
+
+    # Chunks of triangles x window points, so large top-level windows are scanned piecewise too
+    point_chunk = min(len(offset_x), RTIN_CHUNK_POINTS)
+    triangle_chunk = max(1, RTIN_CHUNK_POINTS // point_chunk)
+    for start in range(0, count, triangle_chunk):
+        s = slice(start, start + triangle_chunk)
+        for point_start in range(0, len(offset_x), point_chunk):
+            px = min_x[s, None] + offset_x[point_start:point_start + point_chunk]
+            py = min_y[s, None] + offset_y[point_start:point_start + point_chunk]
+            dx = px - cx[s, None]
+            dy = py - cy[s, None]
+            weight_a = ((by - cy)[s, None] * dx + (cx - bx)[s, None] * dy) / denominator[s, None]
+            weight_b = ((cy - ay)[s, None] * dx + (ax - cx)[s, None] * dy) / denominator[s, None]
+            weight_c = 1.0 - weight_a - weight_b
+            inside = (weight_a >= -1e-9) & (weight_b >= -1e-9) & (weight_c >= -1e-9) & (px < grid_size) & (py < grid_size)
+            grid = flat_heights[np.minimum(py, grid_size - 1) * grid_size + np.minimum(px, grid_size - 1)]
+            interpolated = weight_a * heights_a[s, None] + weight_b * heights_b[s, None] + weight_c * heights_c[s, None]
+            errors[s] = np.maximum(errors[s], np.where(inside, np.abs(interpolated - grid), 0.0).max(axis=1))
+    return errors
+
+
+def _rtin_errors(heights: np.ndarray) -> np.ndarray:
+    """
+    Per grid vertex, the largest deviation of the grid from the triangles whose hypotenuse midpoint it is, propagated
+    bottom-up so parents cover their descendants and the mesh stays crack-free. Levels are decoded in chunks.
+    """
+    grid_size = heights.shape[0]
+    flat_heights = heights.ravel()
+    errors = np.zeros(grid_size * grid_size)
+    # The last level holds the smallest triangles that still have a grid point at their hypotenuse midpoint
+    depths = 2 * int(np.log2(grid_size - 1))
+    for depth in range(depths - 1, -1, -1):
+        for start in range(0, 2 ** (depth + 1), RTIN_CHUNK_TRIANGLES):
+            ax, ay, bx, by, cx, cy = _rtin_level(grid_size - 1, depth, start, min(start + RTIN_CHUNK_TRIANGLES, 2 ** (depth + 1)))
+            mx = (ax + bx) >> 1
+            my = (ay + by) >> 1
+            middle_index = my * grid_size + mx
+            middle_error = _triangle_errors(flat_heights, grid_size, ax, ay, bx, by, cx, cy)
+            # Children of the last level span single cells; every grid point they cover is a vertex, so their error is 0
+            if depth < depths - 1:
+                left_child = ((ay + cy) >> 1) * grid_size + ((ax + cx) >> 1)
+                right_child = ((by + cy) >> 1) * grid_size + ((bx + cx) >> 1)
+                middle_error = np.maximum(middle_error, np.maximum(errors[left_child], errors[right_child]))
+            # Two triangles share each hypotenuse midpoint, so scatter with a max-reduction
+            np.maximum.at(errors, middle_index, middle_error)
+    return errors
+
+
+def _rtin_mesh(errors: np.ndarray, grid_size: int, max_error: float) -> np.ndarray:
+    """Extracts the triangles of the coarsest RTIN mesh whose error stays within max_error, as (n, 3) flat vertex indices."""
+    t = grid_size - 1
+    active = tuple(np.array(values, dtype=np.int32) for values in ([t, 0], [t, 0], [0, t], [0, t], [0, t], [t, 0]))
+    emitted = []
+    while active[0].size:
+        ax, ay, bx, by, cx, cy = active
+        mx = (ax + bx) >> 1
+        my = (ay + by) >> 1
+        split = (np.abs(ax - cx) + np.abs(ay - cy) > 1) & (errors[my * grid_size + mx] > max_error)
+        keep = ~split
+        emitted.append(np.stack([ay[keep] * grid_size + ax[keep], by[keep] * grid_size + bx[keep], cy[keep] * grid_size + cx[keep]], axis=1))
+        ax, ay, bx, by, cx, cy, mx, my = (values[split] for values in (ax, ay, bx, by, cx, cy, mx, my))
+        active = (
+            np.concatenate([cx, bx]), np.concatenate([cy, by]),
+            np.concatenate([ax, cx]), np.concatenate([ay, cy]),
+            np.concatenate([mx, mx]), np.concatenate([my, my]),
+        )
+    return np.concatenate(emitted)
+
+
+def rtin_mesh(heights: np.ndarray, max_error: float) -> np.ndarray:
+    """
+    Triangulates a square (2^n)+1 height grid into the coarsest RTIN mesh in which no grid point deviates more
+    than max_error from the surface. Returns (n, 3) flat vertex indices (row * size + col) into the grid.
+    """
+    size = heights.shape[0]
+    if heights.shape != (size, size) or size < 3 or (size - 1) & (size - 2):
+        raise ValueError(f"RTIN grid must be square with edge (2^n)+1, got {heights.shape}")
+    errors = _rtin_errors(heights)
+    return _rtin_mesh(errors, size, max_error)
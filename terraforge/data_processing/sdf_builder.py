@@ -5,23 +5,57 @@ from utils.logging import logger
 
 from utils.coordinates import CoordinateConverter
 
+DEFAULT_HEIGHTMAP_SIZE = (1000, 1000, 200)
+
 class SDFWorldBuilder:
     def __init__(self, template_dir='./templates'):
         self.template_env = Environment(loader=FileSystemLoader(template_dir))
         logger.info(f"SDF World Builder initialized with template directory: {template_dir}")
 
-    def render_world_template(self, heightmap_path=None, texture_path=None, building_model_paths=None, building_poses=None):
+    def render_world_template(self, heightmap_path=None, texture_path=None, building_model_paths=None, building_poses=None, heightmap_size=None, terrain_tiles=None, terrain_mesh_path=None,
+                              collision_heightmap_path=None, collision_heightmap_size=None, collision_mesh_path=None, building_includes=None):
         # Renders the world_template.sdf.j2 template with provided data
+        # heightmap_size is the (x, y, z) extent in metres, usually (size_x, size_y, height_range) from the heightmap sidecar
+        # terrain_tiles is the 'tiles' list of a heightmap tile manifest, rendered as one heightmap model per tile; a tile
+        # with a 'material' name gets that material (see render_material_script)
+        # terrain_mesh_path replaces the heightmap with an adaptive terrain mesh
+        # collision_heightmap_path / collision_mesh_path give the terrain a separate, usually coarser, <collision>
+        # geometry; without them the visual terrain is used for collision as well
+        # building_includes are {'name', 'uri', 'pose': (x, y, z, yaw)} dicts, e.g. model:// library references
+        heightmap_size = heightmap_size if heightmap_size else DEFAULT_HEIGHTMAP_SIZE
+        terrain_visual = self._terrain_geometry(heightmap_path, heightmap_size, terrain_mesh_path)
+        terrain_collision = self._terrain_geometry(collision_heightmap_path, collision_heightmap_size if collision_heightmap_size else heightmap_size, collision_mesh_path)
         template = self.template_env.get_template('world_template.sdf.j2')
         rendered_sdf = template.render(
-            heightmap_path=heightmap_path,
+            terrain_visual=terrain_visual,
+            terrain_collision=terrain_collision if terrain_collision else terrain_visual,
             texture_path=texture_path,
             building_model_paths=building_model_paths if building_model_paths else [],
-            building_poses=building_poses if building_poses else []
+            building_poses=building_poses if building_poses else [],
+            building_includes=building_includes if building_includes else [],
+            terrain_tiles=terrain_tiles if terrain_tiles else []
         )
         logger.info("SDF world template rendered.")
         return rendered_sdf
-    
+
+    @staticmethod
+    def _terrain_geometry(heightmap_path, heightmap_size, mesh_path):
+        # The template context for one terrain <geometry>; a mesh takes precedence over a heightmap
+        if mesh_path:
+            return {'type': 'mesh', 'uri': mesh_path}
+        if heightmap_path:
+            return {'type': 'heightmap', 'uri': heightmap_path, 'size': heightmap_size}
+        return None
+
+    def render_material_script(self, texture_filename, tile_textures=None):
+        # Renders the gazebo.material.j2 script defining Gazebo/SatelliteTexture, the terrain material of the world template
+        # texture_filename is the texture's file name in media/materials/textures, a .png or a mipmapped .dds
+        # tile_textures are {'material', 'texture_filename'} dicts, one material per heightmap tile with its own texture window
+        template = self.template_env.get_template('gazebo.material.j2')
+        rendered_material = template.render(texture_filename=texture_filename, tile_textures=tile_textures if tile_textures else [])
+        logger.info(f"Material script rendered for texture {texture_filename}.")
+        return rendered_material
+
     def save_sdf_world_file(self, sdf_content, output_path):
         # Saves the rendered SDF content to a file
         try:
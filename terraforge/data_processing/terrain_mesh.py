@@ -0,0 +1,112 @@
+import os
+import json
+import numpy as np
+from osgeo import gdal
+from utils.config import config
+from utils.logging import logger
+from data_processing.elevation_processor import gazebo_heightmap_size, compute_dem_statistics, _ground_extent, _valid_mask
+from data_processing.rtin import rtin_mesh
+
+
+def _write_obj(path: str, vertices: np.ndarray, faces: np.ndarray, comment: str = "TerraForge adaptive terrain mesh", uvs: np.ndarray = None):
+    # uvs, if given, holds one (u, v) texture coordinate per vertex; faces then reference it with the vertex index
+    with open(path, 'w') as f:
+        f.write(f"# {comment}\n")
+        np.savetxt(f, vertices, fmt='v %.3f %.3f %.3f')
+        if uvs is None:
+            np.savetxt(f, faces + 1, fmt='f %d %d %d')
+        else:
+            np.savetxt(f, uvs, fmt='vt %.6f %.6f')
+            np.savetxt(f, np.repeat(faces + 1, 2, axis=1), fmt='f %d/%d %d/%d %d/%d')
+
+
+def process_dem_to_terrain_mesh(dem_filepath: str, output_mesh_path: str, max_error: float = None, size: int = None, resampling: str = None,
+                                base_elevation: float = None) -> dict:
+    """
+    Builds an error-bounded adaptive terrain mesh (RTIN) from a DEM as a Wavefront OBJ in the Gazebo frame, with
+    texture coordinates draping the grid-aligned texture and a <output_mesh_path>.json sidecar of mesh statistics.
+
+    Args:
+        dem_filepath: Input DEM GeoTIFF.
+        output_mesh_path: Output .obj path.
+        max_error: Maximum vertical error in metres. Defaults to config.TERRAIN_MESH_MAX_ERROR.
+        size: Grid edge length in pixels, must be (2^n)+1. Defaults to the (2^n)+1 size closest to the DEM size.
+        resampling: GDAL resampling kernel name. Defaults to config.HEIGHTMAP_RESAMPLING.
+        base_elevation: Elevation placed at z = 0. Defaults to the lowest elevation of the grid; pass the visual mesh's
+            min_elevation when building a coarser collision mesh so both share one vertical frame.
+
+    Returns:
+        The mesh statistics written to the sidecar.
+    """
+    max_error = max_error if max_error is not None else config.TERRAIN_MESH_MAX_ERROR
+    resampling = resampling if resampling else config.HEIGHTMAP_RESAMPLING
+    logger.info(f"Building adaptive terrain mesh from {dem_filepath} with max error {max_error}m to {output_mesh_path}")
+    try:
+        dem_dataset = gdal.Open(dem_filepath)
+        if dem_dataset is None:
+            raise Exception(f"Failed to open DEM file: {dem_filepath}")
+        if size is None:
+            size = gazebo_heightmap_size(dem_dataset.RasterXSize, dem_dataset.RasterYSize)
+        if size < 3 or (size - 1) & (size - 2):
+            raise ValueError(f"Terrain mesh grid size must be (2^n)+1, got {size}")
+
+        resampled_dataset = gdal.Warp('', dem_dataset, format='MEM', width=size, height=size, resampleAlg=resampling,
+                                      outputType=gdal.GDT_Float32, multithread=True)
+        if resampled_dataset is None:
+            raise Exception(f"Failed to resample DEM to {size}x{size}")
+        dem_dataset = None
+
+        band = resampled_dataset.GetRasterBand(1)
+        min_val, max_val = compute_dem_statistics(band)
+        heights = band.ReadAsArray().astype(np.float32, copy=False)
+        heights[~_valid_mask(heights, band.GetNoDataValue())] = min_val
+        heights -= base_elevation if base_elevation is not None else min_val
+        _, (width_m, height_m) = _ground_extent(resampled_dataset)
+        resampled_dataset = None
+
+        faces = rtin_mesh(heights, max_error)
+
+        # Compact to the vertices actually used, then project grid (row, col) to Gazebo x east / y north
+        used_vertices, faces = np.unique(faces, return_inverse=True)
+        faces = faces.reshape(-1, 3)
+        rows, cols = np.divmod(used_vertices, size)
+        spacing_x = width_m / (size - 1)
+        spacing_y = height_m / (size - 1)
+        vertices = np.column_stack([
+            (cols - (size - 1) / 2.0) * spacing_x,
+            ((size - 1) / 2.0 - rows) * spacing_y,
+            heights.ravel()[used_vertices],
+        ])
+        uvs = np.column_stack([cols / (size - 1), 1.0 - rows / (size - 1)])
+
+        # Make every face counter-clockwise seen from above so normals point up
+        v0, v1, v2 = vertices[faces[:, 0]], vertices[faces[:, 1]], vertices[faces[:, 2]]
+        clockwise = ((v1[:, 0] - v0[:, 0]) * (v2[:, 1] - v0[:, 1]) - (v1[:, 1] - v0[:, 1]) * (v2[:, 0] - v0[:, 0])) < 0
+        faces[clockwise] = faces[clockwise][:, [0, 2, 1]]
+
+        os.makedirs(os.path.dirname(os.path.abspath(output_mesh_path)), exist_ok=True)
+        _write_obj(output_mesh_path, vertices, faces, uvs=uvs)
+
+        heightmap_triangles = 2 * (size - 1) ** 2
+        stats = {
+            'mesh_path': output_mesh_path,
+            'grid_size_px': size,
+            'max_error': max_error,
+            'vertices': int(len(vertices)),
+            'triangles': int(len(faces)),
+            'heightmap_triangles': heightmap_triangles,
+            'triangle_reduction': 1.0 - len(faces) / heightmap_triangles,
+            'min_elevation': min_val,
+            'max_elevation': max_val,
+            'size_x': width_m,
+            'size_y': height_m,
+        }
+        with open(output_mesh_path + ".json", 'w') as f:
+            json.dump(stats, f, indent=2)
+
+        logger.info(f"Terrain mesh saved to {output_mesh_path}: {stats['triangles']} triangles vs {heightmap_triangles} for the "
+                    f"equivalent {size}x{size} heightmap ({stats['triangle_reduction']:.1%} fewer), {stats['vertices']} vertices")
+        return stats
+    except Exception as e:
+        logger.error(f"Error building terrain mesh: {e}")
+        raise
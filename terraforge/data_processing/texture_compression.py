@@ -0,0 +1,171 @@
+import os
+import math
+import struct
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from osgeo import gdal
+from utils.config import config
+from utils.logging import logger
+
+BC1_BLOCK_BYTES = 8
+
+# Pixel rows of one mip level encoded per task; bounds the per-thread working set to a strip of the level
+DDS_STRIP_ROWS = 128
+
+# DDS header flags: CAPS | HEIGHT | WIDTH | PIXELFORMAT | MIPMAPCOUNT | LINEARSIZE
+DDS_HEADER_FLAGS = 0x1 | 0x2 | 0x4 | 0x1000 | 0x20000 | 0x80000
+DDPF_FOURCC = 0x4
+# DDS caps: TEXTURE | COMPLEX | MIPMAP
+DDS_CAPS = 0x1000 | 0x8 | 0x400000
+DDS_HEADER_BYTES = 128
+
+
+def _to_rgb565(colors: np.ndarray) -> np.ndarray:
+    rgb = np.rint(colors * (np.array([31, 63, 31], dtype=np.float32) / 255.0)).astype(np.uint16)
+    return (rgb[..., 0] << 11) | (rgb[..., 1] << 5) | rgb[..., 2]
+
+
+def _from_rgb565(values: np.ndarray) -> np.ndarray:
+    r = (values >> 11) & 0x1F
+    g = (values >> 5) & 0x3F
+    b = values & 0x1F
+    return np.stack([(r << 3) | (r >> 2), (g << 2) | (g >> 4), (b << 3) | (b >> 2)], axis=-1).astype(np.float32)
+
+
+def encode_bc1_blocks(blocks: np.ndarray) -> np.ndarray:
+    """
+    Encodes (n, 16, 3) uint8 RGB 4x4 blocks (pixels in row-major order) to (n, 8) uint8 BC1 blocks, the endpoints
+    spanning each block's pixels along its principal colour axis.
+    """
+    pixels = blocks.astype(np.float32)
+    mean = pixels.mean(axis=1)
+    centered = pixels - mean[:, None, :]
+    covariance = np.einsum('nki,nkj->nij', centered, centered)
+    axis = pixels.max(axis=1) - pixels.min(axis=1) + 1e-3
+    for _ in range(4):
+        axis = np.einsum('nij,nj->ni', covariance, axis)
+        norm = np.linalg.norm(axis, axis=1, keepdims=True)
+        axis = np.where(norm > 1e-6, axis / np.maximum(norm, 1e-6), np.float32(1.0 / math.sqrt(3.0)))
+    projection = np.einsum('nki,ni->nk', centered, axis)
+    low = mean + axis * projection.min(axis=1, keepdims=True)
+    high = mean + axis * projection.max(axis=1, keepdims=True)
+    inset = (high - low) / 16.0
+    low = np.clip(low + inset, 0, 255)
+    high = np.clip(high - inset, 0, 255)
+
+    color0 = _to_rgb565(high)
+    color1 = _to_rgb565(low)
+    # Four-colour mode needs color0 > color1
+    swap = color0 < color1
+    color0, color1 = np.where(swap, color1, color0), np.where(swap, color0, color1)
+
+    endpoint0 = _from_rgb565(color0)
+    endpoint1 = _from_rgb565(color1)
+    palette = np.stack([endpoint0, endpoint1, (2 * endpoint0 + endpoint1) / 3.0, (endpoint0 + 2 * endpoint1) / 3.0], axis=1)
+    distances = np.square(pixels[:, :, None, :] - palette[:, None, :, :]).sum(axis=-1)
+    indices = np.argmin(distances, axis=2).astype(np.uint32)
+    # Equal endpoints decode in three-colour mode, where only index 0 is color0
+    indices[color0 == color1] = 0
+
+    encoded = np.empty(len(blocks), dtype=[('color0', '<u2'), ('color1', '<u2'), ('indices', '<u4')])
+    encoded['color0'] = color0
+    encoded['color1'] = color1
+    encoded['indices'] = (indices << (2 * np.arange(16, dtype=np.uint32))).sum(axis=1, dtype=np.uint32)
+    return encoded.view(np.uint8).reshape(-1, BC1_BLOCK_BYTES)
+
+
+def _image_to_blocks(image: np.ndarray) -> tuple:
+    # (h, w, 3) -> (blocks_y * blocks_x, 16, 3), padding partial blocks by repeating the edge pixels
+    height, width = image.shape[:2]
+    blocks_y, blocks_x = -(-height // 4), -(-width // 4)
+    image = np.pad(image, ((0, blocks_y * 4 - height), (0, blocks_x * 4 - width), (0, 0)), mode='edge')
+    blocks = image.reshape(blocks_y, 4, blocks_x, 4, 3).transpose(0, 2, 1, 3, 4).reshape(-1, 16, 3)
+    return blocks, blocks_x
+
+
+def _mip_sizes(width: int, height: int) -> list:
+    sizes = [(width, height)]
+    while sizes[-1] != (1, 1):
+        sizes.append((max(1, sizes[-1][0] // 2), max(1, sizes[-1][1] // 2)))
+    return sizes
+
+
+def _level_bytes(width: int, height: int) -> int:
+    return -(-width // 4) * -(-height // 4) * BC1_BLOCK_BYTES
+
+
+def _dds_header(width: int, height: int, mip_count: int) -> bytes:
+    pixel_format = struct.pack('<II4s5I', 32, DDPF_FOURCC, b'DXT1', 0, 0, 0, 0, 0)
+    return b'DDS ' + struct.pack('<7I44x', 124, DDS_HEADER_FLAGS, height, width, _level_bytes(width, height), 0, mip_count) + \
+        pixel_format + struct.pack('<5I', DDS_CAPS, 0, 0, 0, 0)
+
+
+def _encode_strip(source_path: str, width: int, height: int, level_width: int, level_height: int, row0: int, row1: int) -> np.ndarray:
+    """Worker: reads rows [row0, row1) of one mip level, box-filtered from the source by GDAL, and encodes them."""
+    dataset = gdal.Open(source_path)
+    if dataset is None:
+        raise Exception(f"Failed to open texture: {source_path}")
+    # Source window of the strip; a power-of-two texture maps every level pixel to an exact 2^n x 2^n source square
+    source_row0 = int(round(row0 * height / level_height))
+    source_row1 = int(round(row1 * height / level_height))
+    strip = dataset.ReadAsArray(0, source_row0, width, source_row1 - source_row0, buf_xsize=level_width, buf_ysize=row1 - row0,
+                                band_list=[1, 2, 3], resample_alg=gdal.GRIORA_Average)
+    dataset = None
+    blocks, _ = _image_to_blocks(np.ascontiguousarray(np.moveaxis(strip, 0, -1)))
+    return encode_bc1_blocks(blocks)
+
+
+def write_bc1_dds(source_path: str, output_path: str, max_workers: int = None) -> dict:
+    """
+    Writes an RGB raster as a BC1 (DXT1) DDS texture with its full box-filtered mip chain, encoded in parallel strips
+    of DDS_STRIP_ROWS rows straight into the memory-mapped output. The source should be tiled, e.g. a GeoTIFF.
+
+    Args:
+        source_path: Input raster with at least three bands (RGB).
+        output_path: Output .dds path.
+        max_workers: Encoder threads. Defaults to config.TEXTURE_ENCODE_WORKERS.
+
+    Returns:
+        Dict with the 'dds_path', 'width', 'height', 'mip_levels' and 'bytes' of the texture.
+    """
+    max_workers = max_workers if max_workers else config.TEXTURE_ENCODE_WORKERS
+    logger.info(f"Encoding {source_path} to BC1 DDS {output_path} with {max_workers} workers")
+    try:
+        dataset = gdal.Open(source_path)
+        if dataset is None:
+            raise Exception(f"Failed to open texture: {source_path}")
+        if dataset.RasterCount < 3:
+            raise Exception(f"Texture {source_path} has {dataset.RasterCount} bands, BC1 needs RGB")
+        width, height = dataset.RasterXSize, dataset.RasterYSize
+        dataset = None
+
+        sizes = _mip_sizes(width, height)
+        level_offsets = np.concatenate([[0], np.cumsum([_level_bytes(w, h) for w, h in sizes])])
+        total_bytes = DDS_HEADER_BYTES + int(level_offsets[-1])
+        with open(output_path, 'wb') as f:
+            f.write(_dds_header(width, height, len(sizes)))
+            f.truncate(total_bytes)
+        payload = np.memmap(output_path, dtype=np.uint8, mode='r+', offset=DDS_HEADER_BYTES, shape=(total_bytes - DDS_HEADER_BYTES,))
+
+        def encode(job):
+            level, row0, row1 = job
+            level_width, level_height = sizes[level]
+            encoded = _encode_strip(source_path, width, height, level_width, level_height, row0, row1)
+            # Strips start on block rows, so their blocks are contiguous in the level
+            offset = int(level_offsets[level]) + (row0 // 4) * -(-level_width // 4) * BC1_BLOCK_BYTES
+            payload[offset:offset + encoded.size] = encoded.ravel()
+
+        jobs = [(level, row0, min(row0 + DDS_STRIP_ROWS, level_height))
+                for level, (_, level_height) in enumerate(sizes) for row0 in range(0, level_height, DDS_STRIP_ROWS)]
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bc1-encode") as executor:
+            for _ in executor.map(encode, jobs):
+                pass
+        payload.flush()
+        del payload
+
+        logger.info(f"BC1 DDS written to {output_path}: {width}x{height}, {len(sizes)} mip levels, "
+                    f"{total_bytes / (1024 * 1024):.1f} MiB ({width * height * 4 / max(total_bytes, 1):.1f}x smaller than the RGBA base level)")
+        return {'dds_path': output_path, 'width': width, 'height': height, 'mip_levels': len(sizes), 'bytes': total_bytes}
+    except Exception as e:
+        logger.error(f"Error encoding BC1 DDS texture: {e}")
+        raise
@@ -1,29 +1,168 @@
-
 import os
+import math
 import shutil
+from osgeo import gdal
+from utils.config import config
 from utils.logging import logger
+from utils.coordinates import get_transformer
+from data_processing.texture_compression import write_bc1_dds
+
+# Smallest texture edge chosen automatically for the warped texture
+MIN_TEXTURE_SIZE_PX = 256
+
+TEXTURE_FORMATS = ('png', 'dds')
+
+
+def _texture_size(mosaic_dataset, grid: dict, max_texture_size: int) -> tuple:
+    """
+    Returns the power-of-two texture edge that keeps the mosaic's ground resolution over the terrain grid, capped
+    at max_texture_size, and the resulting metres per pixel.
+    """
+    center_x = (grid['bounds'][0] + grid['bounds'][2]) / 2.0
+    center_y = (grid['bounds'][1] + grid['bounds'][3]) / 2.0
+    _, center_lat = get_transformer(grid['projection'], "EPSG:4326").transform(center_x, center_y)
+    # Web Mercator pixels are 1/cos(lat) times larger than the ground they cover
+    mosaic_meters_per_pixel = abs(mosaic_dataset.GetGeoTransform()[1]) * math.cos(math.radians(center_lat))
+    extent = max(grid['size_x'], grid['size_y'])
+    size = 2 ** int(round(math.log2(max(extent / mosaic_meters_per_pixel, 1))))
+    size = max(min(size, 2 ** int(math.log2(max_texture_size))), MIN_TEXTURE_SIZE_PX)
+    return size, extent / size
 
-def process_satellite_texture(texture_dir: str, output_texture_path: str):
+
+def process_satellite_texture(texture_dir: str, output_texture_path: str, grid: dict = None, texture_size: int = None, resampling: str = None,
+                              texture_format: str = None) -> dict:
     """
-    Processes the downloaded satellite texture. In this version
-    it mainly copies the merged texture to a specified output path.
-    TODO : this could include tiling, georeferencing adjustments, material file creation, etc.
+    Processes the downloaded satellite texture into the PNG at output_texture_path, warped onto the terrain grid if
+    given (see elevation_processor.terrain_grid) so pixel (0, 0) is its north-west corner. texture_format 'dds' also
+    writes a BC1 mip chain next to the PNG (see texture_compression.write_bc1_dds).
+
+    Args:
+        texture_dir: Directory with the merged satellite_texture.tif mosaic (or satellite_texture.png).
+        output_texture_path: Output PNG path.
+        grid: Optional terrain grid with 'projection', 'bounds', 'size_x' and 'size_y'.
+        texture_size: Square output size in pixels. Defaults to the power of two closest to the mosaic's ground
+            resolution, capped at config.TEXTURE_MAX_SIZE_PX.
+        resampling: GDAL resampling kernel name. Defaults to config.TEXTURE_RESAMPLING.
+        texture_format: One of TEXTURE_FORMATS. Defaults to config.TEXTURE_FORMAT.
+
+    Returns:
+        Dict with the 'texture_path', the 'dds_path' (None without DDS), whether it is 'aligned' to the grid and, if so,
+        its 'size_px' and 'meters_per_pixel'.
     """
+    resampling = resampling if resampling else config.TEXTURE_RESAMPLING
+    texture_format = texture_format if texture_format else config.TEXTURE_FORMAT
+    if texture_format not in TEXTURE_FORMATS:
+        raise ValueError(f"Unsupported texture format: {texture_format}. Expected one of {list(TEXTURE_FORMATS)}")
+    dds_path = os.path.splitext(output_texture_path)[0] + ".dds" if texture_format == 'dds' else None
     logger.info(f"Processing satellite texture from {texture_dir} to {output_texture_path}")
     try:
+        input_mosaic_file = os.path.join(texture_dir, "satellite_texture.tif")
         input_texture_file = os.path.join(texture_dir, "satellite_texture.png")
-        if not os.path.exists(input_texture_file):
-            raise FileNotFoundError(f"Merged texture file not found: {input_texture_file}. Make sure to run data acquisition first.")
-        
+        if not os.path.exists(input_mosaic_file) and not os.path.exists(input_texture_file):
+            raise FileNotFoundError(f"Merged texture file not found: {input_mosaic_file}. Make sure to run data acquisition first.")
+
         output_dir = os.path.dirname(output_texture_path)
         os.makedirs(output_dir, exist_ok=True)
 
-        shutil.copy2(input_texture_file, output_texture_path)
+        info = {'texture_path': output_texture_path, 'dds_path': dds_path, 'aligned': False}
+        if os.path.exists(input_mosaic_file) and grid is not None:
+            mosaic_dataset = gdal.Open(input_mosaic_file)
+            if mosaic_dataset is None:
+                raise Exception(f"Failed to open texture mosaic: {input_mosaic_file}")
+            meters_per_pixel = None
+            if texture_size is None:
+                texture_size, meters_per_pixel = _texture_size(mosaic_dataset, grid, config.TEXTURE_MAX_SIZE_PX)
+
+            warped_path = output_texture_path + ".warped.tif"
+            warped_dataset = gdal.Warp(warped_path, mosaic_dataset, format='GTiff', dstSRS=grid['projection'], outputBounds=grid['bounds'],
+                                       width=texture_size, height=texture_size, resampleAlg=resampling, multithread=True,
+                                       warpOptions=['NUM_THREADS=ALL_CPUS'], warpMemoryLimit=config.TEXTURE_WARP_MEMORY_MB * 1024 * 1024,
+                                       creationOptions=['TILED=YES', 'BIGTIFF=IF_SAFER'])
+            if warped_dataset is None:
+                raise Exception(f"Failed to warp {input_mosaic_file} onto the terrain grid")
+            mosaic_dataset = None
+
+            result = gdal.Translate(output_texture_path, warped_dataset, format='PNG')
+            if result is None:
+                raise Exception(f"Failed to convert {warped_path} to {output_texture_path}")
+            result = None
+            warped_dataset = None
+            if dds_path:
+                write_bc1_dds(warped_path, dds_path)
+            gdal.GetDriverByName('GTiff').Delete(warped_path)
+
+            info.update({'aligned': True, 'size_px': texture_size,
+                         'meters_per_pixel': meters_per_pixel if meters_per_pixel else max(grid['size_x'], grid['size_y']) / texture_size})
+            logger.info(f"Satellite texture warped onto the terrain grid: {texture_size}x{texture_size} px, "
+                        f"{info['meters_per_pixel']:.2f} m/px over {grid['size_x']:.0f}x{grid['size_y']:.0f}m")
+        elif os.path.exists(input_mosaic_file):
+            # The PNG driver encodes scanline by scanline from the tiled mosaic, so this does not load the whole image
+            result = gdal.Translate(output_texture_path, input_mosaic_file, format='PNG')
+            if result is None:
+                raise Exception(f"Failed to convert {input_mosaic_file} to {output_texture_path}")
+            result = None
+            if dds_path:
+                write_bc1_dds(input_mosaic_file, dds_path)
+        else:
+            shutil.copy2(input_texture_file, output_texture_path)
+            if dds_path:
+                write_bc1_dds(output_texture_path, dds_path)
 
-        logger.info(f"Satellite texture coped to {output_texture_path}")
+        logger.info(f"Satellite texture written to {output_texture_path}")
+        return info
     except FileNotFoundError as e:
         logger.error(f"Texture processing failed: {e}")
         raise
     except Exception as e:
         logger.error(f"Error processing statellite texture: {e}")
-        raise
\ No newline at end of file
+        raise
+
+
+def write_texture_tiles(texture_path: str, tiles_manifest: dict, output_dir: str, texture_format: str = None) -> dict:
+    """
+    Cuts a texture aligned to the terrain grid (see process_satellite_texture) into one sub-window per heightmap tile,
+    so each tile model drapes the part of the texture it covers instead of the whole texture.
+
+    Args:
+        texture_path: Aligned texture covering the manifest's size_x x size_y metres.
+        tiles_manifest: Manifest from elevation_processor.process_dem_to_heightmap_tiles.
+        output_dir: Directory for the <tile name>.png sub-windows.
+        texture_format: One of TEXTURE_FORMATS; 'dds' also writes a BC1 DDS per tile. Defaults to config.TEXTURE_FORMAT.
+
+    Returns:
+        Dict of tile name to the path of its texture, the .dds one when written.
+    """
+    texture_format = texture_format if texture_format else config.TEXTURE_FORMAT
+    logger.info(f"Cutting {texture_path} into {len(tiles_manifest['tiles'])} heightmap tile textures in {output_dir}")
+    try:
+        texture_dataset = gdal.Open(texture_path)
+        if texture_dataset is None:
+            raise Exception(f"Failed to open texture: {texture_path}")
+        os.makedirs(output_dir, exist_ok=True)
+        pixels_per_meter_x = texture_dataset.RasterXSize / tiles_manifest['size_x']
+        pixels_per_meter_y = texture_dataset.RasterYSize / tiles_manifest['size_y']
+
+        tile_textures = {}
+        for tile in tiles_manifest['tiles']:
+            # Tile poses are centres relative to the terrain centre, x east and y north; texture rows run north to south
+            west = tile['pose'][0] - tile['size'][0] / 2.0 + tiles_manifest['size_x'] / 2.0
+            north = tiles_manifest['size_y'] / 2.0 - (tile['pose'][1] + tile['size'][1] / 2.0)
+            col0 = int(round(west * pixels_per_meter_x))
+            row0 = int(round(north * pixels_per_meter_y))
+            col1 = min(int(round((west + tile['size'][0]) * pixels_per_meter_x)), texture_dataset.RasterXSize)
+            row1 = min(int(round((north + tile['size'][1]) * pixels_per_meter_y)), texture_dataset.RasterYSize)
+            tile_texture_path = os.path.join(output_dir, f"{tile['name']}.png")
+            result = gdal.Translate(tile_texture_path, texture_dataset, format='PNG', srcWin=[col0, row0, max(col1 - col0, 1), max(row1 - row0, 1)])
+            if result is None:
+                raise Exception(f"Failed to cut the texture of tile {tile['name']}")
+            result = None
+            if texture_format == 'dds':
+                tile_texture_path = write_bc1_dds(tile_texture_path, os.path.splitext(tile_texture_path)[0] + ".dds")['dds_path']
+            tile_textures[tile['name']] = tile_texture_path
+        texture_dataset = None
+
+        logger.info(f"Heightmap tile textures written to {output_dir}")
+        return tile_textures
+    except Exception as e:
+        logger.error(f"Error cutting heightmap tile textures: {e}")
+        raise
@@ -1,5 +1,6 @@
 
 
+import math
 import sys
 import os
 import logging
@@ -10,12 +11,11 @@ from PyQt6.QtCore import pyqtSlot, QThread, pyqtSignal, QUrl
 from utils.config import config
 from utils.logging import setup_logger
 from utils.coordinates import CoordinateConverter
-from data_acquisition import elevation, osm, textures
-from data_processing import elevation_processor, building_processor, texture_processor
+from data_acquisition.stages import run_acquisition_stages, default_acquisition_stages
+from data_processing import elevation_processor, building_processor, building_store, texture_processor
 from data_processing.sdf_builder import SDFWorldBuilder
 import shutil
-import json
-import shapely.geometry
+from osgeo import gdal
 
 logger = setup_logger('gui_app', log_level=logging.DEBUG)
 
@@ -34,6 +34,10 @@ class WorldGeneratorThread(QThread):
         self.output_dir = output_dir
         self.world_name = world_name
 
+    def _emit_stage_progress(self, stage_name, message):
+        # Called from the acquisition worker threads; queued signal delivery makes this safe
+        self.generation_progress.emit(f"[{stage_name}] {message}")
+
     def run(self):
         self.generation_started.emit()
         origin_location = (self.latitude, self.longitude)
@@ -46,61 +50,56 @@ class WorldGeneratorThread(QThread):
         os.makedirs(texture_output_dir, exist_ok=True)
 
         try:
-            elevation.download_dem(origin_location, self.radius, dem_output_path)
-            self.generation_progress.emit("DEM data downloaded.")
-            osm.download_osm_buildings(origin_location, self.radius, osm_output_path)
-            self.generation_progress.emit("OSM building data downloaded.")
-            textures.download_satellite_texture_tiles(origin_location, self.radius, texture_output_dir, mapbox_api_key=config.MAPBOX_API_KEY)
-            self.generation_progress.emit("Satellite textures downloaded.")
+            # The three downloads are independent and I/O-bound, so they run concurrently and report progress per stage
+            stages = default_acquisition_stages(origin_location, self.radius, dem_output_path, osm_output_path, texture_output_dir,
+                                                mapbox_api_key=config.MAPBOX_API_KEY)
+            acquisition_errors = run_acquisition_stages(stages, progress_callback=self._emit_stage_progress)
         except Exception as e:
             error_msg = f"Data acquisition failed: {e}"
             logger.error(error_msg)
             self.generation_error.emit(error_msg)
             return
 
+        # --- Coordinate Conversion ---
+        self.generation_progress.emit("Setting up Coordinate Conversion...")
+        # The AOI square reaches radius * sqrt(2) from the origin at its corners
+        converter = CoordinateConverter(origin_location, radius_meters=self.radius * math.sqrt(2))
+
         # --- Data Processing ---
         self.generation_progress.emit("Starting Data Processing...")
         heightmap_output_path = os.path.join(config.DEM_OUTPUT_DIR, f"{location_name}_heightmap.png")
         building_sdf_output_dir = os.path.join(config.OSM_OUTPUT_DIR, f"{location_name}_building_models_sdf")
+        building_store_dir = os.path.join(config.OSM_OUTPUT_DIR, f"{location_name}_building_store")
         processed_texture_output_dir = os.path.join(config.TEXTURE_OUTPUT_DIR, "processed_textures")
         processed_texture_output_path = os.path.join(processed_texture_output_dir, "satellite_texture.png")
 
+        texture_info = None
         try:
-            elevation_processor.process_dem_to_heightmap(dem_output_path, heightmap_output_path)
+            heightmap_info = elevation_processor.process_dem_to_heightmap(dem_output_path, heightmap_output_path, output_format='png16')
             self.generation_progress.emit("DEM processed to heightmap.")
-            building_processor.process_osm_buildings_to_sdf(osm_output_path, building_sdf_output_dir)
-            self.generation_progress.emit("OSM buildings processed to SDF models.")
-            texture_processor.process_satellite_texture(texture_output_dir, processed_texture_output_path)
-            self.generation_progress.emit("Satellite texture processed.")
+            if 'buildings' not in acquisition_errors:
+                building_store.write_building_store(osm_output_path, building_store_dir, origin_location, projection=converter.projection)
+                building_processor.process_building_store_to_sdf(building_store_dir, building_sdf_output_dir)
+                self.generation_progress.emit("OSM buildings processed to SDF models.")
+            if 'textures' not in acquisition_errors:
+                texture_info = texture_processor.process_satellite_texture(texture_output_dir, processed_texture_output_path, grid=elevation_processor.terrain_grid(dem_output_path))
+                self.generation_progress.emit("Satellite texture processed.")
         except Exception as e:
             error_msg = f"Data processing failed: {e}"
             logger.error(error_msg)
             self.generation_error.emit(error_msg)
             return
 
-        # --- Coordinate Conversion ---
-        self.generation_progress.emit("Setting up Coordinate Conversion...")
-        converter = CoordinateConverter(origin_location)
-
         # --- SDF World Generation ---
         self.generation_progress.emit("Starting SDF World Generation...")
-        template_directory = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'sdf_generation', 'templates')
+        template_directory = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data_processing', 'templates')
         sdf_builder = SDFWorldBuilder(template_directory)
 
-        building_model_paths = [os.path.join(building_sdf_output_dir, f) for f in os.listdir(building_sdf_output_dir) if f.endswith('.sdf')] if os.path.exists(building_sdf_output_dir) else []
-
+        building_model_paths = []
         building_poses_gazebo = []
-        if os.path.exists(osm_output_path):
-            with open(osm_output_path, 'r') as f:
-                osm_data = json.load(f)
-            features = osm_data['features']
-            for feature in features:
-                if feature['geometry']['type'] in ['Polygon', 'MultiPolygon']:
-                    polygon = shapely.geometry.shape(feature['geometry'])
-                    centroid = polygon.centroid
-                    wgs84_centroid = (centroid.y, centroid.x)
-                    gazebo_pose = converter.wgs84_to_gazebo(wgs84_centroid)
-                    building_poses_gazebo.append(gazebo_pose[:2])
+        if 'buildings' not in acquisition_errors:
+            building_model_paths, building_poses_gazebo = building_processor.compute_box_model_includes(building_store_dir, building_sdf_output_dir, dem_filepath=dem_output_path,
+                                                                                                        terrain_base_elevation=heightmap_info['min_elevation'])
 
         output_sdf_world_path = os.path.join(self.output_dir, f"{self.world_name}.world")
         output_media_dir = os.path.join(self.output_dir, "media")
@@ -116,16 +115,17 @@ class WorldGeneratorThread(QThread):
         if os.path.exists(texture_path_processed):
             shutil.copy2(texture_path_processed, output_texture_file_in_media)
             texture_path_for_sdf = os.path.relpath(output_texture_file_in_media, os.path.dirname(output_sdf_world_path))
-
-        template_directory = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'sdf_generation', 'templates')
-        material_script_path = os.path.join(template_directory, 'gazebo.material')
-        output_material_script_path = os.path.join(output_scripts_dir, 'gazebo.material')
-        if os.path.exists(material_script_path):
-            shutil.copy2(material_script_path, output_material_script_path)
+            material_texture_filename = os.path.basename(output_texture_file_in_media)
+            if texture_info and texture_info['dds_path']:
+                shutil.copy2(texture_info['dds_path'], os.path.join(output_textures_dir, os.path.basename(texture_info['dds_path'])))
+                material_texture_filename = os.path.basename(texture_info['dds_path'])
+            with open(os.path.join(output_scripts_dir, 'gazebo.material'), 'w') as f:
+                f.write(sdf_builder.render_material_script(material_texture_filename))
 
         try:
             sdf_content = sdf_builder.render_world_template(
                 heightmap_path=heightmap_output_path,
+                heightmap_size=(heightmap_info['size_x'], heightmap_info['size_y'], heightmap_info['height_range']),
                 texture_path=texture_path_for_sdf,
                 building_model_paths=building_model_paths,
                 building_poses=building_poses_gazebo
@@ -231,6 +231,8 @@ class MainWindow(QMainWindow):
         
 def main():
     app = QApplication(sys.argv)
+    if config.GDAL_CACHE_MAX_MB:
+        gdal.SetCacheMax(config.GDAL_CACHE_MAX_MB * 1024 * 1024)
     window = MainWindow()
     window.show()
     sys.exit(app.exec())
@@ -26,6 +26,10 @@ from terraforge.ui.map.canvas_path import CanvasPathQt
 from terraforge.ui.map.canvas_polygon import CanvasPolygonQt
 from terraforge.ui.map.canvas_position_marker import CanvasPositionMarkerQt
 from terraforge.ui.map.utils import osm_to_decimal_qt, decimal_to_osm_qt
+from data_acquisition.tile_fetcher import TileFetcher
+from data_acquisition.tile_store import TileStore, tile_server_key
+
+IMAGE_LOAD_THREADS = 25
 
 class MapTileItemQt(QGraphicsPixmapItem):
 	def __init__(self, tile_name_position: Tuple[int, int], parent=None):
@@ -50,7 +54,7 @@ class MapViewWidgetQt(QGraphicsView):
 	area_selected = pyqtSignal(list)
 	polgon_area_selected = pyqtSignal(list)
 
-	def __init__(self, parent=None, width: int = 300, height: int = 200, corner_radius: int = 0, bg_color: str = None, database_path: str = None, use_database_only: bool = False, max_zoom: int = 19, **kwargs):
+	def __init__(self, parent=None, width: int = 300, height: int = 200, corner_radius: int = 0, bg_color: str = None, database_path: str = None, use_database_only: bool = False, max_zoom: int = 19, tile_store_path: str = None, **kwargs):
 		super().__init__(parent)
 
 		self.running = True
@@ -104,6 +108,11 @@ class MapViewWidgetQt(QGraphicsView):
 		self.database_path = database_path
 		self.use_database_only = use_database_only
 		self.overlay_tile_server: Optional[str] = None
+		# database_path is an offline tile database (TkinterMapView's tiles table), read before the tile store
+		self._offline_database = threading.local()
+		# Tiles are shared with the texture pipeline through the persistent tile store; tile_store_path overrides its location
+		self.tile_store = TileStore(tile_store_path)
+		self.tile_fetcher = TileFetcher(max_workers=IMAGE_LOAD_THREADS, headers={"User-Agent": "TkinterMapView"})
 		self.max_zoom = max_zoom
 		self.min_zoom: int = math.ceil(math.log2(math.ceil(self.width / self.tile_size)))
 
@@ -121,7 +130,7 @@ class MapViewWidgetQt(QGraphicsView):
 		self.update_timer.start(10)
 		self.image_load_thread_pool: List[threading.Thread] = []
 
-		for _ in range(25):
+		for _ in range(IMAGE_LOAD_THREADS):
 			image_load_thread = threading.Thread(daemon=True, target=self._load_images_background)
 			image_load_thread.start()
 			self.image_load_thread_pool.append(image_load_thread)
@@ -141,6 +150,7 @@ class MapViewWidgetQt(QGraphicsView):
 
 	def destroy(self):
 		self.running = False
+		self.tile_fetcher.close()
 		super().deleteLater()
 
 	def _create_empty_tile_pixmap(self, color: QColor) -> QPixmap:
@@ -480,12 +490,6 @@ class MapViewWidgetQt(QGraphicsView):
 		radius = 1
 		zoom = round(self.zoom)
 
-		if self.database_path is not None:
-			db_connection = sqlite3.connect(self.database_path)
-			db_cursor = db_connection.cursor()
-		else:
-			db_cursor = None
-
 		while self.running:
 			if last_pre_cache_position != self.pre_cache_position:
 				last_pre_cache_position = self.pre_cache_position
@@ -495,15 +499,15 @@ class MapViewWidgetQt(QGraphicsView):
 			if last_pre_cache_position is not None and radius <= 8:
 				for x in range(self.pre_cache_position[0] - radius, self.pre_cache_position[0] + radius + 1):
 					if f"{zoom}{x}{self.pre_cache_position[1] + radius}" not in self.tile_image_cache:
-						self._request_image(zoom, x, self.pre_cache_position[1] + radius, db_cursor=db_cursor)
+						self._request_image(zoom, x, self.pre_cache_position[1] + radius)
 					if f"{zoom}{x}{self.pre_cache_position[1] - radius}" not in self.tile_image_cache:
-						self._request_image(zoom, x, self.pre_cache_position[1] - radius, db_cursor=db_cursor)
+						self._request_image(zoom, x, self.pre_cache_position[1] - radius)
 
 				for y in range(self.pre_cache_position[1] - radius, self.pre_cache_position[1] + radius + 1):
 					if f"{zoom}{self.pre_cache_position[0] + radius}{y}" not in self.tile_image_cache:
-						self._request_image(zoom, self.pre_cache_position[0] + radius, y, db_cursor=db_cursor)
+						self._request_image(zoom, self.pre_cache_position[0] + radius, y)
 					if f"{zoom}{self.pre_cache_position[0] - radius}{y}" not in self.tile_image_cache:
-						self._request_image(zoom, self.pre_cache_position[0] - radius, y, db_cursor=db_cursor)
+						self._request_image(zoom, self.pre_cache_position[0] - radius, y)
 				radius += 1
 			else:
 				threading.Event().wait(0.1) # Use threading.Event().wait instead of time.sleep
@@ -516,45 +520,44 @@ class MapViewWidgetQt(QGraphicsView):
 				for key in keys_to_delete:
 					del self.tile_image_cache[key]
 
-	def _request_image(self, zoom: int, x: int, y: int, db_cursor=None) -> Optional[QPixmap]: # Correct method name
-		# ... (Image request logic - adapt from TkinterMapView, using QPixmap and QImage) ...
-		if db_cursor is not None:
-			try:
-				db_cursor.execute("SELECT t.tile_image FROM tiles t WHERE t.zoom=? AND t.x=? AND t.y=? AND t.server=?;",
-								  (zoom, x, y, self.tile_server))
-				result = db_cursor.fetchone()
-				if result is not None:
-					image = QImage.fromData(result[0]) # Load QImage from byte array
-					pixmap = QPixmap.fromImage(image)
-					self.tile_image_cache[f"{zoom}{x}{y}"] = pixmap
-					return pixmap
-				elif self.use_database_only:
-					return self.empty_tile_image
-				else:
-					pass
-			except sqlite3.OperationalError:
-				if self.use_database_only:
-					return self.empty_tile_image
-				else:
-					pass
-			except Exception:
-				return self.empty_tile_image
-
+	def _load_offline_tile_bytes(self, server: str, zoom: int, x: int, y: int) -> Optional[bytes]:
+		""" reads a tile from the offline tile database at database_path, where tiles are keyed by their raw URL template """
+		connection = getattr(self._offline_database, "connection", None)
+		if connection is None:
+			connection = sqlite3.connect(self.database_path)
+			self._offline_database.connection = connection
+		try:
+			row = connection.execute("SELECT t.tile_image FROM tiles t WHERE t.zoom=? AND t.x=? AND t.y=? AND t.server=?;",
+									 (zoom, x, y, server)).fetchone()
+		except sqlite3.OperationalError:
+			return None
+		return row[0] if row is not None else None
+
+	def _load_tile_bytes(self, server: str, zoom: int, x: int, y: int) -> Optional[bytes]:
+		""" reads a tile from the offline database or the shared tile store, downloading and storing it unless use_database_only is set """
+		if self.database_path is not None:
+			image_data = self._load_offline_tile_bytes(server, zoom, x, y)
+			if image_data is not None:
+				return image_data
+		key = tile_server_key(server)
+		if self.use_database_only:
+			cached = self.tile_store.get(key, zoom, x, y)
+			return cached.data if cached is not None else None
+		url = server.replace("{x}", str(x)).replace("{y}", str(y)).replace("{z}", str(zoom))
+		return self.tile_fetcher.fetch_tile(self.tile_store, key, zoom, x, y, url)
+
+	def _request_image(self, zoom: int, x: int, y: int) -> Optional[QPixmap]: # Correct method name
 		try:
-			url = self.tile_server.replace("{x}", str(x)).replace("{y}", str(y)).replace("{z}", str(zoom))
-			response = requests.get(url, stream=True, headers={"User-Agent": "TkinterMapView"})
-			response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
-			image_data = response.content
+			image_data = self._load_tile_bytes(self.tile_server, zoom, x, y)
+			if image_data is None:
+				return self.empty_tile_image
 			image = QImage.fromData(image_data) # Load QImage directly from bytes
 			if image.isNull(): # Check if image loading failed
 				return self.empty_tile_image
 
 			if self.overlay_tile_server is not None:
-				url_overlay = self.overlay_tile_server.replace("{x}", str(x)).replace("{y}", str(y)).replace("{z}", str(zoom))
-				response_overlay = requests.get(url_overlay, stream=True, headers={"User-Agent": "TkinterMapView"})
-				response_overlay.raise_for_status()
-				overlay_image_data = response_overlay.content
-				overlay_image = QImage.fromData(overlay_image_data)
+				overlay_image_data = self._load_tile_bytes(self.overlay_tile_server, zoom, x, y)
+				overlay_image = QImage.fromData(overlay_image_data) if overlay_image_data is not None else QImage()
 				if not overlay_image.isNull():
 					image = image.convertToFormat(QImage.Format.Format_ARGB32_Premultiplied) # Ensure alpha channel
 					overlay_image = overlay_image.scaled(self.tile_size, self.tile_size, Qt.AspectRatioMode.IgnoreAspectRatio, Qt.TransformationMode.SmoothTransformation).convertToFormat(QImage.Format.Format_ARGB32_Premultiplied) # Resize and ensure alpha
@@ -580,12 +583,6 @@ class MapViewWidgetQt(QGraphicsView):
 
 	def _load_images_background(self): # Correct method name
 		# ... (Background image loading logic - adapt from TkinterMapView, using QPixmap and QImage) ...
-		if self.database_path is not None:
-			db_connection = sqlite3.connect(self.database_path)
-			db_cursor = db_connection.cursor()
-		else:
-			db_cursor = None
-
 		while self.running:
 			if self.image_load_queue_tasks: # Check if queue is not empty
 				task = self.image_load_queue_tasks.pop(0) # FIFO for queue
@@ -596,7 +593,7 @@ class MapViewWidgetQt(QGraphicsView):
 
 				image = self._get_tile_image_from_cache(zoom, x, y) # Correct method name
 				if image is False:
-					image = self._request_image(zoom, x, y, db_cursor=db_cursor) # Correct method name
+					image = self._request_image(zoom, x, y) # Correct method name
 					if image is None:
 						self.image_load_queue_tasks.append(task) # Re-queue if image load failed
 						continue # Skip to next iteration
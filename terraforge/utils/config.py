@@ -5,6 +5,13 @@ class Config:
 	ELEVATION_DATA_SOURCE = os.getenv("ELEVATION_DATA_SOURCE", "earthexplorer")
 
 	OSM_DATA_SOURCE = os.getenv("OSM_DATA_SOURCE", "overpass")
+	OSM_OVERPASS_URL = os.getenv("OSM_OVERPASS_URL", "")
+	OSM_PBF_PATH = os.getenv("OSM_PBF_PATH", "")
+	OSM_PBF_INDEX_DIR = os.getenv("OSM_PBF_INDEX_DIR", "")
+	OSM_QUERY_WORKERS = int(os.getenv("OSM_QUERY_WORKERS", "4"))
+	OSM_MAX_QUERY_AREA_KM2 = float(os.getenv("OSM_MAX_QUERY_AREA_KM2", "25"))
+	OSM_MAX_FEATURES_PER_QUERY = int(os.getenv("OSM_MAX_FEATURES_PER_QUERY", "20000"))
+	OSM_MAX_SPLIT_DEPTH = int(os.getenv("OSM_MAX_SPLIT_DEPTH", "6"))
 	SATELLITE_TEXTURE_SOURCE = os.getenv("SATELLITE_TEXTURE_SOURCE", "mapbox")
 
 	EARTH_EXPLORER_API_KEY = os.getenv("EARTH_EXPLORER_API_KEY", "")
@@ -15,6 +22,47 @@ class Config:
 	OSM_OUTPUT_DIR = os.getenv("OSM_OUTPUT_DIR", "data/osm")
 	TEXTURE_OUTPUT_DIR = os.getenv("TEXTURE_OUTPUT_DIR", "data/textures")
 
+	COORDINATE_PROJECTION = os.getenv("COORDINATE_PROJECTION", "utm") # utm, tangent, or auto (tangent if within tolerance)
+	COORDINATE_TANGENT_TOLERANCE = float(os.getenv("COORDINATE_TANGENT_TOLERANCE", "0.05")) # max tangent-plane error in metres
+
+	HEIGHTMAP_FORMAT = os.getenv("HEIGHTMAP_FORMAT", "png16")
+	HEIGHTMAP_RESAMPLING = os.getenv("HEIGHTMAP_RESAMPLING", "bilinear")
+	HEIGHTMAP_TILE_SIZE = int(os.getenv("HEIGHTMAP_TILE_SIZE", "513"))
+	TERRAIN_MESH_MAX_ERROR = float(os.getenv("TERRAIN_MESH_MAX_ERROR", "1.0"))
+	# Separate, coarser collision terrain; 0 reuses the visual terrain for collision
+	TERRAIN_COLLISION_SIZE = int(os.getenv("TERRAIN_COLLISION_SIZE", "0")) # collision heightmap edge in pixels, (2^n)+1
+	TERRAIN_COLLISION_MAX_ERROR = float(os.getenv("TERRAIN_COLLISION_MAX_ERROR", "0")) # collision mesh max error in metres
+
+	BUILDING_WRITE_WORKERS = int(os.getenv("BUILDING_WRITE_WORKERS", "8"))
+	GEOJSON_BATCH_SIZE = int(os.getenv("GEOJSON_BATCH_SIZE", "10000")) # features parsed per batch when streaming GeoJSON
+	BUILDING_CELL_SIZE = float(os.getenv("BUILDING_CELL_SIZE", "250")) # merged building mesh cell edge in metres
+	BUILDING_LIBRARY_DIR = os.getenv("BUILDING_LIBRARY_DIR", "data/building_library") # shared model:// library, add to GAZEBO_MODEL_PATH
+	BUILDING_SHAPE_TOLERANCE = float(os.getenv("BUILDING_SHAPE_TOLERANCE", "0.25")) # footprint grid in metres
+	BUILDING_HEIGHT_TOLERANCE = float(os.getenv("BUILDING_HEIGHT_TOLERANCE", "0.5")) # height rounding in metres
+	BUILDING_BASE_STATISTIC = os.getenv("BUILDING_BASE_STATISTIC", "min") # DEM elevation under a footprint: min or mean
+
+	DEM_CACHE_DIR = os.getenv("DEM_CACHE_DIR", "data/dem_cache")
+	DEM_CACHE_MAX_BYTES = int(os.getenv("DEM_CACHE_MAX_BYTES", str(5 * 1024 ** 3)))
+	DEM_SRTM3_ARCHIVE_URL = os.getenv("DEM_SRTM3_ARCHIVE_URL", "https://srtm.csi.cgiar.org/wp-content/uploads/files/srtm_5x5/TIFF/") # checked to confirm a tile is absent upstream
+
+	TEXTURE_TARGET_METERS_PER_PIXEL = float(os.getenv("TEXTURE_TARGET_METERS_PER_PIXEL", "0")) # 0 keeps the default zoom level
+	TEXTURE_MAX_SIZE_PX = int(os.getenv("TEXTURE_MAX_SIZE_PX", "16384"))
+	TEXTURE_MAX_BYTES = int(os.getenv("TEXTURE_MAX_BYTES", str(768 * 1024 ** 2)))
+	TEXTURE_RESAMPLING = os.getenv("TEXTURE_RESAMPLING", "bilinear") # kernel used to warp the mosaic onto the terrain grid
+	TEXTURE_WARP_MEMORY_MB = int(os.getenv("TEXTURE_WARP_MEMORY_MB", "256")) # working buffer of the chunked texture warp
+	TEXTURE_FORMAT = os.getenv("TEXTURE_FORMAT", "png") # png, or dds to also write a BC1 mip chain next to the PNG
+	TEXTURE_ENCODE_WORKERS = int(os.getenv("TEXTURE_ENCODE_WORKERS", str(os.cpu_count() or 4)))
+	GDAL_CACHE_MAX_MB = int(os.getenv("GDAL_CACHE_MAX_MB", "0")) # GDAL block cache set once at startup, 0 keeps the GDAL default
+
+	TILE_DOWNLOAD_WORKERS = int(os.getenv("TILE_DOWNLOAD_WORKERS", "16"))
+	TILE_DOWNLOAD_RETRIES = int(os.getenv("TILE_DOWNLOAD_RETRIES", "3"))
+	TILE_DOWNLOAD_BACKOFF = float(os.getenv("TILE_DOWNLOAD_BACKOFF", "0.5"))
+	TILE_DOWNLOAD_TIMEOUT = float(os.getenv("TILE_DOWNLOAD_TIMEOUT", "15"))
+
+	TILE_STORE_PATH = os.getenv("TILE_STORE_PATH", "data/tiles/tile_store.sqlite")
+	TILE_STORE_TTL_SECONDS = float(os.getenv("TILE_STORE_TTL_SECONDS", str(30 * 24 * 3600)))
+	TILE_STORE_MAX_BYTES = int(os.getenv("TILE_STORE_MAX_BYTES", str(2 * 1024 ** 3)))
+
 	def __init__(self):
 		os.makedirs(self.DEM_OUTPUT_DIR, exist_ok=True)
 		os.makedirs(self.OSM_OUTPUT_DIR, exist_ok=True)
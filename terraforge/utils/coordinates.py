@@ -1,18 +1,144 @@
-
+import threading
+import functools
+import numpy as np
 from pyproj import Transformer
 import pyproj
+from utils.config import config
 from utils.logging import logger
 
+# WGS84 ellipsoid
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_E2 = WGS84_F * (2 - WGS84_F)
+WGS84_B = WGS84_A * (1 - WGS84_F)
+
+PROJECTIONS = ('utm', 'tangent', 'auto')
+
+# Transformers kept per thread, least recently used dropped first
+TRANSFORMER_CACHE_SIZE = 64
+# Tangent-plane errors kept for this many (origin, radius) pairs
+TANGENT_ERROR_CACHE_SIZE = 64
+
+_local = threading.local()
+
+
+def _build_transformer(source_crs, target_crs) -> Transformer:
+    return Transformer.from_crs(source_crs, target_crs, always_xy=True)
+
+
+def get_transformer(source_crs, target_crs) -> Transformer:
+    """
+    Returns an always_xy pyproj Transformer from source_crs to target_crs, cached per thread since transformers must
+    not be shared between threads. CRS arguments must be hashable (EPSG codes, PROJ strings or WKT).
+    """
+    cached_transformer = getattr(_local, "cached_transformer", None)
+    if cached_transformer is None:
+        cached_transformer = functools.lru_cache(maxsize=TRANSFORMER_CACHE_SIZE)(_build_transformer)
+        _local.cached_transformer = cached_transformer
+    return cached_transformer(source_crs, target_crs)
+
+
+def _geodetic_to_ecef(latitudes, longitudes) -> tuple:
+    # Points on the ellipsoid surface (h = 0)
+    lat = np.radians(latitudes)
+    lon = np.radians(longitudes)
+    sin_lat = np.sin(lat)
+    cos_lat = np.cos(lat)
+    prime_vertical = WGS84_A / np.sqrt(1.0 - WGS84_E2 * sin_lat * sin_lat)
+    return (prime_vertical * cos_lat * np.cos(lon),
+            prime_vertical * cos_lat * np.sin(lon),
+            prime_vertical * (1.0 - WGS84_E2) * sin_lat)
+
+
+class TangentPlane:
+    """
+    Local east-north tangent plane (ENU without the up axis) at an origin on the WGS84 ellipsoid, with closed-form
+    NumPy forward (via ECEF) and inverse (lifting plane points along the up axis onto the ellipsoid) conversions.
+    """
 
-class CoordinateConverter:
     def __init__(self, origin_location_wgs84: tuple):
+        lat0, lon0 = np.radians(origin_location_wgs84[0]), np.radians(origin_location_wgs84[1])
+        self.origin_ecef = np.array(_geodetic_to_ecef(origin_location_wgs84[0], origin_location_wgs84[1]))
+        sin_lat, cos_lat, sin_lon, cos_lon = np.sin(lat0), np.cos(lat0), np.sin(lon0), np.cos(lon0)
+        self.east = np.array([-sin_lon, cos_lon, 0.0])
+        self.north = np.array([-sin_lat * cos_lon, -sin_lat * sin_lon, cos_lat])
+        self.up = np.array([cos_lat * cos_lon, cos_lat * sin_lon, sin_lat])
+
+    def forward(self, latitudes, longitudes) -> tuple:
+        """WGS84 latitudes, longitudes to east, north arrays in metres."""
+        x, y, z = _geodetic_to_ecef(np.asarray(latitudes, dtype=np.float64), np.asarray(longitudes, dtype=np.float64))
+        dx, dy, dz = x - self.origin_ecef[0], y - self.origin_ecef[1], z - self.origin_ecef[2]
+        return (self.east[0] * dx + self.east[1] * dy,
+                self.north[0] * dx + self.north[1] * dy + self.north[2] * dz)
+
+    def inverse(self, east, north) -> tuple:
+        """East, north arrays in metres back to WGS84 (latitudes, longitudes)."""
+        east = np.asarray(east, dtype=np.float64)
+        north = np.asarray(north, dtype=np.float64)
+        qx, qy, qz = (self.origin_ecef[i] + self.east[i] * east + self.north[i] * north for i in range(3))
+        ux, uy, uz = self.up
+        # Intersect q + t * up with the ellipsoid; take the root closest to the plane, in the stable form
+        inv_a2 = 1.0 / (WGS84_A * WGS84_A)
+        inv_b2 = 1.0 / (WGS84_B * WGS84_B)
+        a = (ux * ux + uy * uy) * inv_a2 + uz * uz * inv_b2
+        b = 2.0 * ((qx * ux + qy * uy) * inv_a2 + qz * uz * inv_b2)
+        c = (qx * qx + qy * qy) * inv_a2 + qz * qz * inv_b2 - 1.0
+        t = -2.0 * c / (b + np.sqrt(b * b - 4.0 * a * c))
+        x, y, z = qx + t * ux, qy + t * uy, qz + t * uz
+        # Exact geodetic latitude for points on the ellipsoid surface
+        latitudes = np.degrees(np.arctan2(z, (1.0 - WGS84_E2) * np.hypot(x, y)))
+        longitudes = np.degrees(np.arctan2(y, x))
+        return latitudes, longitudes
+
+
+@functools.lru_cache(maxsize=TANGENT_ERROR_CACHE_SIZE)
+def tangent_plane_error(origin_location_wgs84: tuple, radius_meters: float, samples: int = 21) -> float:
+    """
+    Worst-case horizontal error in metres of the tangent plane at origin_location_wgs84 over the square
+    [-radius, radius]^2 around it, against a unit-scale transverse Mercator centred on the origin.
+    """
+    reference_crs = f"+proj=tmerc +lat_0={origin_location_wgs84[0]} +lon_0={origin_location_wgs84[1]} +k=1 +x_0=0 +y_0=0 +ellps=WGS84 +units=m +no_defs"
+    axis = np.linspace(-radius_meters, radius_meters, samples)
+    reference_x, reference_y = (values.ravel() for values in np.meshgrid(axis, axis))
+    lons, lats = _build_transformer(reference_crs, "EPSG:4326").transform(reference_x, reference_y)
+    east, north = TangentPlane(origin_location_wgs84).forward(lats, lons)
+    return float(np.max(np.hypot(east - reference_x, north - reference_y)))
+
+
+class CoordinateConverter:
+    def __init__(self, origin_location_wgs84: tuple, projection: str = None, radius_meters: float = None, tolerance: float = None):
+        """
+        Args:
+            origin_location_wgs84: (lat, lon) of the Gazebo origin.
+            projection: Frame of the Gazebo coordinates: 'utm' (offsets in the origin's UTM zone), 'tangent' (local
+                east-north tangent plane at the origin, closed-form and independent of zone boundaries) or 'auto'
+                (tangent if its worst-case error over radius_meters is within tolerance, else UTM).
+                Defaults to config.COORDINATE_PROJECTION.
+            radius_meters: Half extent of the area of interest, used to bound the tangent-plane error.
+            tolerance: Maximum tangent-plane error in metres for 'auto'. Defaults to config.COORDINATE_TANGENT_TOLERANCE.
+        """
+        projection = projection if projection else config.COORDINATE_PROJECTION
+        tolerance = tolerance if tolerance is not None else config.COORDINATE_TANGENT_TOLERANCE
+        if projection not in PROJECTIONS:
+            logger.error(f"Unknown coordinate projection: {projection}")
+            raise Exception(f"Unknown coordinate projection: {projection}. Use one of {', '.join(PROJECTIONS)}.")
+
         self.origin_location_wgs84 = origin_location_wgs84
         self.utm_zone = self._determine_utm_zone(origin_location_wgs84[1])
-        self.wgs84_to_utm_transformer = Transformer.from_crs('EPSG:4326', self.utm_crs_string, always_xy=True)
-        self.utm_to_wgs84_transformer = Transformer.from_crs(self.utm_crs_string, "EPSG:4326", always_xy=True)
-
+        self.wgs84_to_utm_transformer = get_transformer('EPSG:4326', self.utm_crs_string)
+        self.utm_to_wgs84_transformer = get_transformer(self.utm_crs_string, "EPSG:4326")
         self.origin_utm_x, self.origin_utm_y = self.wgs84_to_utm_transformer.transform(origin_location_wgs84[1], origin_location_wgs84[0])
-        logger.info(f"Coordinate Converter initialized with origin WGS84: {origin_location_wgs84}, UTM Zone: {self.utm_zone}, UTM CRS: {self.utm_crs_string}, Origin UTM: ({self.origin_utm_x}, {self.origin_utm_y})")
+
+        self.tangent_plane = TangentPlane(origin_location_wgs84)
+        # Worst-case tangent-plane error over the area of interest; None if no radius was given
+        self.tangent_error = tangent_plane_error(tuple(origin_location_wgs84), float(radius_meters)) if radius_meters else None
+        if projection == 'auto':
+            projection = 'tangent' if self.tangent_error is not None and self.tangent_error <= tolerance else 'utm'
+        self.projection = projection
+
+        error_info = f", tangent-plane error {self.tangent_error:.4f}m over {radius_meters}m" if self.tangent_error is not None else ""
+        logger.info(f"Coordinate Converter initialized with origin WGS84: {origin_location_wgs84}, UTM Zone: {self.utm_zone}, UTM CRS: {self.utm_crs_string}, "
+                    f"Origin UTM: ({self.origin_utm_x}, {self.origin_utm_y}), projection: {self.projection}{error_info}")
 
     @property
     def utm_crs_string(self):
@@ -30,11 +156,50 @@ class CoordinateConverter:
             utm_zone = 1
         return utm_zone
     
+    def wgs84_to_utm_array(self, latitudes, longitudes) -> tuple:
+        """
+        Converts arrays of WGS84 latitudes and longitudes to UTM (x, y) arrays in the initialized UTM zone.
+        Accepts NumPy arrays, sequences or any buffer of numbers; all points are transformed in one pyproj call.
+        """
+        utm_x, utm_y = self.wgs84_to_utm_transformer.transform(np.asarray(longitudes, dtype=np.float64), np.asarray(latitudes, dtype=np.float64))
+        return np.asarray(utm_x), np.asarray(utm_y)
+
+    def utm_to_gazebo_array(self, utm_x, utm_y) -> tuple:
+        """Converts UTM x, y arrays to local Gazebo (x, y, z=0) arrays."""
+        if self.projection == 'tangent':
+            return self.wgs84_to_gazebo_array(*self.utm_to_wgs84_array(utm_x, utm_y))
+        local_x = np.asarray(utm_x, dtype=np.float64) - self.origin_utm_x
+        local_y = np.asarray(utm_y, dtype=np.float64) - self.origin_utm_y
+        return local_x, local_y, np.zeros_like(local_x)
+
+    def wgs84_to_gazebo_array(self, latitudes, longitudes) -> tuple:
+        """Converts arrays of WGS84 latitudes and longitudes to local Gazebo (x, y, z=0) arrays."""
+        if self.projection == 'tangent':
+            local_x, local_y = self.tangent_plane.forward(latitudes, longitudes)
+            return local_x, local_y, np.zeros_like(local_x)
+        return self.utm_to_gazebo_array(*self.wgs84_to_utm_array(latitudes, longitudes))
+
+    def gazebo_to_utm_array(self, local_x, local_y) -> tuple:
+        """Converts local Gazebo x, y arrays back to UTM (x, y) arrays."""
+        if self.projection == 'tangent':
+            return self.wgs84_to_utm_array(*self.gazebo_to_wgs84_array(local_x, local_y))
+        return np.asarray(local_x, dtype=np.float64) + self.origin_utm_x, np.asarray(local_y, dtype=np.float64) + self.origin_utm_y
+
+    def utm_to_wgs84_array(self, utm_x, utm_y) -> tuple:
+        """Converts UTM x, y arrays back to WGS84 (latitudes, longitudes) arrays in one pyproj call."""
+        lon, lat = self.utm_to_wgs84_transformer.transform(np.asarray(utm_x, dtype=np.float64), np.asarray(utm_y, dtype=np.float64))
+        return np.asarray(lat), np.asarray(lon)
+
+    def gazebo_to_wgs84_array(self, local_x, local_y) -> tuple:
+        """Converts local Gazebo x, y arrays back to WGS84 (latitudes, longitudes) arrays."""
+        if self.projection == 'tangent':
+            return self.tangent_plane.inverse(local_x, local_y)
+        return self.utm_to_wgs84_array(*self.gazebo_to_utm_array(local_x, local_y))
+
     def wgs84_to_utm(self, location_wgs84: tuple) -> tuple:
         """ Converts WGS84 (lat, lon) to UTM (x,y) coordinates in the initialized UTM Zone"""
-        lon, lat = location_wgs84[1], location_wgs84[0]
-        utm_x, utm_y = self.wgs84_to_utm_transformer.transform(lon, lat)
-        return utm_x, utm_y
+        utm_x, utm_y = self.wgs84_to_utm_array(location_wgs84[0], location_wgs84[1])
+        return float(utm_x), float(utm_y)
     
     def utm_to_local_gazebo(self, utm_coords: tuple) -> tuple:
         """
@@ -43,11 +208,8 @@ class CoordinateConverter:
         during initialization. Z-coordinate is set to 0 here, elevation is handled
         separately via heightmap.
         """
-        utm_x, utm_y = utm_coords
-        local_x = utm_x - self.origin_utm_x
-        local_y = utm_y - self.origin_utm_y
-        local_z = 0.0
-        return local_x, local_y, local_z
+        local_x, local_y, local_z = self.utm_to_gazebo_array(utm_coords[0], utm_coords[1])
+        return float(local_x), float(local_y), float(local_z)
     
     def wgs84_to_gazebo(self, location_wgs84: tuple) -> tuple:
         """
@@ -55,27 +217,23 @@ class CoordinateConverter:
         This is a convenience function combinding WGS84 to UTM and UTM to local Gazebo
         conversion.
         """
-        utm_coords = self.wgs84_to_utm(location_wgs84)
-        return self.utm_to_local_gazebo(utm_coords)
+        local_x, local_y, local_z = self.wgs84_to_gazebo_array(location_wgs84[0], location_wgs84[1])
+        return float(local_x), float(local_y), float(local_z)
     
     def gazebo_to_utm(self, gazebo_cords: tuple) -> tuple:
         """Converts local Gazebo coordinates (x, y) back to UTM (x, y)"""
-        local_x, local_y = gazebo_cords
-        utm_x = local_x + self.origin_utm_x
-        utm_y = local_y + self.origin_utm_y
-        return utm_x, utm_y
+        utm_x, utm_y = self.gazebo_to_utm_array(gazebo_cords[0], gazebo_cords[1])
+        return float(utm_x), float(utm_y)
     
     def utm_to_wgs84(self, utm_coords: tuple) -> tuple:
         """Converts UTM (x, y) coordinates backs to WGS84 (lat, lon)"""
-        utm_x, utm_y = utm_coords
-        lon, lat = self.utm_to_wgs84_transformer.transform(utm_x, utm_y)
-        return lat, lon
+        lat, lon = self.utm_to_wgs84_array(utm_coords[0], utm_coords[1])
+        return float(lat), float(lon)
     
     def gazebo_to_wgs84(self, gazebo_coords: tuple) -> tuple:
         """
         Converts local Gazebo coordinates (x, y) back to WGS84 (latitude, longitude).
         This is a convenience function combining Gazebo to UTM and UTM to WGS84 conversion.
         """
-        utm_coords = self.gazebo_to_utm(gazebo_coords)
-        return self.utm_to_wgs84(utm_coords)
-    
\ No newline at end of file
+        lat, lon = self.gazebo_to_wgs84_array(gazebo_coords[0], gazebo_coords[1])
+        return float(lat), float(lon)
@@ -0,0 +1,110 @@
+import json
+
+# Bytes read from disk per refill of the decode buffer
+GEOJSON_READ_SIZE = 1024 * 1024
+
+_WHITESPACE = ' \t\n\r'
+
+
+class _StreamBuffer:
+    """Text read incrementally from a file, decoded value by value with json.JSONDecoder.raw_decode."""
+
+    def __init__(self, f, read_size: int):
+        self.f = f
+        self.read_size = read_size
+        self.text = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        # Drops the consumed prefix and appends the next chunk; False at end of file
+        if self.eof:
+            return False
+        chunk = self.f.read(self.read_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.text = self.text[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Skips whitespace and returns the next character without consuming it, or '' at end of file."""
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, characters: str) -> str:
+        character = self.peek()
+        if not character or character not in characters:
+            raise ValueError(f"Invalid GeoJSON: expected one of {characters!r}, found {character!r}")
+        self.pos += 1
+        return character
+
+    def value(self):
+        """Decodes the next complete JSON value, reading more of the file until it is complete."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.text, self.pos)
+                # A number at the very end of the buffer may continue in the next chunk
+                if end < len(self.text) or self.eof or not isinstance(value, (int, float)):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            if not self._fill():
+                value, self.pos = self.decoder.raw_decode(self.text, self.pos)
+                return value
+
+
+def iter_geojson_features(path: str, batch_size: int = None, read_size: int = GEOJSON_READ_SIZE):
+    """
+    Streams the features of a GeoJSON FeatureCollection from disk without loading the document, decoding each one
+    as soon as its bytes are read. Top-level members other than "features" are skipped.
+
+    Args:
+        path: GeoJSON file.
+        batch_size: If set, yields lists of up to batch_size features instead of single features.
+        read_size: Characters read per refill.
+
+    Yields:
+        Feature dicts, or lists of them with batch_size.
+    """
+    batch = []
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = _StreamBuffer(f, read_size)
+        buffer.expect('{')
+        if buffer.peek() == '}':
+            return
+        while True:
+            key = buffer.value()
+            buffer.expect(':')
+            if key != "features":
+                buffer.value()
+            else:
+                buffer.expect('[')
+                if buffer.peek() == ']':
+                    buffer.expect(']')
+                else:
+                    while True:
+                        feature = buffer.value()
+                        if batch_size:
+                            batch.append(feature)
+                            if len(batch) >= batch_size:
+                                yield batch
+                                batch = []
+                        else:
+                            yield feature
+                        if buffer.expect(',]') == ']':
+                            break
+            if buffer.expect(',}') == '}':
+                break
+    if batch:
+        yield batch
@@ -0,0 +1,112 @@
+import importlib
+import json
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip("osgeo")
+pytest.importorskip("pyproj")
+shapely = pytest.importorskip("shapely")
+affinity = pytest.importorskip("shapely.affinity")
+
+
+def _square(lon, lat, size):
+    return [[lon, lat], [lon + size, lat], [lon + size, lat + size], [lon, lat + size], [lon, lat]]
+
+
+FEATURES = [
+    {'type': 'Feature', 'properties': {'osmid': 'way:1', 'name': 'Town Hall', 'height': 12.0},
+     'geometry': {'type': 'Polygon', 'coordinates': [_square(8.5400, 47.3700, 0.0002)]}},
+    {'type': 'Feature', 'properties': {'osmid': 'way:2'},
+     'geometry': {'type': 'Polygon', 'coordinates': [_square(8.5410, 47.3705, 0.0001), _square(8.54103, 47.37053, 0.00003)]}},
+    {'type': 'Feature', 'properties': {'osmid': 'relation:3', 'height': 25.5},
+     'geometry': {'type': 'MultiPolygon', 'coordinates': [[_square(8.5420, 47.3710, 0.0001)], [_square(8.5425, 47.3710, 0.0001)]]}},
+]
+
+
+@pytest.fixture
+def building_processor(tmp_path, monkeypatch):
+    # utils.config creates its output directories relative to the working directory on import
+    monkeypatch.chdir(tmp_path)
+    return importlib.import_module("data_processing.building_processor")
+
+
+@pytest.fixture
+def osm_file(tmp_path):
+    path = tmp_path / "buildings.geojson"
+    path.write_text(json.dumps({'type': 'FeatureCollection', 'features': FEATURES}))
+    return str(path)
+
+
+def _read_models(directory):
+    return {name: open(os.path.join(directory, name)).read() for name in sorted(os.listdir(directory))}
+
+
+def test_geojson_entry_point_matches_per_feature_loop(building_processor, osm_file, tmp_path):
+    building_processor._process_osm_buildings_to_sdf_loop(osm_file, str(tmp_path / "loop"))
+    written = building_processor.process_osm_buildings_to_sdf(osm_file, str(tmp_path / "batch"))
+    assert written == len(FEATURES)
+    assert _read_models(tmp_path / "batch") == _read_models(tmp_path / "loop")
+    # The temporary building store next to the GeoJSON is removed again
+    assert not [name for name in os.listdir(tmp_path) if name.startswith("tmp")]
+
+
+def _signed_volume(triangles):
+    # Divergence theorem over the triangles; the omitted ground faces lie in z = 0 and add nothing
+    return np.einsum('ij,ij->i', triangles[:, 0], np.cross(triangles[:, 1], triangles[:, 2])).sum() / 6.0
+
+
+def test_extrusion_is_outward_facing_with_holes(building_processor):
+    shell = [(0, 0), (10, 0), (10, 10), (0, 10)]
+    hole = [(4, 4), (6, 4), (6, 6), (4, 6)]
+    # The second footprint is clockwise, its walls must still face outwards
+    polygons = np.array([shapely.Polygon(shell, [hole]), shapely.Polygon([(20, 0), (20, 4), (24, 4), (24, 0)])])
+    triangles, polygon_index = building_processor.extrude_building_polygons(polygons, np.array([5.0, 3.0]), bases=np.array([0.0, 2.0]))
+
+    assert _signed_volume(triangles[polygon_index == 0]) == pytest.approx((100 - 4) * 5.0)
+    raised = triangles[polygon_index == 1]
+    assert raised[:, :, 2].min() == 2.0 and raised[:, :, 2].max() == 5.0
+    assert _signed_volume(raised - np.array([0.0, 0.0, 2.0])) == pytest.approx(16 * 3.0)
+    normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    roofs = np.abs(normals[:, 2]) > 0
+    assert (normals[roofs, 2] > 0).all()
+    # Each roof triangle plus two per ring edge: 4 + 4 edges on the first polygon, 4 on the second
+    assert np.bincount(polygon_index[~roofs]).tolist() == [16, 8]
+
+
+def test_cell_meshes_group_buildings_by_centroid(building_processor, osm_file, tmp_path):
+    store_dir = str(tmp_path / "store")
+    building_processor.write_building_store(osm_file, store_dir, (47.3705, 8.5412), projection='utm')
+    buildings = building_processor.load_building_polygons(building_processor.open_building_store(store_dir))
+    centroids = shapely.centroid(buildings['polygons'])
+    expected_cells = {f"building_cell_{int(x // 200)}_{int(y // 200)}" for x, y in zip(shapely.get_x(centroids), shapely.get_y(centroids))}
+
+    report = building_processor.process_osm_buildings_to_cell_meshes(store_dir, str(tmp_path / "cells"), cell_size=200.0, max_workers=2)
+    assert {cell['name'] for cell in report['cells']} == expected_cells
+    assert 1 < len(expected_cells) < len(buildings['polygons'])
+    triangles, _ = building_processor.extrude_building_polygons(buildings['polygons'], buildings['heights'][buildings['building_index']])
+    assert report['merged']['triangles'] == len(triangles)
+    assert all(os.path.exists(tmp_path / "cells" / f"{name}.sdf") for name in expected_cells)
+
+
+def test_rotated_and_translated_copies_share_a_shape(building_processor):
+    # An L shape has no half-turn symmetry, so the yaw must be recovered over the full circle
+    l_shape = shapely.Polygon([(0, 0), (12, 0), (12, 4), (4, 4), (4, 8), (0, 8)])
+    angles = np.arange(0, 360, 15)
+    copies = np.array([affinity.translate(affinity.rotate(l_shape, angle, origin='centroid'), 37.1 * i, -11.3 * i)
+                       for i, angle in enumerate(angles)])
+    canonical = building_processor.canonicalize_building_polygons(copies, np.full(len(copies), 9.1), 0.1, 0.5)
+    assert len(set(canonical['keys'])) == 1
+
+    # The include pose (centre and yaw) puts the canonical shape back onto the original footprint
+    for i, original in enumerate(copies):
+        placed = affinity.translate(affinity.rotate(canonical['shapes'][i], canonical['yaw'][i], origin=(0, 0), use_radians=True),
+                                            canonical['center_x'][i], canonical['center_y'][i])
+        assert shapely.hausdorff_distance(placed, original) < 0.1
+
+
+def test_different_shapes_or_heights_do_not_share_a_shape(building_processor):
+    polygons = np.array([shapely.box(0, 0, 10, 6), shapely.box(50, 0, 60, 7), shapely.box(100, 0, 110, 6)])
+    canonical = building_processor.canonicalize_building_polygons(polygons, np.array([9.0, 9.0, 15.0]), 0.1, 0.5)
+    assert len(set(canonical['keys'])) == 3
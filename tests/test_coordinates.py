@@ -0,0 +1,47 @@
+import importlib
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pyproj")
+
+ORIGIN = (47.3769, 8.5417)
+POINTS = [(47.3769, 8.5417), (47.3801, 8.5302), (47.3655, 8.5560), (47.4012, 8.5123), (47.3500, 8.6001)]
+
+
+@pytest.fixture
+def coordinates(tmp_path, monkeypatch):
+    # utils.config creates its output directories relative to the working directory on import
+    monkeypatch.chdir(tmp_path)
+    return importlib.import_module("utils.coordinates")
+
+
+@pytest.mark.parametrize("projection", ["utm", "tangent"])
+def test_array_conversions_match_scalar(coordinates, projection):
+    converter = coordinates.CoordinateConverter(ORIGIN, projection=projection)
+    lats, lons = np.array(POINTS).T
+    local_x, local_y, local_z = converter.wgs84_to_gazebo_array(lats, lons)
+    for i, point in enumerate(POINTS):
+        assert (local_x[i], local_y[i], local_z[i]) == pytest.approx(converter.wgs84_to_gazebo(point), abs=1e-9)
+    back_lats, back_lons = converter.gazebo_to_wgs84_array(local_x, local_y)
+    assert np.allclose(back_lats, lats, atol=1e-9) and np.allclose(back_lons, lons, atol=1e-9)
+
+
+@pytest.mark.parametrize("origin", [ORIGIN, (-33.8688, 151.2093), (64.1466, -21.9426), (0.0, 179.99)])
+def test_tangent_plane_round_trip(coordinates, origin):
+    plane = coordinates.TangentPlane(origin)
+    axis = np.linspace(-20000.0, 20000.0, 9)
+    east, north = (values.ravel() for values in np.meshgrid(axis, axis))
+    back_east, back_north = plane.forward(*plane.inverse(east, north))
+    assert np.allclose(back_east, east, atol=1e-6) and np.allclose(back_north, north, atol=1e-6)
+    assert plane.forward(*origin) == pytest.approx((0.0, 0.0), abs=1e-9)
+
+
+def test_auto_projection_switches_on_tangent_error(coordinates):
+    # The plane drifts from true distances by ~2mm over 5km and ~15cm over 20km
+    assert coordinates.tangent_plane_error(ORIGIN, 5000.0) < 0.05 < coordinates.tangent_plane_error(ORIGIN, 20000.0)
+    assert coordinates.CoordinateConverter(ORIGIN, projection="auto", radius_meters=5000, tolerance=0.05).projection == "tangent"
+    assert coordinates.CoordinateConverter(ORIGIN, projection="auto", radius_meters=20000, tolerance=0.05).projection == "utm"
+    assert coordinates.CoordinateConverter(ORIGIN, projection="auto", radius_meters=20000, tolerance=0.5).projection == "tangent"
+    # Without a radius the error is unknown, so 'auto' stays on UTM
+    assert coordinates.CoordinateConverter(ORIGIN, projection="auto").projection == "utm"
@@ -0,0 +1,87 @@
+import importlib
+import os
+import types
+
+import pytest
+
+pytest.importorskip("osgeo")
+pytest.importorskip("elevation")
+
+
+class DownloadError(Exception):
+    pass
+
+
+@pytest.fixture
+def dem_cache(tmp_path, monkeypatch):
+    # utils.config creates its output directories relative to the working directory on import
+    monkeypatch.chdir(tmp_path)
+    return importlib.import_module("data_acquisition.dem_cache")
+
+
+def _failing_download(monkeypatch, dem_cache, head):
+    def clip(bounds, output, product, cache_dir):
+        raise DownloadError("make: *** [download] Error 1")
+
+    monkeypatch.setattr(dem_cache, "elevation", types.SimpleNamespace(clip=clip))
+    monkeypatch.setattr(dem_cache.requests, "head", head)
+
+
+def test_missing_marker_only_when_absent_upstream(dem_cache, tmp_path, monkeypatch):
+    cache = dem_cache.DemCache(str(tmp_path / "dem"), max_bytes=1 << 30)
+    urls = []
+
+    def head(url, **kwargs):
+        urls.append(url)
+        return types.SimpleNamespace(status_code=404)
+
+    _failing_download(monkeypatch, dem_cache, head)
+    assert cache.ensure_tiles((-30.5, 10.2, -30.4, 10.3)) == []
+    assert urls[0].endswith("srtm_30_10.zip")
+    assert os.path.exists(cache._tile_path(10, -31) + ".missing")
+    # The marker is honoured on the next run without touching the network
+    assert cache.ensure_tiles((-30.5, 10.2, -30.4, 10.3)) == []
+    assert len(urls) == 1
+
+
+# An existing archive, a server error and a network error all leave the absence unconfirmed
+@pytest.mark.parametrize("head_result", [types.SimpleNamespace(status_code=200), types.SimpleNamespace(status_code=503), None])
+def test_unconfirmed_failures_raise_without_marker(dem_cache, tmp_path, monkeypatch, head_result):
+    cache = dem_cache.DemCache(str(tmp_path / "dem"), max_bytes=1 << 30)
+
+    def head(url, **kwargs):
+        if head_result is None:
+            raise dem_cache.requests.exceptions.ConnectionError("connection refused")
+        return head_result
+
+    _failing_download(monkeypatch, dem_cache, head)
+    with pytest.raises(DownloadError):
+        cache.ensure_tiles((8.5, 47.3, 8.6, 47.4))
+    assert not os.listdir(cache.tile_dir)
+
+
+def test_tiles_outside_srtm_are_absent_without_request(dem_cache, tmp_path, monkeypatch):
+    cache = dem_cache.DemCache(str(tmp_path / "dem"), max_bytes=1 << 30)
+    _failing_download(monkeypatch, dem_cache, lambda url, **kwargs: pytest.fail("unexpected request"))
+    assert cache.ensure_tiles((10.2, 70.1, 10.3, 70.2)) == []
+    assert os.path.exists(cache._tile_path(70, 10) + ".missing")
+
+
+def _write(path, size, mtime):
+    with open(path, "wb") as f:
+        f.write(b"\0" * size)
+    os.utime(path, (mtime, mtime))
+
+
+def test_evict_drops_least_recently_used_first(dem_cache, tmp_path):
+    cache = dem_cache.DemCache(str(tmp_path / "dem"), max_bytes=250)
+    oldest, kept, newest = (os.path.join(cache.tile_dir, f"{name}.tif") for name in ("N01E001", "N02E002", "N03E003"))
+    archive = os.path.join(cache.elevation_cache_dir, "srtm_37_03.zip")
+    _write(oldest, 100, 1000)
+    _write(kept, 100, 2000)
+    _write(archive, 100, 3000)
+    _write(newest, 100, 4000)
+    cache.evict(keep={kept})
+    # 400 bytes over a 250 byte budget: the oldest tile goes, the kept one is skipped, then the raw archive
+    assert not os.path.exists(oldest) and not os.path.exists(archive)
+    assert os.path.exists(kept) and os.path.exists(newest)
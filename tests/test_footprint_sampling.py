@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+gdal = pytest.importorskip("osgeo.gdal")
+osr = pytest.importorskip("osgeo.osr")
+pytest.importorskip("pyproj")
+
+from data_processing.elevation_processor import sample_dem_footprints
+
+NODATA = -9999.0
+PIXEL = 0.001
+ORIGIN_X, ORIGIN_Y = 8.0, 47.0
+
+
+def _write_dem(path, elevations):
+    height, width = elevations.shape
+    dataset = gdal.GetDriverByName('GTiff').Create(str(path), width, height, 1, gdal.GDT_Float32, options=['TILED=YES', 'BLOCKXSIZE=16', 'BLOCKYSIZE=16'])
+    dataset.SetGeoTransform((ORIGIN_X, PIXEL, 0, ORIGIN_Y, 0, -PIXEL))
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(4326)
+    dataset.SetProjection(srs.ExportToWkt())
+    band = dataset.GetRasterBand(1)
+    band.SetNoDataValue(NODATA)
+    band.WriteArray(elevations)
+    dataset = None
+
+
+def _bounds(col0, row0, col1, row1):
+    # (minx, miny, maxx, maxy) in EPSG:4326 of the pixel window [col0, col1) x [row0, row1), slightly inset
+    inset = PIXEL * 0.25
+    return [ORIGIN_X + col0 * PIXEL + inset, ORIGIN_Y - row1 * PIXEL + inset, ORIGIN_X + col1 * PIXEL - inset, ORIGIN_Y - row0 * PIXEL - inset]
+
+
+@pytest.fixture
+def dem(tmp_path):
+    rng = np.random.default_rng(7)
+    elevations = rng.uniform(100.0, 200.0, (40, 50)).astype(np.float32)
+    elevations[5:8, 30:33] = NODATA
+    elevations[20:24, 10:14] = NODATA
+    path = tmp_path / "dem.tif"
+    _write_dem(path, elevations)
+    return str(path), elevations
+
+
+WINDOWS = [(0, 0, 1, 1), (3, 4, 9, 12), (28, 2, 35, 9), (10, 20, 14, 24), (40, 30, 50, 40)]
+
+
+def test_mean_matches_brute_force(dem):
+    path, elevations = dem
+    values = sample_dem_footprints(path, np.array([_bounds(*window) for window in WINDOWS]), 'EPSG:4326', statistic='mean')
+    for value, (col0, row0, col1, row1) in zip(values, WINDOWS):
+        window = elevations[row0:row1, col0:col1]
+        valid = window[window != NODATA]
+        if valid.size:
+            assert value == pytest.approx(valid.astype(np.float64).mean(), rel=1e-6)
+        else:
+            assert np.isnan(value)
+
+
+def test_min_matches_brute_force(dem):
+    path, elevations = dem
+    values = sample_dem_footprints(path, np.array([_bounds(*window) for window in WINDOWS]), 'EPSG:4326', statistic='min')
+    for value, (col0, row0, col1, row1) in zip(values, WINDOWS):
+        window = elevations[row0:row1, col0:col1]
+        valid = window[window != NODATA]
+        if valid.size:
+            assert value == pytest.approx(valid.min())
+        else:
+            assert np.isnan(value)
+
+
+def test_footprints_outside_the_dem_are_nan(dem):
+    path, _ = dem
+    values = sample_dem_footprints(path, np.array([_bounds(60, 0, 65, 5), _bounds(0, -10, 5, -5)]), 'EPSG:4326', statistic='mean')
+    assert np.isnan(values).all()
+
+
+def test_empty_bounds(dem):
+    path, _ = dem
+    assert sample_dem_footprints(path, np.empty((0, 4)), 'EPSG:4326').shape == (0,)
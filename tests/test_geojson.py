@@ -0,0 +1,43 @@
+import json
+
+import pytest
+
+from utils.geojson import iter_geojson_features
+
+FEATURES = [
+    {"type": "Feature", "properties": {"osmid": 1, "name": "Zürich HB", "height": 12.5},
+     "geometry": {"type": "Polygon", "coordinates": [[[8.5402, 47.3779], [8.5412, 47.3779], [8.5412, 47.3789], [8.5402, 47.3779]]]}},
+    {"type": "Feature", "properties": {"osmid": 22, "levels": [1, 2, 3], "note": "escaped \"quote\", comma ]}"},
+     "geometry": {"type": "MultiPolygon", "coordinates": [[[[-122.4194155, 37.7749295], [-122.41, 37.77], [-122.4194155, 37.7749295]]]]}},
+    {"type": "Feature", "properties": {"osmid": 333, "height": 1e3, "flag": None, "tall": True},
+     "geometry": {"type": "Point", "coordinates": [0, -0.5]}},
+]
+
+
+def _write(tmp_path, document, indent=None):
+    path = tmp_path / "buildings.geojson"
+    path.write_text(json.dumps(document, indent=indent, ensure_ascii=False), encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize("read_size", [1, 2, 3, 7, 64])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_features_survive_every_read_boundary(tmp_path, read_size, indent):
+    document = {"type": "FeatureCollection", "name": "buildings", "crs": {"type": "name", "properties": {"name": "EPSG:4326"}},
+                "features": FEATURES, "bbox": [8.5, 47.3, 8.6, 47.4]}
+    path = _write(tmp_path, document, indent)
+    assert list(iter_geojson_features(path, read_size=read_size)) == FEATURES
+
+
+@pytest.mark.parametrize("read_size", [1, 2, 3, 7, 64])
+def test_batches_keep_feature_order(tmp_path, read_size):
+    path = _write(tmp_path, {"type": "FeatureCollection", "features": FEATURES})
+    batches = list(iter_geojson_features(path, batch_size=2, read_size=read_size))
+    assert batches == [FEATURES[:2], FEATURES[2:]]
+
+
+@pytest.mark.parametrize("read_size", [1, 2, 3, 7, 64])
+@pytest.mark.parametrize("batch_size", [None, 2])
+def test_empty_features_array(tmp_path, read_size, batch_size):
+    path = _write(tmp_path, {"type": "FeatureCollection", "features": [], "name": "empty"}, indent=1)
+    assert list(iter_geojson_features(path, batch_size=batch_size, read_size=read_size)) == []
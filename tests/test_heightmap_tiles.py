@@ -0,0 +1,46 @@
+import importlib
+
+import numpy as np
+import pytest
+
+gdal = pytest.importorskip("osgeo.gdal")
+osr = pytest.importorskip("osgeo.osr")
+
+
+@pytest.fixture
+def elevation_processor(tmp_path, monkeypatch):
+    # utils.config creates its output directories relative to the working directory on import
+    monkeypatch.chdir(tmp_path)
+    return importlib.import_module("data_processing.elevation_processor")
+
+
+def _write_dem(path, width, height, spacing=30.0):
+    y, x = np.mgrid[0:height, 0:width]
+    elevations = (100.0 + 20.0 * np.sin(x / 5.0) + 0.5 * y).astype(np.float32)
+    dataset = gdal.GetDriverByName('GTiff').Create(path, width, height, 1, gdal.GDT_Float32)
+    dataset.SetGeoTransform((465000.0, spacing, 0.0, 5245000.0, 0.0, -spacing))
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(32632)
+    dataset.SetProjection(srs.ExportToWkt())
+    dataset.GetRasterBand(1).WriteArray(elevations)
+    dataset = None
+
+
+def test_tile_borders_match_exactly(elevation_processor, tmp_path):
+    dem_path = str(tmp_path / "dem.tif")
+    _write_dem(dem_path, 40, 30)
+    manifest = elevation_processor.process_dem_to_heightmap_tiles(dem_path, str(tmp_path / "tiles"), tile_size=17, max_workers=1)
+
+    assert (manifest['tiles_x'], manifest['tiles_y']) == (3, 2)
+    tiles = {tile['name']: gdal.Open(tile['path']).ReadAsArray() for tile in manifest['tiles']}
+    for row in range(manifest['tiles_y']):
+        for col in range(manifest['tiles_x']):
+            tile = tiles[f"heightmap_tile_{row}_{col}"]
+            assert tile.shape == (17, 17)
+            if col + 1 < manifest['tiles_x']:
+                assert np.array_equal(tile[:, -1], tiles[f"heightmap_tile_{row}_{col + 1}"][:, 0])
+            if row + 1 < manifest['tiles_y']:
+                assert np.array_equal(tile[-1, :], tiles[f"heightmap_tile_{row + 1}_{col}"][0, :])
+    # Every tile is scaled against the global elevation range
+    assert min(tile.min() for tile in tiles.values()) == 0
+    assert max(tile.max() for tile in tiles.values()) == 65535
@@ -0,0 +1,69 @@
+import importlib
+import sys
+import threading
+import types
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("osgeo")
+
+BBOX = (8.50, 47.30, 8.54, 47.34)
+# Buildings on a regular grid; the ones on the mid lines fall in two quadrants
+POINTS = [(8.50 + 0.005 * i, 47.30 + 0.005 * j) for i in range(9) for j in range(9)]
+
+
+class OverpassError(Exception):
+    pass
+
+
+@pytest.fixture
+def osm(tmp_path, monkeypatch):
+    # utils.config creates its output directories relative to the working directory on import
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setitem(sys.modules, "osmnx", types.ModuleType("osmnx"))
+    return importlib.import_module("data_acquisition.osm")
+
+
+def _stub_overpass(monkeypatch, osm, max_width, error_message):
+    calls = []
+    lock = threading.Lock()
+
+    def features_from_bbox(north, south, east, west, tags=None):
+        with lock:
+            calls.append((west, south, east, north))
+        if east - west > max_width:
+            raise OverpassError(error_message)
+        index = pd.MultiIndex.from_tuples([("way", osmid) for osmid, (lon, lat) in enumerate(POINTS)
+                                           if west <= lon <= east and south <= lat <= north], names=["element_type", "osmid"])
+        return pd.DataFrame({"building": ["yes"] * len(index)}, index=index)
+
+    monkeypatch.setattr(osm, "ox", types.SimpleNamespace(features_from_bbox=features_from_bbox))
+    return calls
+
+
+def test_overloaded_boxes_split_and_merge_deduplicated(osm, monkeypatch):
+    calls = _stub_overpass(monkeypatch, osm, 0.015, 'runtime error: Query timed out in "query" at line 3 after 26 seconds.')
+    merged = osm._download_features_split(BBOX, {"building": True}, max_workers=2)
+
+    # 0.04 degrees wide: the box and its quadrants time out, their 0.01 degree quadrants succeed
+    widths = sorted({round(east - west, 6) for west, _, east, _ in calls})
+    assert widths == [0.01, 0.02, 0.04]
+    assert len(calls) == 1 + 4 + 16
+    assert merged.index.is_unique
+    assert sorted(osmid for _, osmid in merged.index) == list(range(len(POINTS)))
+
+
+def test_other_errors_are_raised_without_splitting(osm, monkeypatch):
+    calls = _stub_overpass(monkeypatch, osm, 0.0, "Timeout waiting for an Overpass slot status")
+    with pytest.raises(OverpassError):
+        osm._download_features_split(BBOX, {"building": True}, max_workers=2)
+    assert len(calls) == 1
+
+
+def test_overload_errors_match_status_codes_and_remarks(osm):
+    assert osm._is_overload_error(OverpassError("'overpass-api.de' responded: 504 Gateway Timeout <html>"))
+    assert osm._is_overload_error(OverpassError("'overpass-api.de' responded: 429 Too Many Requests"))
+    assert osm._is_overload_error(OverpassError("runtime error: Query run out of memory using about 2048 MB of RAM."))
+    assert not osm._is_overload_error(OverpassError("'overpass-api.de' responded: 400 Bad Request"))
+    assert not osm._is_overload_error(OverpassError("connection timeout"))
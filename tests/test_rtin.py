@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from data_processing import rtin
+from data_processing.rtin import rtin_mesh
+
+
+def _surface_deviation(heights: np.ndarray, faces: np.ndarray) -> np.ndarray:
+    """Deviation of every grid point from the mesh surface, -1 for points no triangle covers."""
+    size = heights.shape[0]
+    deviation = np.full((size, size), -1.0)
+    rows, cols = np.divmod(faces, size)
+    y, x = np.mgrid[0:size, 0:size]
+    for (ar, br, cr), (ac, bc, cc) in zip(rows, cols):
+        r0, r1 = min(ar, br, cr), max(ar, br, cr) + 1
+        c0, c1 = min(ac, bc, cc), max(ac, bc, cc) + 1
+        px, py = x[r0:r1, c0:c1], y[r0:r1, c0:c1]
+        denominator = (br - cr) * (ac - cc) + (cc - bc) * (ar - cr)
+        weight_a = ((br - cr) * (px - cc) + (cc - bc) * (py - cr)) / denominator
+        weight_b = ((cr - ar) * (px - cc) + (ac - cc) * (py - cr)) / denominator
+        weight_c = 1.0 - weight_a - weight_b
+        inside = (weight_a >= -1e-9) & (weight_b >= -1e-9) & (weight_c >= -1e-9)
+        surface = weight_a * heights[ar, ac] + weight_b * heights[br, bc] + weight_c * heights[cr, cc]
+        window = deviation[r0:r1, c0:c1]
+        window[inside] = np.maximum(window[inside], np.abs(surface - heights[r0:r1, c0:c1])[inside])
+    return deviation
+
+
+def _synthetic_terrain(size: int, seed: int = 3) -> np.ndarray:
+    y, x = np.mgrid[0:size, 0:size] / size
+    noise = np.random.default_rng(seed).normal(0.0, 1.5, (size, size))
+    return (40.0 * np.sin(6.0 * x) * np.cos(5.0 * y) + noise).astype(np.float32)
+
+
+@pytest.mark.parametrize("size, max_error", [(9, 2.0), (65, 2.0), (129, 0.5), (129, 2.0), (129, 10.0)])
+def test_mesh_stays_within_max_error(size, max_error):
+    heights = _synthetic_terrain(size)
+    deviation = _surface_deviation(heights, rtin_mesh(heights, max_error))
+    assert (deviation >= 0).all(), "every grid point must be covered by a triangle"
+    assert deviation.max() <= max_error + 1e-4
+
+
+def test_flat_terrain_is_two_triangles():
+    assert len(rtin_mesh(np.zeros((33, 33), dtype=np.float32), 0.1)) == 2
+
+
+def test_zero_error_keeps_every_grid_point():
+    heights = _synthetic_terrain(17)
+    faces = rtin_mesh(heights, 0.0)
+    assert _surface_deviation(heights, faces).max() <= 1e-4
+    assert len(np.unique(faces)) == 17 * 17
+
+
+def test_rejects_non_rtin_grid():
+    with pytest.raises(ValueError):
+        rtin_mesh(np.zeros((10, 10), dtype=np.float32), 1.0)
+
+
+def test_levels_decoded_in_chunks_give_the_same_mesh(monkeypatch):
+    heights = _synthetic_terrain(65)
+    expected = rtin_mesh(heights, 1.0)
+    # A chunk size that splits every level unevenly
+    monkeypatch.setattr(rtin, "RTIN_CHUNK_TRIANGLES", 7)
+    assert np.array_equal(rtin_mesh(heights, 1.0), expected)
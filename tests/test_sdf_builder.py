@@ -0,0 +1,49 @@
+import importlib
+import os
+import xml.etree.ElementTree as ET
+
+import pytest
+
+pytest.importorskip("jinja2")
+pytest.importorskip("pyproj")
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'terraforge', 'data_processing', 'templates')
+
+
+@pytest.fixture
+def sdf_builder(tmp_path, monkeypatch):
+    # utils.config creates its output directories relative to the working directory on import
+    monkeypatch.chdir(tmp_path)
+    return importlib.import_module("data_processing.sdf_builder").SDFWorldBuilder(template_dir=TEMPLATE_DIR)
+
+
+def _terrain_geometry(sdf, element):
+    link = ET.fromstring(sdf).find("world/model[@name='terrain']/link")
+    return link.find(f"{element}/geometry")
+
+
+def test_collision_heightmap_is_independent_of_visual(sdf_builder):
+    sdf = sdf_builder.render_world_template(heightmap_path="/dem/visual.png", heightmap_size=(2000.0, 1500.0, 120.0),
+                                            collision_heightmap_path="/dem/collision.png", collision_heightmap_size=(2010.0, 1490.0, 125.0))
+    visual = _terrain_geometry(sdf, "visual")
+    collision = _terrain_geometry(sdf, "collision")
+    assert visual.findtext("heightmap/uri") == "file:///dem/visual.png"
+    assert visual.findtext("heightmap/size") == "2000.0 1500.0 120.0"
+    assert collision.findtext("heightmap/uri") == "file:///dem/collision.png"
+    assert collision.findtext("heightmap/size") == "2010.0 1490.0 125.0"
+
+
+def test_collision_heightmap_defaults_to_visual_extent(sdf_builder):
+    sdf = sdf_builder.render_world_template(heightmap_path="/dem/visual.png", heightmap_size=(2000.0, 1500.0, 120.0),
+                                            collision_heightmap_path="/dem/collision.png")
+    assert _terrain_geometry(sdf, "collision").findtext("heightmap/size") == "2000.0 1500.0 120.0"
+
+
+def test_collision_mesh_and_visual_fallback(sdf_builder):
+    sdf = sdf_builder.render_world_template(terrain_mesh_path="/dem/terrain.obj", collision_mesh_path="/dem/terrain_collision.obj")
+    assert _terrain_geometry(sdf, "visual").findtext("mesh/uri") == "file:///dem/terrain.obj"
+    assert _terrain_geometry(sdf, "collision").findtext("mesh/uri") == "file:///dem/terrain_collision.obj"
+
+    # Without a separate collision geometry the visual one is used for both
+    sdf = sdf_builder.render_world_template(terrain_mesh_path="/dem/terrain.obj")
+    assert _terrain_geometry(sdf, "collision").findtext("mesh/uri") == "file:///dem/terrain.obj"
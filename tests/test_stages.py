@@ -0,0 +1,53 @@
+import importlib
+import sys
+import threading
+import types
+
+import pytest
+
+pytest.importorskip("osgeo")
+pytest.importorskip("elevation")
+pytest.importorskip("PIL")
+
+
+@pytest.fixture
+def stages(tmp_path, monkeypatch):
+    # utils.config creates its output directories relative to the working directory on import
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setitem(sys.modules, "osmnx", types.ModuleType("osmnx"))
+    return importlib.import_module("data_acquisition.stages")
+
+
+def test_failed_optional_stage_keeps_dem(stages):
+    finished = []
+    # Both stages have started before either returns, so they really run concurrently
+    barrier = threading.Barrier(2, timeout=5)
+
+    def dem():
+        barrier.wait()
+        finished.append("dem")
+
+    def buildings():
+        barrier.wait()
+        raise ConnectionError("Overpass unavailable")
+
+    errors = stages.run_acquisition_stages([stages.AcquisitionStage("dem", dem),
+                                            stages.AcquisitionStage("buildings", buildings, required=False)])
+    assert finished == ["dem"]
+    assert list(errors) == ["buildings"] and isinstance(errors["buildings"], ConnectionError)
+
+
+def test_failed_required_stage_raises_after_all_finish(stages):
+    finished = []
+    messages = []
+
+    def dem():
+        raise ConnectionError("SRTM unavailable")
+
+    with pytest.raises(stages.AcquisitionError) as raised:
+        stages.run_acquisition_stages([stages.AcquisitionStage("dem", dem),
+                                       stages.AcquisitionStage("textures", lambda: finished.append("textures"), required=False)],
+                                      progress_callback=lambda name, message: messages.append((name, message)))
+    assert list(raised.value.errors) == ["dem"]
+    assert finished == ["textures"]
+    assert ("dem", "failed: SRTM unavailable") in messages
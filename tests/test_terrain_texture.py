@@ -0,0 +1,73 @@
+import importlib
+
+import numpy as np
+import pytest
+
+pytest.importorskip("osgeo")
+
+
+@pytest.fixture
+def terrain_mesh(tmp_path, monkeypatch):
+    # utils.config creates its output directories relative to the working directory on import
+    monkeypatch.chdir(tmp_path)
+    return importlib.import_module("data_processing.terrain_mesh")
+
+
+def _read_obj(path):
+    records = {"v": [], "vt": [], "f": []}
+    with open(path) as f:
+        for line in f:
+            kind, *values = line.split()
+            if kind in records:
+                records[kind].append(values)
+    return records
+
+
+def test_obj_faces_reference_texture_coordinates(terrain_mesh, tmp_path):
+    vertices = np.array([[0.0, 0.0, 1.0], [10.0, 0.0, 2.0], [0.0, 10.0, 3.0], [10.0, 10.0, 4.0]])
+    faces = np.array([[0, 1, 2], [1, 3, 2]])
+    uvs = np.array([[0.0, 0.0], [1.0, 0.0], [0.0, 1.0], [1.0, 1.0]])
+    path = str(tmp_path / "terrain.obj")
+    terrain_mesh._write_obj(path, vertices, faces, uvs=uvs)
+
+    records = _read_obj(path)
+    assert np.array(records["vt"], dtype=float).tolist() == uvs.tolist()
+    # Every face corner is vertex/texture coordinate with the same 1-based index
+    corners = [corner.split("/") for face in records["f"] for corner in face]
+    assert all(v == vt for v, vt in corners)
+    assert [int(v) - 1 for v, _ in corners] == faces.ravel().tolist()
+
+
+def test_obj_without_uvs_has_plain_faces(terrain_mesh, tmp_path):
+    path = str(tmp_path / "collision.obj")
+    terrain_mesh._write_obj(path, np.zeros((3, 3)), np.array([[0, 1, 2]]))
+    records = _read_obj(path)
+    assert records["vt"] == [] and records["f"] == [["1", "2", "3"]]
+
+
+def test_texture_is_cut_per_heightmap_tile(tmp_path, monkeypatch):
+    gdal = pytest.importorskip("osgeo.gdal")
+    monkeypatch.chdir(tmp_path)
+    texture_processor = importlib.import_module("data_processing.texture_processor")
+
+    # 64x32 pixel texture over 200x100m: west half red, east half blue
+    pixels = np.zeros((3, 32, 64), dtype=np.uint8)
+    pixels[0, :, :32] = 255
+    pixels[2, :, 32:] = 255
+    texture_path = str(tmp_path / "texture.tif")
+    dataset = gdal.GetDriverByName('GTiff').Create(texture_path, 64, 32, 3, gdal.GDT_Byte)
+    for band in range(3):
+        dataset.GetRasterBand(band + 1).WriteArray(pixels[band])
+    dataset = None
+
+    manifest = {'size_x': 200.0, 'size_y': 100.0, 'tiles': [
+        {'name': 'heightmap_tile_0_0', 'pose': [-50.0, 0.0, 0.0], 'size': [100.0, 100.0, 10.0]},
+        {'name': 'heightmap_tile_0_1', 'pose': [50.0, 0.0, 0.0], 'size': [100.0, 100.0, 10.0]},
+    ]}
+    tile_textures = texture_processor.write_texture_tiles(texture_path, manifest, str(tmp_path / "tiles"), texture_format='png')
+
+    assert sorted(tile_textures) == ['heightmap_tile_0_0', 'heightmap_tile_0_1']
+    west = gdal.Open(tile_textures['heightmap_tile_0_0']).ReadAsArray()
+    east = gdal.Open(tile_textures['heightmap_tile_0_1']).ReadAsArray()
+    assert west.shape == east.shape == (3, 32, 32)
+    assert (west == pixels[:, :, :32]).all() and (east == pixels[:, :, 32:]).all()
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("osgeo.gdal")
+
+from data_processing.texture_compression import encode_bc1_blocks, _from_rgb565
+
+
+def _decode_bc1_blocks(encoded: np.ndarray) -> np.ndarray:
+    # Four-colour mode decoder for (n, 8) BC1 blocks, back to (n, 16, 3) float RGB
+    fields = encoded.view(dtype=[('color0', '<u2'), ('color1', '<u2'), ('indices', '<u4')]).ravel()
+    endpoint0 = _from_rgb565(fields['color0'])
+    endpoint1 = _from_rgb565(fields['color1'])
+    palette = np.stack([endpoint0, endpoint1, (2 * endpoint0 + endpoint1) / 3.0, (endpoint0 + 2 * endpoint1) / 3.0], axis=1)
+    indices = (fields['indices'][:, None] >> (2 * np.arange(16, dtype=np.uint32))) & 0x3
+    return np.take_along_axis(palette, indices[:, :, None].astype(np.int64), axis=1)
+
+
+def test_uniform_blocks_round_trip_within_rgb565_precision():
+    colors = np.array([[0, 0, 0], [255, 255, 255], [200, 40, 90]], dtype=np.uint8)
+    blocks = np.repeat(colors[:, None, :], 16, axis=1)
+    decoded = _decode_bc1_blocks(encode_bc1_blocks(blocks))
+    assert np.abs(decoded - blocks).max() <= 8
+
+
+def test_gradient_block_error_is_small():
+    ramp = np.linspace(20, 220, 16)
+    blocks = np.stack([ramp, ramp * 0.5, 255 - ramp], axis=-1)[None].astype(np.uint8)
+    decoded = _decode_bc1_blocks(encode_bc1_blocks(blocks))
+    # Four palette colours over a 200-level ramp are ~67 apart; the endpoint inset keeps every pixel within a step
+    assert np.abs(decoded - blocks).max() < 67
+    assert np.sqrt(np.mean(np.square(decoded - blocks))) < 16
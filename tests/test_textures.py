@@ -0,0 +1,43 @@
+import importlib
+
+import pytest
+
+pytest.importorskip("osgeo")
+pytest.importorskip("elevation")
+pytest.importorskip("PIL")
+
+# Roughly 2km around Zurich
+BBOX = (8.515, 47.360, 8.568, 47.395)
+
+
+@pytest.fixture
+def textures(tmp_path, monkeypatch):
+    # utils.config creates its output directories relative to the working directory on import
+    monkeypatch.chdir(tmp_path)
+    return importlib.import_module("data_acquisition.textures")
+
+
+def test_target_resolution_picks_coarsest_sufficient_zoom(textures):
+    zoom = textures.select_zoom_level(BBOX, target_meters_per_pixel=1.0)
+    assert textures.ground_resolution(47.3775, zoom) <= 1.0 < textures.ground_resolution(47.3775, zoom - 1)
+    assert textures.select_zoom_level(BBOX) == textures.MAPBOX_ZOOM_LEVEL
+
+
+def _longest_side(textures, zoom):
+    estimate = textures.estimate_texture_download(BBOX, zoom)
+    return max(estimate['width'], estimate['height'])
+
+
+def test_size_budget_steps_zoom_down(textures):
+    unbounded = textures.select_zoom_level(BBOX, target_meters_per_pixel=0.3)
+    max_size = _longest_side(textures, unbounded) // 3
+    by_size = textures.select_zoom_level(BBOX, target_meters_per_pixel=0.3, max_texture_size=max_size)
+    # The finest zoom that fits: one level finer would not
+    assert by_size < unbounded
+    assert _longest_side(textures, by_size) <= max_size < _longest_side(textures, by_size + 1)
+
+    max_bytes = textures.estimate_texture_download(BBOX, unbounded)['texture_bytes'] // 10
+    by_bytes = textures.select_zoom_level(BBOX, target_meters_per_pixel=0.3, max_texture_bytes=max_bytes)
+    assert by_bytes < unbounded
+    assert textures.estimate_texture_download(BBOX, by_bytes)['texture_bytes'] <= max_bytes
+    assert textures.estimate_texture_download(BBOX, by_bytes + 1)['texture_bytes'] > max_bytes
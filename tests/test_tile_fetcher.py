@@ -0,0 +1,47 @@
+import importlib
+
+import pytest
+
+
+@pytest.fixture
+def tile_fetcher(tmp_path, monkeypatch):
+    # utils.config creates its output directories relative to the working directory on import
+    monkeypatch.chdir(tmp_path)
+    return importlib.import_module("data_acquisition.tile_fetcher")
+
+
+def test_fetch_many_bounds_tiles_in_flight(tile_fetcher, monkeypatch):
+    fetcher = tile_fetcher.TileFetcher(max_workers=3, retries=0)
+    monkeypatch.setattr(fetcher, "fetch", lambda url: url.encode())
+    pulled = []
+
+    def jobs():
+        for i in range(200):
+            pulled.append(i)
+            yield i, f"tile/{i}"
+
+    max_in_flight = fetcher.max_workers * tile_fetcher.FETCH_IN_FLIGHT_PER_WORKER
+    results = {}
+    for key, content, error in fetcher.fetch_many(jobs(), decode=bytes.decode):
+        # Jobs are only pulled from the iterable as results are consumed
+        assert len(pulled) - len(results) <= max_in_flight
+        results[key] = content
+        assert error is None
+    fetcher.close()
+    assert results == {i: f"tile/{i}" for i in range(200)}
+
+
+def test_fetch_many_yields_decode_errors(tile_fetcher, monkeypatch):
+    fetcher = tile_fetcher.TileFetcher(max_workers=2, retries=0)
+    monkeypatch.setattr(fetcher, "fetch", lambda url: url.encode())
+
+    def decode(content):
+        if content == b"corrupt":
+            raise ValueError("cannot identify image")
+        return content
+
+    results = {key: (content, error) for key, content, error in fetcher.fetch_many([(1, "ok"), (2, "corrupt")], decode=decode)}
+    fetcher.close()
+    assert results[1] == (b"ok", None)
+    assert results[2][0] is None and isinstance(results[2][1], ValueError)
+    assert fetcher.stats.failures == 1
@@ -0,0 +1,38 @@
+import importlib
+
+import pytest
+
+
+@pytest.fixture
+def tile_store(tmp_path, monkeypatch):
+    # utils.config creates its output directories relative to the working directory on import
+    monkeypatch.chdir(tmp_path)
+    return importlib.import_module("data_acquisition.tile_store")
+
+
+def test_server_key_matches_pipeline_key(tile_store):
+    url = "https://api.mapbox.com/styles/v1/mapbox/satellite-v9/tiles/256/{z}/{x}/{y}?access_token=pk.secret"
+    assert tile_store.tile_server_key(url) == "mapbox/satellite-v9/256"
+
+
+def test_server_key_drops_shard_and_credentials(tile_store):
+    osm_keys = {tile_store.tile_server_key(f"https://{shard}.tile.openstreetmap.org/{{z}}/{{x}}/{{y}}.png") for shard in "abc"}
+    assert osm_keys == {"tile.openstreetmap.org/{z}/{x}/{y}.png"}
+    key = tile_store.tile_server_key("https://tiles.example.com/tile?layer=sat&x={x}&y={y}&z={z}&apikey=secret")
+    assert key == "tiles.example.com/tile?layer=sat&x={x}&y={y}&z={z}"
+
+
+def _last_access(store, x):
+    return store._connection().execute("SELECT last_access FROM tile_index WHERE x=?;", (x,)).fetchone()[0]
+
+
+def test_hits_defer_last_access_until_next_write(tile_store, tmp_path):
+    store = tile_store.TileStore(str(tmp_path / "tiles.sqlite"), ttl_seconds=3600, max_bytes=1 << 30)
+    store.put("server", 1, 0, 0, b"first")
+    written = _last_access(store, 0)
+    assert store.get("server", 1, 0, 0).data == b"first"
+    assert _last_access(store, 0) == written
+    accessed = store._pending_access[("server", 1, 0, 0)]
+    store.put("server", 1, 1, 0, b"second")
+    assert _last_access(store, 0) == accessed
+    store.close()